@@ -0,0 +1,210 @@
+"""読み取り専用の統計API（ダッシュボードとは別プロセス）。
+
+ダッシュボードと同じ datastore の読み込み関数・集計を使い、データセットをJSON / CSVで返す。
+機械的なアクセスを Streamlit の再実行から切り離すためのもので、次のように起動する。
+
+    python app/api.py --port 8502
+
+    GET /api/v1/                              データセットと絞り込み条件の一覧
+    GET /api/v1/jinko/city?pref=東京都&year=2025
+    GET /api/v1/zairyu/country?pref=大阪府&country=中国,ベトナム&format=csv
+    GET /api/v1/megasolar/pref?status=運転中&limit=10&offset=10
+
+絞り込み条件はカンマ区切りで複数指定できる。ページングは limit（既定1000、最大10000）と offset。
+応答には ETag（データバージョンとクエリから決まる）と Cache-Control を付け、If-None-Match が
+一致すれば 304 を返す。生成した応答はプロセス内の LRU に保持し、同じクエリは再計算しない。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pandas as pd
+import tornado.web
+
+import datastore
+import telemetry
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+MAX_AGE = int(os.environ.get('OPENJP_API_MAX_AGE', 3600))
+CACHE_ENTRIES = 512
+
+
+def _solar_agg(keys):
+    """状態別の設備件数・合計出力（状態は当日基準なので日付ごとに作り直す）。"""
+    def load():
+        cube = datastore.load_solar_cube(pd.Timestamp.today().normalize())
+        return cube.groupby(keys + ['状態'])[['件数', '合計出力kW']].sum().reset_index()
+    return load
+
+
+# {パス: (読み込み関数, バージョンの元ファイル, {クエリ名: 列名})}。megasolar のバージョンは solar_version()
+DATASETS = {
+    'jinko/pref': (datastore.load_jinko_pref, (DATA_DIR / 'daicho_estat.csv',),
+                   {'year': 'year', 'pref': '都道府県名'}),
+    'jinko/city': (datastore.load_jinko_raw, (DATA_DIR / 'daicho_estat.csv',),
+                   {'year': 'year', 'pref': '都道府県名', 'city': '市区町村名', 'code': '団体コード'}),
+    'zairyu/country': (datastore.load_zairyu_pref_country, (DATA_DIR / 'zairyu_pref_country.csv',),
+                       {'pref': '都道府県', 'country': '国籍', 'date': '時点'}),
+    'zairyu/status': (datastore.load_zairyu_pref_status, (DATA_DIR / 'zairyu_pref_status.csv',),
+                      {'pref': '都道府県', 'status': '在留資格', 'date': '時点'}),
+    'zaisei/pref': (datastore.load_zaisei_pref, (DATA_DIR / 'zaisei_pref.csv',),
+                    {'pref': '都道府県名'}),
+    'zaisei/city': (datastore.load_zaisei_city, (DATA_DIR / 'zaisei_city.csv',),
+                    {'pref': '都道府県名', 'city': '市区町村', 'code': '団体コード'}),
+    'megasolar/pref': (_solar_agg(['都道府県']), (),
+                       {'pref': '都道府県', 'status': '状態'}),
+    'megasolar/city': (_solar_agg(['都道府県', '市区町村']), (),
+                       {'pref': '都道府県', 'city': '市区町村', 'status': '状態'}),
+}
+
+# 値は (本文, Content-Type, 件数)。サイズは本文の大きさ
+_responses = telemetry.TrackedLRU('api_response', CACHE_ENTRIES, sizeof=lambda v: telemetry.estimate_size(v[0]))
+_responses_lock = threading.Lock()
+# 集計結果（キー: (パス, バージョン)）。megasolar は日付もバージョンに含める
+_frames = {}
+_frames_lock = threading.Lock()
+
+
+def _version(path):
+    if path.startswith('megasolar/'):
+        return datastore.solar_version() + pd.Timestamp.today().strftime('%Y%m%d')
+    return datastore.data_version(*DATASETS[path][1])
+
+
+def _frame(path, version):
+    with _frames_lock:
+        df = _frames.get((path, version))
+    if df is None:
+        df = DATASETS[path][0]()
+        with _frames_lock:
+            for key in [k for k in _frames if k[0] == path]:
+                del _frames[key]
+            _frames[(path, version)] = df
+    return df
+
+
+def _filter(df, column, values):
+    """列の値が values のいずれかに一致する行。数値列は値を数値として比較する。"""
+    if pd.api.types.is_numeric_dtype(df[column]):
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().tolist()
+    return df[df[column].isin(values)]
+
+
+def build_response(path, filters, offset, limit, fmt, base_url):
+    """(本文, Content-Type, 件数) を返す。"""
+    df = _frame(path, _version(path))
+    columns = DATASETS[path][2]
+    for name, values in filters.items():
+        df = _filter(df, columns[name], values)
+    total = len(df)
+    page = df.iloc[offset:offset + limit]
+
+    if fmt == 'csv':
+        return page.to_csv(index=False), 'text/csv; charset=utf-8', total
+
+    next_url = None
+    if offset + limit < total:
+        query = {name: ','.join(values) for name, values in filters.items()}
+        next_url = f'{base_url}?{urlencode({**query, "offset": offset + limit, "limit": limit})}'
+    # レコードは pandas でまとめてJSON化し、外側だけ組み立てる
+    head = json.dumps({'dataset': path, 'total': total, 'offset': offset, 'limit': limit, 'next': next_url},
+                      ensure_ascii=False)
+    records = page.to_json(orient='records', force_ascii=False)
+    return f'{head[:-1]}, "data": {records}}}', 'application/json; charset=utf-8', total
+
+
+class DatasetHandler(tornado.web.RequestHandler):
+    def compute_etag(self):
+        # ETag は get() で設定する（本文のハッシュは計算しない）
+        return None
+
+    async def get(self, path):
+        if path not in DATASETS:
+            raise tornado.web.HTTPError(404)
+        columns = DATASETS[path][2]
+        filters = {}
+        for name in sorted(columns):
+            value = self.get_query_argument(name, None)
+            if value:
+                filters[name] = [v.strip() for v in value.split(',') if v.strip()]
+        try:
+            offset = max(0, int(self.get_query_argument('offset', 0)))
+            limit = min(MAX_LIMIT, max(1, int(self.get_query_argument('limit', DEFAULT_LIMIT))))
+        except ValueError:
+            raise tornado.web.HTTPError(400, 'offset / limit must be integers')
+        fmt = self.get_query_argument('format', 'json')
+        if fmt not in ('json', 'csv'):
+            raise tornado.web.HTTPError(400, 'format must be json or csv')
+
+        key = json.dumps([path, _version(path), filters, offset, limit, fmt], ensure_ascii=False)
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+        self.set_header('ETag', etag)
+        self.set_header('Cache-Control', f'public, max-age={MAX_AGE}')
+        if etag in self.request.headers.get('If-None-Match', ''):
+            self.set_status(304)
+            return
+
+        with _responses_lock:
+            cached = _responses.get(etag)
+        telemetry.record('api_response', hit=cached is not None)
+        if cached is None:
+            base_url = f'{self.request.protocol}://{self.request.host}{self.request.path}'
+            # 集計はワーカースレッドで行い、他のリクエストの応答を止めない
+            cached = await asyncio.get_running_loop().run_in_executor(
+                None, build_response, path, filters, offset, limit, fmt, base_url)
+            with _responses_lock:
+                _responses[etag] = cached
+        body, content_type, total = cached
+        self.set_header('Content-Type', content_type)
+        self.set_header('X-Total-Count', str(total))
+        self.write(body)
+
+
+class IndexHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({
+            'datasets': {
+                path: {'filters': columns, 'url': f'/api/v1/{path}'}
+                for path, (_, _, columns) in DATASETS.items()
+            },
+            'paging': {'limit': DEFAULT_LIMIT, 'max_limit': MAX_LIMIT},
+        })
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(telemetry.render_metrics())
+
+
+def make_app():
+    return tornado.web.Application([
+        (r'/api/v1/?', IndexHandler),
+        (r'/api/v1/(.+?)/?', DatasetHandler),
+        (r'/metrics', MetricsHandler),
+    ])
+
+
+async def serve(address, port):
+    make_app().listen(port, address)
+    print(f'API: http://{address}:{port}/api/v1/')
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    asyncio.run(serve(args.address, args.port))
+
+
+if __name__ == '__main__':
+    main()
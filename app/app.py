@@ -1,12 +1,30 @@
 import streamlit as st
+import profiling
+import telemetry
+import tracing
+import warmup
 
 st.set_page_config(page_title='OpenJP')
 st.logo('app/logo.svg')
 
+# 登録された読み込み関数のウォームアップ（プロセスにつき1回、バックグラウンドで実行）
+warmup.show_progress(warmup.start())
+# OPENJP_METRICS_PORT 指定時のみ /metrics を公開
+telemetry.start_exporter()
+
 pg = st.navigation([
     st.Page("page_megasolar.py", title="メガソーラー"),
     st.Page("page_imin.py", title="在留外国人"),
     st.Page("page_jinko.py", title="人口減少"),
     st.Page("page_zaisei.py", title="財政力指数"),
 ])
-pg.run()
+profiler = profiling.start()
+tracing.begin_run()
+try:
+    pg.run()
+finally:
+    # ページの例外・st.stop()・st.rerun() で抜けた再実行も計測を閉じて記録する
+    trace_records = tracing.end_run(pg.title)
+    profiling.finish(profiler, pg.title)
+if tracing.debug_enabled():
+    tracing.render_debug_panel(pg.title, trace_records)
@@ -0,0 +1,99 @@
+"""ランキング表示用テーブルコンポーネント。
+
+DataFrame を Arrow IPC でブラウザに送り、列ごとの書式・グラデーションはブラウザ側で適用する。
+行は仮想スクロールで表示範囲のみ描画するので、行数が増えても描画コストは一定。
+見た目は styles.css の .custom-table と同じ。
+"""
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import matplotlib
+import matplotlib.colors as mcolors
+import pyarrow as pa
+import streamlit.components.v1 as components
+
+from tracing import span
+
+_component = components.declare_component(
+    'arrow_table', path=str(Path(__file__).parent / 'components' / 'arrow_table')
+)
+
+# '{:+,.1f}%' 形式の書式文字列
+_FORMAT_RE = re.compile(r'^(?P<prefix>[^{]*)\{:(?P<sign>\+)?(?P<comma>,)?\.(?P<decimals>\d+)f\}(?P<suffix>.*)$')
+
+# グラデーションの補間点の数
+_N_STOPS = 11
+
+
+def _format_spec(fmt):
+    """'{:,.0f}' 形式の書式文字列をブラウザ側の書式指定に変換する。"""
+    m = _FORMAT_RE.match(fmt)
+    if m is None:
+        raise ValueError(f'未対応の書式: {fmt}')
+    return {
+        'prefix': m['prefix'],
+        'sign': bool(m['sign']),
+        'comma': bool(m['comma']),
+        'decimals': int(m['decimals']),
+        'suffix': m['suffix'],
+    }
+
+
+def _cmap_stops(cmap):
+    """カラーマップ（名前または Colormap）を等間隔の色リストにする。"""
+    if isinstance(cmap, str):
+        return _named_cmap_stops(cmap)
+    return [mcolors.to_hex(cmap(i / (_N_STOPS - 1))) for i in range(_N_STOPS)]
+
+
+@lru_cache(maxsize=None)
+def _named_cmap_stops(name):
+    return _cmap_stops(matplotlib.colormaps[name])
+
+
+def _to_ipc(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_table(df, formats=None, gradients=None, headers=None, max_height=600, key=None, row_ids=None):
+    """テーブルを表示する。
+
+    formats: {列名: '{:,.0f}' 形式の書式}。欠損値は '-' と表示する。
+    gradients: {列名: {'cmap': カラーマップ名または Colormap, 'vmin': 下限, 'vmax': 上限}}。
+        vmin/vmax 省略時は列の最小値・最大値（Styler.background_gradient と同じ）。
+    headers: {列名: 表示名}。'\\n' で改行する。
+    row_ids: 行ごとのID。指定すると行をクリックで選択でき、最後に選択した行のIDを返す。
+    """
+    with span('arrow_table'):
+        return _render(df, formats, gradients, headers, max_height, key, row_ids)
+
+
+def _gradient_spec(spec):
+    """{'cmap', 'vmin', 'vmax'} をブラウザ側のグラデーション指定に変換する。"""
+    return {
+        'colors': _cmap_stops(spec['cmap']),
+        'vmin': spec.get('vmin'),
+        'vmax': spec.get('vmax'),
+    }
+
+
+def _render(df, formats, gradients, headers, max_height, key, row_ids):
+    columns = [
+        {
+            'name': col,
+            'label': (headers or {}).get(col, col),
+            'format': _format_spec(formats[col]) if formats and col in formats else None,
+            'gradient': _gradient_spec(gradients[col]) if gradients and col in gradients else None,
+        }
+        for col in df.columns
+    ]
+    with span('arrow_table.ipc'):
+        data = _to_ipc(df)
+    if row_ids is not None:
+        row_ids = [str(i) for i in row_ids]
+    return _component(data=data, columns=columns, max_height=max_height, row_ids=row_ids, key=key, default=None)
@@ -0,0 +1,395 @@
+"""データセットの読み込み。
+
+ページから参照する読み込み関数をまとめる（Streamlit の描画を含まないので、
+warmup.py からもセッション外で呼び出せる）。
+
+読み込んだフレームは cache_resource でプロセス内の全セッションに同じオブジェクトを渡す
+（cache_data のようにヒットごとの pickle の復元がない）。共有オブジェクトなので変更しないこと。
+Copy-on-Write を有効にしているので、フィルター・列選択の結果は元のデータを共有し、
+書き込んだときだけコピーされる。
+
+前処理済みのデータは data/arrow/{名前}.{バージョン}.arrow（非圧縮の Arrow IPC）に書き出し、
+以降はメモリマップで読む。バージョンは入力ファイルと前処理のコードから決まるので、
+どちらかが変われば最初に読んだプロセスが作り直す。同じホストの複数プロセスは
+OS のページキャッシュ上の同じファイルを参照するので、データの物理メモリは1つ分で済む。
+"""
+import bisect
+import hashlib
+import inspect
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from constants import PREF_ORDER
+from telemetry import tracked
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+ARROW_DIR = DATA_DIR / 'arrow'
+SOLAR_DIR = DATA_DIR / 'solar_nintei'
+SOLAR_LOCATION_DIR = DATA_DIR / 'solar_shozaichi'
+SOLAR_HISTORY_PATH = DATA_DIR / 'solar_history.parquet'
+AGE_CUBE_PATH = DATA_DIR / 'daicho_age.npy'
+AGE_AXES_PATH = DATA_DIR / 'daicho_age.json'
+
+pd.set_option('mode.copy_on_write', True)
+
+# Arrow の文字列型（欠損は NaN、比較結果は numpy の bool で従来の object 列と同じ挙動）
+ARROW_STR = pd.StringDtype('pyarrow', na_value=np.nan)
+
+
+def data_version(*paths):
+    """データファイルのバージョン（パス・更新時刻・サイズのハッシュ）。"""
+    h = hashlib.sha1()
+    for path in paths:
+        stat = Path(path).stat()
+        h.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+    return h.hexdigest()[:12]
+
+
+def _shared(df):
+    """文字列の列を Arrow の文字列型にする（Python の str オブジェクトを持たない）。"""
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) == 'string':
+            df[col] = df[col].astype(ARROW_STR)
+    return df
+
+
+def _to_pandas(table):
+    # 数値列はマップしたバッファをそのまま参照し、文字列列は Arrow の配列のまま保持する
+    return table.to_pandas(
+        split_blocks=True,
+        types_mapper={pa.string(): ARROW_STR, pa.large_string(): ARROW_STR}.get,
+    )
+
+
+def _mapped_table(name, build, *sources, args=(), deps=()):
+    """build(*args) の結果（フレームまたは Arrow の表）を Arrow IPC ファイルにキャッシュし、
+    メモリマップで読んだ Arrow の表を返す。
+
+    deps: build から呼ぶ関数（コードが変わったら作り直す）。
+    """
+    code = b''.join(inspect.getsource(fn).encode() for fn in (build, *deps))
+    version = hashlib.sha1(data_version(*sources).encode() + code).hexdigest()[:12]
+    path = ARROW_DIR / f'{name}.{version}.arrow'
+    if not path.exists():
+        table = build(*args)
+        if not isinstance(table, pa.Table):
+            table = pa.Table.from_pandas(_shared(table), preserve_index=False)
+        ARROW_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with pa.OSFile(str(tmp), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        tmp.replace(path)
+        for old in ARROW_DIR.glob(f'{name}.*.arrow'):
+            if old != path:
+                # 他のプロセスがマップ中でも、削除はファイルの参照がなくなるまで遅延される
+                old.unlink(missing_ok=True)
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+
+def _mapped(name, build, *sources, args=(), deps=()):
+    """_mapped_table のフレーム版。"""
+    return _to_pandas(_mapped_table(name, build, *sources, args=args, deps=deps))
+
+
+def _mapped_csv(name, filename):
+    """CSV をそのまま読む場合の _mapped。"""
+    path = DATA_DIR / filename
+    return _mapped(name, lambda: pd.read_csv(path), path)
+
+
+def date_sort_key(s):
+    """'2024年12月' → 202412"""
+    m = re.match(r'(\d{4})年(\d+)月', s)
+    return int(m.group(1)) * 100 + int(m.group(2)) if m else 0
+
+
+def _solar_files(directory=SOLAR_DIR):
+    return sorted(directory.rglob('*.parquet'))
+
+
+def solar_version():
+    """FIT認定設備データセットのバージョン。"""
+    return data_version(*_solar_files())
+
+
+def _solar_scan(columns, pref=None, directory=SOLAR_DIR):
+    """太陽光・1,000kW以上（・都道府県）の条件をデータセットの走査に渡して読む。
+
+    都道府県・発電設備区分の条件で対象のパーティションだけを開き、出力の条件は
+    行グループの統計で読み飛ばす。directory: solar_nintei / solar_shozaichi のデータセット。
+    """
+    dataset = ds.dataset(directory, format='parquet', partitioning='hive')
+    kinds = {unquote(p.name.split('=', 1)[1]) for p in directory.glob('*/発電設備区分=*')}
+    condition = ds.field('発電設備区分').isin([k for k in kinds if '太陽光' in k]) & (ds.field('出力kW') >= 1000)
+    if pref is not None:
+        condition &= ds.field('都道府県') == pref
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+@tracked('load_solar_prefectures', resource=True, max_entries=1, warm=True)
+def load_solar_prefectures():
+    """メガソーラーがある都道府県（PREF_ORDER 順）。"""
+    prefs = set(_solar_scan(['都道府県']).column('都道府県').unique().to_pylist())
+    return [p for p in PREF_ORDER if p in prefs]
+
+
+@tracked('load_mega_solar', resource=True, max_entries=len(PREF_ORDER) + 1,
+         warm=lambda: [(None,)] + [(pref,) for pref in load_solar_prefectures()])
+def load_mega_solar(pref):
+    """メガソーラー（太陽光・1,000kW以上）の設備。pref を指定するとその都道府県のパーティションだけを読む。
+
+    全国は load_mega_solar(None) で呼ぶ（引数の形が違うと別のエントリとしてキャッシュされる）。
+    """
+    name = 'mega_solar' if pref is None else f'mega_solar_{pref}'
+    return _mapped(name, _build_mega_solar, *_solar_files(),
+                   DATA_DIR / 'daicho' / 'dantai_code_w_name.csv', args=(pref,), deps=(_city_matcher,))
+
+
+def _city_matcher():
+    """(都道府県, 住所) から市区町村名を返す関数（団体名の最長一致、見つからなければ None）。"""
+    cities_df = pd.read_csv(DATA_DIR / 'daicho' / 'dantai_code_w_name.csv')
+    level3 = cities_df[cities_df['エリアレベル'] == 'level3']
+    level2 = cities_df[cities_df['エリアレベル'] == 'level2']
+
+    pref_cities_l3 = defaultdict(list)
+    for _, row in level3.iterrows():
+        pref_cities_l3[row['都道府県名']].append(row['市区町村名'])
+    for pref in pref_cities_l3:
+        pref_cities_l3[pref].sort(key=len, reverse=True)
+
+    # level2 fallback (政令指定都市など)
+    pref_cities_l2 = defaultdict(list)
+    for _, row in level2.iterrows():
+        pref_cities_l2[row['都道府県名']].append(row['市区町村名'])
+    for pref in pref_cities_l2:
+        pref_cities_l2[pref].sort(key=len, reverse=True)
+
+    def extract_city(pref, addr):
+        addr = unicodedata.normalize('NFKC', str(addr))
+        if addr.startswith(pref):
+            addr = addr[len(pref):]
+        # level3 最長一致
+        for name in pref_cities_l3.get(pref, []):
+            if addr.startswith(name):
+                return name
+        # 郡付き住所: 郡の後ろでマッチ
+        if '郡' in addr:
+            rest = addr.split('郡', 1)[1]
+            for name in pref_cities_l3.get(pref, []):
+                if rest.startswith(name):
+                    return name
+        # level2 fallback (旧区名など → 親市)
+        for name in pref_cities_l2.get(pref, []):
+            if addr.startswith(name):
+                return name
+        return None
+
+    return extract_city
+
+
+def _build_mega_solar(pref):
+    # 表示・検索に使う列だけを読む
+    columns = ['設備ID', '発電事業者名', '代表者名', '都道府県', '代表住所', '出力kW',
+               '新規認定日', '運転開始報告年月', '調達期間終了年月']
+    df = _solar_scan(columns, pref).to_pandas()
+
+    extract_city = _city_matcher()
+    df['市区町村'] = df.apply(lambda r: extract_city(r['都道府県'], r['代表住所']), axis=1)
+
+    # 調達期間終了年月をパース
+    def parse_end_ym(s):
+        try:
+            parts = s.replace('年', ' ').replace('月', '').split()
+            return pd.Timestamp(year=int(parts[0]), month=int(parts[1]), day=1)
+        except Exception:
+            return pd.NaT
+
+    df['_調達終了'] = df['調達期間終了年月'].apply(parse_end_ym)
+
+    # 新規認定日（Excelシリアル値 → 年）
+    origin = pd.Timestamp('1899-12-30')
+    df['認定年'] = (origin + pd.to_timedelta(df['新規認定日'], unit='D')).dt.year
+
+    return df
+
+
+def solar_status(df, today):
+    """設備ごとの状態（運転中 / 運転予定 / 運転終了）。調達期間が終了したものは運転終了。"""
+    ended = df['_調達終了'].notna() & (df['_調達終了'] < today)
+    planned = df['運転開始報告年月'] == '-'
+    return pd.Series(np.select([ended, planned], ['運転終了', '運転予定'], '運転中'), index=df.index)
+
+
+def _location_sources():
+    return (*_solar_files(SOLAR_LOCATION_DIR), DATA_DIR / 'daicho' / 'dantai_code_w_name.csv')
+
+
+@tracked('load_solar_locations', resource=True, max_entries=1,
+         warm=lambda: [()] if SOLAR_LOCATION_DIR.exists() else [])
+def load_solar_locations():
+    """メガソーラーの設備所在地（設備ID × 連番、1設備に複数の所在地がある）。
+
+    設備ID・連番の順に並べてあるので、1設備の所在地は連続した行になる（load_parcel_index）。
+    """
+    return _mapped('solar_locations', _build_solar_locations, *_location_sources(), deps=(_city_matcher,))
+
+
+def _build_solar_locations():
+    df = _solar_scan(['設備ID', '連番', '都道府県', '発電設備の所在地'], directory=SOLAR_LOCATION_DIR).to_pandas()
+    extract_city = _city_matcher()
+    df['市区町村'] = [extract_city(p, a) for p, a in zip(df['都道府県'], df['発電設備の所在地'])]
+    return df.sort_values(['設備ID', '連番'], kind='stable').reset_index(drop=True)
+
+
+def _build_parcel_index():
+    ids = pa.array(load_solar_locations()['設備ID'])
+    if isinstance(ids, pa.ChunkedArray):
+        ids = ids.combine_chunks()
+    # 設備ID順に並んでいるので、連続する同じ値の区間がそのまま行範囲になる
+    runs = pc.run_end_encode(ids)
+    ends = runs.run_ends.to_numpy().astype(np.int64)
+    starts = np.concatenate([[0], ends[:-1]])
+    return pa.table({'設備ID': runs.values, 'start': starts, 'count': ends - starts})
+
+
+@tracked('load_parcel_index', resource=True, max_entries=1,
+         warm=lambda: [()] if SOLAR_LOCATION_DIR.exists() else [])
+def load_parcel_index():
+    """設備ID（昇順）→ load_solar_locations() の行範囲 (start, count) の表。
+
+    所在地と同じ入力・コードのバージョンで data/arrow/ に書き出し、メモリマップで読む
+    （プロセスごとに作り直さず、同じホストのプロセスで共有する）。
+    """
+    return _mapped_table('solar_parcel_index', _build_parcel_index, *_location_sources(),
+                         deps=(_build_solar_locations, _city_matcher))
+
+
+def parcels_of(facility_id):
+    """設備の所在地の行（索引を二分探索して行範囲を切り出す。所在地の表は走査しない）。"""
+    index = load_parcel_index()
+    ids = index.column('設備ID')
+    i = bisect.bisect_left(ids, facility_id, key=lambda v: v.as_py())
+    if i == len(ids) or ids[i].as_py() != facility_id:
+        return load_solar_locations().iloc[0:0]
+    start, count = index.column('start')[i].as_py(), index.column('count')[i].as_py()
+    return load_solar_locations().iloc[start:start + count]
+
+
+@tracked('load_solar_history', resource=True, max_entries=1,
+         warm=lambda: [()] if SOLAR_HISTORY_PATH.exists() else [])
+def load_solar_history():
+    """メガソーラーの月次の履歴（SCD type 2: 設備ID × 有効期間 [valid_from, valid_to)）。
+
+    状態は各行の時点の運転開始報告の有無による 運転中 / 運転予定。
+    """
+    return _mapped('solar_history', _build_solar_history, SOLAR_HISTORY_PATH)
+
+
+def _build_solar_history():
+    df = pd.read_parquet(SOLAR_HISTORY_PATH, filters=[('出力kW', '>=', 1000)])
+    df = df[df['発電設備区分'].str.contains('太陽光', na=False)].drop(columns='_hash')
+    df['状態'] = np.where(df['運転開始報告年月'] == '-', '運転予定', '運転中')
+    return df
+
+
+@tracked('load_solar_cube', resource=True, max_entries=2,
+         warm=lambda: [(pd.Timestamp.today().normalize(),)])
+def load_solar_cube(today):
+    """(都道府県, 市区町村, 状態, 認定年) ごとの設備件数・合計出力kW。状態は today 基準。
+
+    ページの状態別件数・推移グラフ・地図・集計表は、このキューブを絞り込んで集計し直す
+    （設備単位のフレームを再実行ごとに分類・集計しない）。市区町村・認定年が不明な設備も1行にまとめて残す。
+    """
+    df = load_mega_solar(None)
+    return df.assign(状態=solar_status(df, today)).groupby(
+        ['都道府県', '市区町村', '状態', '認定年'], dropna=False, observed=True,
+    ).agg(
+        件数=('設備ID', 'count'),
+        合計出力kW=('出力kW', 'sum'),
+    ).reset_index()
+
+
+@tracked('load_jinko_raw', resource=True, max_entries=1, warm=True)
+def load_jinko_raw():
+    """市区町村レベルの生データを返す。日本人人口列を追加。"""
+    return _mapped('jinko_raw', _build_jinko_raw, DATA_DIR / 'daicho_estat.csv')
+
+
+def _build_jinko_raw():
+    df = pd.read_csv(DATA_DIR / 'daicho_estat.csv')
+    df['日本人人口'] = df['総人口'] - df['外国人人口']
+    return df
+
+
+@tracked('load_jinko_pref', resource=True, max_entries=1, warm=True)
+def load_jinko_pref():
+    """都道府県×年の集計データ（日本人人口・外国人人口含む）。"""
+    return _mapped('jinko_pref', _build_jinko_pref, DATA_DIR / 'daicho_estat.csv')
+
+
+def _build_jinko_pref():
+    df = _build_jinko_raw()
+    pref = df.groupby(['year', '都道府県名']).agg(
+        総人口=('総人口', 'sum'),
+        外国人人口=('外国人人口', 'sum'),
+        日本人人口=('日本人人口', 'sum'),
+    ).reset_index()
+    pref['外国人比率'] = (pref['外国人人口'] / pref['総人口'] * 100).round(2)
+    return pref
+
+
+@tracked('load_jinko_age', resource=True, max_entries=1,
+         warm=lambda: [()] if AGE_CUBE_PATH.exists() else [])
+def load_jinko_age():
+    """(市区町村, 年, 年齢区分, 性別, 国籍) の人口の int32 配列（メモリマップ）と軸のラベル。
+
+    dataprep_daicho_estat.py が書き出した .npy をそのままマップする（読み込み時にコピーしない）。
+    """
+    axes = json.loads(AGE_AXES_PATH.read_text(encoding='utf-8'))
+    return np.load(AGE_CUBE_PATH, mmap_mode='r'), axes
+
+
+@tracked('load_zaisei_pref', resource=True, max_entries=1, warm=True)
+def load_zaisei_pref():
+    return _mapped_csv('zaisei_pref', 'zaisei_pref.csv')
+
+
+@tracked('load_zaisei_city', resource=True, max_entries=1, warm=True)
+def load_zaisei_city():
+    return _mapped_csv('zaisei_city', 'zaisei_city.csv')
+
+
+@tracked('load_zairyu_pref_country', resource=True, max_entries=1, warm=True)
+def load_zairyu_pref_country():
+    return _mapped_csv('zairyu_pref_country', 'zairyu_pref_country.csv')
+
+
+@tracked('load_zairyu_pref_status', resource=True, max_entries=1, warm=True)
+def load_zairyu_pref_status():
+    return _mapped_csv('zairyu_pref_status', 'zairyu_pref_status.csv')
+
+
+@tracked('load_zairyu_country', resource=True, max_entries=1, warm=True)
+def load_zairyu_country():
+    """国籍・地域×在留資格×集計時点の在留外国人数（_sort_key: 集計時点の並び順）。"""
+    return _mapped('zairyu_country', _build_zairyu_country, DATA_DIR / 'zairyu_country.csv')
+
+
+def _build_zairyu_country():
+    df = pd.read_csv(DATA_DIR / 'zairyu_country.csv')
+    if df['人口'].dtype == 'object':
+        df['人口'] = df['人口'].str.replace(',', '').astype(float)
+    df['_sort_key'] = df['集計時点'].apply(date_sort_key)
+    return df
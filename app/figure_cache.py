@@ -0,0 +1,46 @@
+"""Plotly 図のキャッシュ。
+
+(チャートID, フィルター状態, データバージョン) をキーに、構築済みの図をプロセス内の
+全セッションで共有する。st.plotly_chart は Figure を受け取ると再検証せずに JSON 化するので、
+キャッシュヒット時は集計・図の構築・Plotly の検証を省ける。
+キャッシュした図は共有オブジェクトなので、取得後に変更しないこと。
+プロセス内にない図は result_cache（有効時）から読み、なければ構築して保存する。
+"""
+import threading
+
+import streamlit as st
+
+import result_cache
+import telemetry
+from tracing import span
+
+MAX_FIGURES = 512
+
+
+def _figure_size(fig):
+    """図の推定サイズ（データ・レイアウトの辞書の大きさ）。"""
+    return telemetry.estimate_size(fig.to_plotly_json())
+
+
+@st.cache_resource(show_spinner=False)
+def _store():
+    return telemetry.TrackedLRU('figure_cache', MAX_FIGURES, sizeof=_figure_size), threading.Lock()
+
+
+def cached_figure(chart_id, state, version, build):
+    """キャッシュ済みの図を返す。なければ build() で構築して登録する。
+
+    state: 図に影響するフィルター状態（ハッシュ可能な値のタプル）。
+    """
+    cache, lock = _store()
+    key = (chart_id, state, version)
+    with lock:
+        fig = cache.get(key)
+    telemetry.record('figure_cache', hit=fig is not None)
+    if fig is None:
+        with span(f'figure:{chart_id}'):
+            # 他のプロセス・再起動前に構築済みなら永続キャッシュから読む
+            fig = result_cache.cached(f'figure:{chart_id}', state, version, build)
+        with lock:
+            cache[key] = fig
+    return fig
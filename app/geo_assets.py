@@ -0,0 +1,254 @@
+"""境界GeoJSONの静的配信。
+
+data/geo/*.geojson をコンテンツハッシュ付きのファイル名で app/static/geo/ に公開し、
+folium の地図からはURLで参照させる（ジオメトリをHTMLに埋め込まない）。
+サーバー側ではジオメトリを保持せず、featureごとの id・プロパティ・外接矩形だけを持つ。
+配信は Streamlit の静的ファイル配信（server.enableStaticServing）で行い、
+URLに ?v=<hash> を付けることで長期キャッシュヘッダーが付与される。
+
+全国の市区町村は dataprep_geo.py が生成するベクタータイル（app/static/tiles/municipalities/）を
+Leaflet.VectorGrid で表示し、表示範囲のタイルだけを取得させる。
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+import folium
+import numpy as np
+import streamlit as st
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.utilities import JsCode
+from jinja2 import Template
+from streamlit_folium import st_folium
+
+from constants import PREF_ORDER
+from telemetry import tracked
+from tracing import span
+
+GEO_DIR = Path(__file__).resolve().parent.parent / 'data' / 'geo'
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+GEO_STATIC_DIR = STATIC_DIR / 'geo'
+TILE_DIR = STATIC_DIR / 'tiles' / 'municipalities'
+STATIC_URL = '/app/static'
+
+
+def _bbox(geom):
+    if not geom or geom['type'] not in ('Polygon', 'MultiPolygon'):
+        return None
+    xs, ys = [], []
+    polys = [geom['coordinates']] if geom['type'] == 'Polygon' else geom['coordinates']
+    for poly in polys:
+        for x, y in poly[0]:
+            xs.append(x)
+            ys.append(y)
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _interior_point(geom):
+    """ポリゴンの内部にある代表点 [経度, 緯度]。
+
+    最も大きい外接矩形のポリゴンを、その矩形の中央の緯度で水平に切り、
+    内部にある区間（穴を除く）のうち最も長いものの中点をとる。
+    """
+    if not geom or geom['type'] not in ('Polygon', 'MultiPolygon'):
+        return None
+    polys = [geom['coordinates']] if geom['type'] == 'Polygon' else geom['coordinates']
+    rings = [np.asarray(p[0], dtype=float) for p in polys]
+    extent = [np.prod(r.max(axis=0) - r.min(axis=0)) for r in rings]
+    poly = polys[int(np.argmax(extent))]
+    outer = rings[int(np.argmax(extent))]
+    y = (outer[:, 1].min() + outer[:, 1].max()) / 2
+    xs = []
+    for ring in poly:
+        r = np.asarray(ring, dtype=float)
+        (x0, y0), (x1, y1) = r[:-1].T, r[1:].T
+        crosses = (y0 <= y) != (y1 <= y)
+        xs.append(x0[crosses] + (y - y0[crosses]) * (x1[crosses] - x0[crosses]) / (y1[crosses] - y0[crosses]))
+    xs = np.sort(np.concatenate(xs))
+    if len(xs) < 2:
+        return [float(outer[:, 0].mean()), float(y)]
+    starts, ends = xs[0::2][:len(xs) // 2], xs[1::2]
+    i = int(np.argmax(ends - starts))
+    return [float((starts[i] + ends[i]) / 2), float(y)]
+
+
+def publish(src_path, key_prop):
+    """src_path を app/static/geo/{stem}.{hash}.json として書き出し、(URL, 索引) を返す。
+
+    各featureには key_prop の値を id として付与する（スタイル・ツールチップの対応付け用）。
+    索引はジオメトリを除いた FeatureCollection（geometry は None、bbox に外接矩形、point に内部の代表点）。
+    同じ stem の古いバージョンは削除する。
+    """
+    src = Path(src_path)
+    raw = src.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    geojson = json.loads(raw)
+    for feat in geojson['features']:
+        feat['id'] = feat['properties'].get(key_prop, '')
+
+    out = GEO_STATIC_DIR / f'{src.stem}.{digest}.json'
+    if not out.exists():
+        GEO_STATIC_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(geojson, ensure_ascii=False, separators=(',', ':')))
+        tmp.replace(out)
+        for old in GEO_STATIC_DIR.glob(f'{src.stem}.*.json'):
+            if old != out:
+                old.unlink(missing_ok=True)
+    index = {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'id': f['id'], 'properties': f['properties'],
+             'geometry': None, 'bbox': _bbox(f['geometry']), 'point': _interior_point(f['geometry'])}
+            for f in geojson['features']
+        ],
+    }
+    return f'{STATIC_URL}/geo/{quote(out.name)}?v={digest}', index
+
+
+def _geo_sources():
+    """全国・47都道府県の境界GeoJSONの load_asset の引数。"""
+    sources = [(str(GEO_DIR / 'prefectures.geojson'), '都道府県')]
+    sources += [(str(GEO_DIR / f'{i:02d}_{pref}.geojson'), '市区町村') for i, pref in enumerate(PREF_ORDER, start=1)]
+    return [s for s in sources if Path(s[0]).exists()]
+
+
+@tracked('load_asset', resource=True, budget_mb=512, show_spinner=False, warm=_geo_sources)
+def load_asset(src_path, key_prop):
+    """公開済みアセットの (URL, 索引) を返す。
+
+    索引はプロセス内で共有する読み取り専用オブジェクトなので変更しないこと。
+    """
+    return publish(src_path, key_prop)
+
+
+def iter_coords(geojson, names=None):
+    """featureの外接矩形の角の座標を返す（names 指定時はその id のfeatureのみ）。"""
+    for feat in geojson['features']:
+        if feat['bbox'] is None or (names is not None and feat['id'] not in names):
+            continue
+        x0, y0, x1, y1 = feat['bbox']
+        yield x0, y0
+        yield x1, y1
+
+
+@span('geojson_layer')
+def geojson_layer(src_path, key_prop, props=None, **kwargs):
+    """静的アセットをURL参照する folium.GeoJson を返す。
+
+    props: {key_prop の値: {プロパティ名: 値}}。ツールチップ用の追加プロパティ。
+    ジオメトリとは別の小さなテーブルとして埋め込み、ブラウザ側で各featureに付与する。
+    style_function はサーバー側で評価されるので、props を含んだfeatureを受け取る。
+    """
+    url, geojson = load_asset(str(src_path), key_prop)
+    data = geojson
+    on_each_feature = None
+    if props:
+        defaults = {k: '-' for p in props.values() for k in p}
+        data = {
+            'type': 'FeatureCollection',
+            'features': [
+                {**f, 'properties': {**f['properties'], **defaults, **props.get(f['id'], {})}}
+                for f in geojson['features']
+            ],
+        }
+        on_each_feature = JsCode(
+            'function(feature, layer) {'
+            f' var defaults = {json.dumps(defaults, ensure_ascii=False)};'
+            f' var props = {json.dumps(props, ensure_ascii=False)};'
+            ' Object.assign(feature.properties, defaults, props[feature.id] || {});'
+            ' }'
+        )
+
+    layer = folium.GeoJson(data, on_each_feature=on_each_feature, **kwargs)
+    # ジオメトリは埋め込まず、ブラウザにURLから取得させる
+    layer.embed = False
+    layer.embed_link = url
+    return layer
+
+
+@tracked('load_tile_meta', resource=True, show_spinner=False, warm=True)
+def load_tile_meta():
+    """市区町村ベクタータイルのメタデータ（未生成なら None）。"""
+    path = TILE_DIR / 'tiles.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def tile_key(pref, city):
+    """タイルのfeatureとテーブルを対応付けるキー。"""
+    return f'{pref}/{city}'
+
+
+class MunicipalTileLayer(JSCSSMixin, Layer):
+    """全国市区町村のベクタータイルによるコロプレスレイヤー。
+
+    table: {tile_key(都道府県, 市区町村): [塗り色, ツールチップHTML]}。
+    テーブルにない市区町村は灰色で表示する。
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }}_table = {{ this.table|tojson }};
+        var {{ this.get_name() }} = L.vectorGrid.protobuf({{ this.url|tojson }}, {
+            rendererFactory: L.canvas.tile,
+            interactive: true,
+            minZoom: {{ this.minzoom }},
+            maxNativeZoom: {{ this.maxzoom }},
+            vectorTileLayerStyles: {
+                {{ this.layer|tojson }}: function(p) {
+                    var row = {{ this.get_name() }}_table[p['都道府県'] + '/' + p['市区町村']];
+                    return {
+                        fill: true, fillColor: row ? row[0] : '#cccccc', fillOpacity: 0.75,
+                        color: '#fff', weight: 0.3,
+                    };
+                },
+            },
+        });
+        var {{ this.get_name() }}_tooltip = L.tooltip({sticky: true});
+        {{ this.get_name() }}.on('mousemove', function(e) {
+            var p = e.layer.properties;
+            var row = {{ this.get_name() }}_table[p['都道府県'] + '/' + p['市区町村']];
+            {{ this.get_name() }}_tooltip
+                .setLatLng(e.latlng)
+                .setContent('<div style="font-size:13px;">' + p['都道府県'] + ' ' + p['市区町村']
+                            + (row ? '<br>' + row[1] : '') + '</div>');
+            {{ this._parent.get_name() }}.openTooltip({{ this.get_name() }}_tooltip);
+        });
+        {{ this.get_name() }}.on('mouseout', function() {
+            {{ this._parent.get_name() }}.closeTooltip({{ this.get_name() }}_tooltip);
+        });
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    default_js = [
+        ('leaflet.vectorgrid',
+         'https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js'),
+    ]
+
+    def __init__(self, meta, table, name=None):
+        super().__init__(name=name)
+        self._name = 'MunicipalTileLayer'
+        self.url = f'{STATIC_URL}/tiles/municipalities/{{z}}/{{x}}/{{y}}.pbf?v={meta["version"]}'
+        self.layer = meta['layer']
+        self.minzoom = meta['minzoom']
+        self.maxzoom = meta['maxzoom']
+        self.table = table
+
+
+def render_municipal_map(table, colormap):
+    """全国の市区町村コロプレス地図を描画する（タイル未生成なら何もしない）。"""
+    meta = load_tile_meta()
+    if meta is None:
+        return
+    m = folium.Map(location=[37, 137], zoom_start=5, tiles='cartodbpositron')
+    m.fit_bounds([[24, 122], [46, 146]])
+    MunicipalTileLayer(meta, table).add_to(m)
+    colormap.add_to(m)
+    with span('st_folium'):
+        st_folium(m, use_container_width=True, height=400, returned_objects=[])
@@ -0,0 +1,87 @@
+"""住民基本台帳人口の年齢・性別・国籍の構成。
+
+人口は datastore.load_jinko_age() の (市区町村, 年, 年齢区分, 性別, 国籍) の配列。
+人口ピラミッド・高齢化率・生産年齢人口割合は、地域・年で配列を切り出して軸方向に足し合わせて求める
+（縦持ちのフレームを絞り込んで集計しない）。都道府県は市区町村の和。
+"""
+import numpy as np
+import pandas as pd
+
+from datastore import AGE_CUBE_PATH, load_jinko_age
+from telemetry import tracked
+
+# 指標: (年齢区分の下限, 上限)。上限 None は最上位の区分まで
+SHARES = {
+    '高齢化率': (65, None),
+    '生産年齢人口割合': (15, 64),
+}
+
+
+def band_lower(band):
+    """年齢区分の下限の年齢（'65歳～69歳' → 65、'80歳以上' → 80）。"""
+    return int(band.split('歳')[0])
+
+
+class AgeCube:
+    """年齢・性別・国籍別の人口の配列と軸。"""
+
+    def __init__(self, values, axes):
+        self.values = values
+        self.areas = pd.DataFrame(axes['areas'], columns=['団体コード', '都道府県名', '市区町村名'])
+        self.years = axes['years']
+        self.year_pos = {y: i for i, y in enumerate(self.years)}
+        self.ages = axes['ages']
+        self.sexes = axes['sexes']
+        self.nationalities = axes['nationalities']
+        self.prefs, self.pref_codes = np.unique(self.areas['都道府県名'].to_numpy(str), return_inverse=True)
+        lower = np.array([band_lower(a) for a in self.ages])
+        upper = np.append(lower[1:] - 1, np.inf)
+        self.share_bands = {
+            name: (lower >= lo) & (upper <= (hi if hi is not None else np.inf))
+            for name, (lo, hi) in SHARES.items()
+        }
+
+    def area_mask(self, pref=None, city=None):
+        """地域（None は全国）の市区町村の行。"""
+        mask = np.ones(len(self.areas), bool)
+        if pref:
+            mask &= (self.areas['都道府県名'] == pref).to_numpy()
+        if city:
+            mask &= (self.areas['市区町村名'] == city).to_numpy()
+        return mask
+
+    def pyramid(self, year, pref=None, city=None):
+        """年齢区分 × (性別, 国籍) の人口。"""
+        block = self.values[self.area_mask(pref, city), self.year_pos[year]].sum(axis=0, dtype=np.int64)
+        columns = pd.MultiIndex.from_product([self.sexes, self.nationalities], names=['性別', '国籍'])
+        return pd.DataFrame(block.reshape(len(self.ages), -1), index=self.ages, columns=columns)
+
+    def shares(self, year, level):
+        """地域ごとの総人口と年齢区分の割合（%）。level は '都道府県' / '市区町村'。"""
+        # (市区町村, 年齢区分)
+        by_age = self.values[:, self.year_pos[year]].sum(axis=(2, 3), dtype=np.int64)
+        if level == '都道府県':
+            totals = np.zeros((len(self.prefs), by_age.shape[1]), np.int64)
+            np.add.at(totals, self.pref_codes, by_age)
+            df = pd.DataFrame({'都道府県名': self.prefs})
+        else:
+            totals = by_age
+            df = self.areas[['都道府県名', '市区町村名']].copy()
+        population = totals.sum(axis=1)
+        df['総人口'] = population
+        denominator = np.where(population == 0, np.nan, population)
+        for name, band in self.share_bands.items():
+            df[name] = np.round(totals[:, band].sum(axis=1) / denominator * 100, 1)
+        return df
+
+
+@tracked('load_age_cube', resource=True, max_entries=1, warm=lambda: [()] if AGE_CUBE_PATH.exists() else [])
+def load_cube():
+    """年齢・性別・国籍別の人口。"""
+    return AgeCube(*load_jinko_age())
+
+
+@tracked('jinko_age_shares', resource=True, max_entries=64)
+def load_shares(year, level):
+    """単位ごとの year の年齢構成の割合（共有オブジェクトなので変更しないこと）。"""
+    return load_cube().shares(year, level)
@@ -0,0 +1,61 @@
+"""住民基本台帳人口の任意の2時点の比較。
+
+地域 × 年 × 指標（総人口・日本人人口・外国人人口）の密な配列を1度だけ作り、
+(比較元の年, 比較先の年) の増減数・増減率と比較先の年の外国人比率を、
+全地域・全指標について配列の演算1回で求める。結果は年の組ごとにキャッシュするので、
+比較期間を変えてもフレームの絞り込み・結合をやり直さない。
+"""
+import numpy as np
+import pandas as pd
+
+from datastore import load_jinko_pref, load_jinko_raw
+from telemetry import tracked
+
+METRICS = ['総人口', '日本人人口', '外国人人口']
+# {単位: 地域のキー列}
+LEVELS = {'都道府県': ['都道府県名'], '市区町村': ['都道府県名', '市区町村名']}
+
+
+class JinkoPanel:
+    """地域 × 年 × 指標の人口（その年にない地域は NaN）。"""
+
+    def __init__(self, df, keys):
+        wide = df.pivot_table(index=keys, columns='year', values=METRICS, aggfunc='sum')
+        self.areas = wide.index.to_frame(index=False)
+        self.years = sorted(df['year'].unique())
+        self.year_pos = {y: i for i, y in enumerate(self.years)}
+        # (地域, 年, 指標)
+        self.values = np.stack(
+            [wide[m].reindex(columns=self.years).to_numpy(float) for m in METRICS], axis=-1,
+        )
+
+    def compare(self, from_year, to_year):
+        """比較先の年に人口がある地域の比較先の人口・増減数・増減率（%）・外国人比率（%）。"""
+        base = self.values[:, self.year_pos[from_year]]
+        latest = self.values[:, self.year_pos[to_year]]
+        delta = latest - base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.round(delta / np.where(base == 0, np.nan, base) * 100, 1)
+            ratio = np.round(latest[:, 2] / np.where(latest[:, 0] == 0, np.nan, latest[:, 0]) * 100, 2)
+
+        df = self.areas.copy()
+        for i, m in enumerate(METRICS):
+            df[m] = latest[:, i]
+            df[f'{m}増減数'] = delta[:, i]
+            df[f'{m}増減率'] = rate[:, i]
+        df['外国人比率'] = ratio
+        df = df[~np.isnan(latest[:, 0])]
+        return df.astype({m: 'int64' for m in METRICS}).reset_index(drop=True)
+
+
+@tracked('load_jinko_panel', resource=True, max_entries=len(LEVELS), warm=lambda: [(level,) for level in LEVELS])
+def load_panel(level):
+    """単位（'都道府県' / '市区町村'）の人口の配列。"""
+    df = load_jinko_pref() if level == '都道府県' else load_jinko_raw()
+    return JinkoPanel(df, LEVELS[level])
+
+
+@tracked('jinko_comparison', resource=True, max_entries=64)
+def load_comparison(level, from_year, to_year):
+    """単位ごとの from_year → to_year の比較（共有オブジェクトなので変更しないこと）。"""
+    return load_panel(level).compare(from_year, to_year)
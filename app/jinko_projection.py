@@ -0,0 +1,149 @@
+"""住民基本台帳人口のコーホート要因法による将来推計。
+
+jinko_age の (市区町村, 年, 年齢区分, 性別, 国籍) の人口から、全市区町村を1つの配列として
+1年ずつ進める。年齢区分は5歳階級なので、1年で各区分の 1/5 が次の区分に移るとみなす。
+
+    翌年の人口 = 生残率 × 加齢後の人口 × (1 + 純移動率) + 出生（0〜4歳のみ）
+
+- 生残率: 全国の日本人の年齢区分・性別ごとの1年の変化率（国外との移動が小さいので死亡とみなす）
+- 出生: 全国の 15〜49歳女性1人あたりの出生数（国籍別）× 市区町村の 15〜49歳女性。男女比は 105:100
+- 純移動率: 市区町村・年齢区分・性別・国籍ごとの、生残・出生で説明できない変化の率
+
+率はいずれも直近 WINDOW 年の実績から求め、シナリオの倍率を掛けて使う。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from jinko_age import band_lower, load_cube
+from telemetry import tracked
+
+# 率を求める実績の年数
+WINDOW = 5
+# 出生の男女の割合
+BIRTH_SEX = {'男': 105 / 205, '女': 100 / 205}
+# 純移動率の上限（人口の少ない区分で率が発散しないようにする）
+MAX_MIGRATION = 0.3
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """推計の前提（倍率は実績の率に対するもの）。"""
+    years: int = 20
+    fertility: float = 1.0
+    mortality: float = 1.0
+    japanese_migration: float = 1.0
+    foreign_migration: float = 1.0
+
+
+def _age(pop):
+    """1年分の加齢: 各区分の 1/5 が次の区分に移る（最上位の区分は留まる）。pop: (..., 年齢区分, 性別, 国籍)"""
+    aged = pop * 0.8
+    aged[..., 1:, :, :] += pop[..., :-1, :, :] * 0.2
+    aged[..., -1, :, :] += pop[..., -1, :, :] * 0.2
+    return aged
+
+
+class CohortModel:
+    """実績から求めた生残率・出生率・純移動率。"""
+
+    def __init__(self, cube):
+        self.cube = cube
+        # (年, 市区町村, 年齢区分, 性別, 国籍)
+        history = np.moveaxis(np.asarray(cube.values[:, -WINDOW - 1:], dtype=np.float64), 1, 0)
+        start, end = history[:-1], history[1:]
+        aged = _age(start)
+        self.mothers = np.array([15 <= band_lower(a) <= 45 for a in cube.ages])
+        self.female = cube.sexes.index('女')
+        self.japanese = cube.nationalities.index('日本人')
+
+        # 生残率 (年齢区分, 性別): 全国の日本人。0〜4歳は出生を含むので 5〜9歳の率を使う
+        nat_end = end[..., self.japanese].sum(axis=(0, 1))
+        nat_aged = aged[..., self.japanese].sum(axis=(0, 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            survival = np.where(nat_aged > 0, nat_end / nat_aged, 1.0)
+        survival[0] = survival[1]
+        self.survival = np.clip(survival, 0, 1)
+
+        # 出生率 (国籍): 0〜4歳の生残で説明できない増加 / 15〜49歳女性
+        survived = aged * self.survival[:, :, None]
+        births = (end[:, :, 0] - survived[:, :, 0]).sum(axis=(0, 1, 2))
+        self.fertility = np.clip(births / np.maximum(self._mothers(start).sum(axis=(0, 1)), 1), 0, None)
+
+        # 純移動率 (市区町村, 年齢区分, 性別, 国籍)
+        expected = survived.copy()
+        expected[:, :, 0] += self._births(start, self.fertility)
+        survived_total = survived.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            migration = np.where(survived_total > 0, (end - expected).sum(axis=0) / survived_total, 0.0)
+        self.migration = np.clip(migration, -MAX_MIGRATION, MAX_MIGRATION)
+
+    def _mothers(self, pop):
+        """15〜49歳女性 (..., 国籍)。"""
+        return pop[..., self.mothers, self.female, :].sum(axis=-2)
+
+    def _births(self, pop, fertility):
+        """出生数 (..., 性別, 国籍)。"""
+        per_nat = self._mothers(pop) * fertility
+        return per_nat[..., None, :] * np.array([BIRTH_SEX.get(s, 0.5) for s in self.cube.sexes])[:, None]
+
+    def project(self, scenario):
+        """(推計年, 市区町村, 年齢区分, 性別, 国籍) の推計人口。先頭は最新の実績年。"""
+        survival = 1 - (1 - self.survival) * scenario.mortality
+        fertility = self.fertility * scenario.fertility
+        scale = np.array([scenario.japanese_migration if n == '日本人' else scenario.foreign_migration
+                          for n in self.cube.nationalities])
+        growth = survival[:, :, None] * (1 + self.migration * scale)
+
+        pop = np.asarray(self.cube.values[:, -1], dtype=np.float64)
+        result = np.empty((scenario.years + 1, *pop.shape), np.float32)
+        result[0] = pop
+        for i in range(1, scenario.years + 1):
+            births = self._births(pop, fertility)
+            pop = _age(pop) * growth
+            pop[:, 0] += births
+            result[i] = pop
+        return result
+
+
+class Projection:
+    """推計結果の集計。"""
+
+    def __init__(self, cube, values):
+        self.cube = cube
+        self.values = values
+        self.base_year = cube.years[-1]
+        self.years = list(range(self.base_year, self.base_year + len(values)))
+
+    def series(self, pref=None, city=None):
+        """地域の年別の日本人・外国人人口（先頭は最新の実績年、以降が推計年）。"""
+        totals = self.values[:, self.cube.area_mask(pref, city)].sum(axis=(1, 2, 3))
+        return pd.DataFrame(totals, columns=self.cube.nationalities, index=pd.Index(self.years, name='year'))
+
+    def change(self, year, level):
+        """地域ごとの year の推計総人口と最新の実績年からの増減率（%）。"""
+        latest = self.values[self.years.index(year)].sum(axis=(1, 2, 3))
+        base = self.values[0].sum(axis=(1, 2, 3))
+        if level == '都道府県':
+            latest = np.bincount(self.cube.pref_codes, weights=latest, minlength=len(self.cube.prefs))
+            base = np.bincount(self.cube.pref_codes, weights=base, minlength=len(self.cube.prefs))
+            df = pd.DataFrame({'都道府県名': self.cube.prefs})
+        else:
+            df = self.cube.areas[['都道府県名', '市区町村名']].copy()
+        df['推計人口'] = np.round(latest).astype(np.int64)
+        df['増減率'] = np.round((latest - base) / np.where(base == 0, np.nan, base) * 100, 1)
+        return df
+
+
+@tracked('load_cohort_model', resource=True, max_entries=1)
+def load_model():
+    """実績から求めた推計の率。"""
+    return CohortModel(load_cube())
+
+
+@tracked('jinko_projection', resource=True, max_entries=8)
+def load_projection(scenario):
+    """シナリオの推計（共有オブジェクトなので変更しないこと）。"""
+    model = load_model()
+    return Projection(model.cube, model.project(scenario))
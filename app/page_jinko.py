@@ -1,5 +1,3 @@
-import copy
-import json
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
@@ -9,6 +7,15 @@ import branca.colormap as cm
 import matplotlib.colors as mcolors
 from pathlib import Path
 from constants import PREF_ORDER
+import geo_assets
+import result_cache
+from arrow_table import arrow_table
+from figure_cache import cached_figure
+from datastore import AGE_AXES_PATH, AGE_CUBE_PATH, data_version, load_jinko_raw, load_jinko_pref
+from jinko_age import SHARES, load_cube as load_age_cube, load_shares
+from jinko_compare import load_comparison
+from jinko_projection import Scenario, load_projection
+from tracing import span
 
 _CMAP_JINKO = mcolors.LinearSegmentedColormap.from_list('jinko', ['#d73027', '#fee090', '#4575b4'])
 
@@ -21,45 +28,18 @@ DATA_DIR = BASE_DIR / 'data'
 GEO_DIR = DATA_DIR / 'geo'
 
 
-@st.cache_data
-def load_jinko_raw():
-    """市区町村レベルの生データを返す。日本人人口列を追加。"""
-    df = pd.read_csv(DATA_DIR / 'daicho_estat.csv')
-    df['日本人人口'] = df['総人口'] - df['外国人人口']
-    return df
-
-
-@st.cache_data
-def load_jinko_pref():
-    """都道府県×年の集計データ（日本人人口・外国人人口含む）。"""
-    df = load_jinko_raw()
-    pref = df.groupby(['year', '都道府県名']).agg(
-        総人口=('総人口', 'sum'),
-        外国人人口=('外国人人口', 'sum'),
-        日本人人口=('日本人人口', 'sum'),
-    ).reset_index()
-    pref['外国人比率'] = (pref['外国人人口'] / pref['総人口'] * 100).round(2)
-    return pref
-
-
-@st.cache_data
-def load_geojson_jinko(path):
-    with open(path) as f:
-        return json.load(f)
-
-
-df_raw = load_jinko_raw()
-df_pref = load_jinko_pref()
-years = sorted(df_pref['year'].unique())
-base_year = years[0]    # 2013
-latest_year = years[-1]  # 2025
+with span('load_jinko'):
+    df_raw = load_jinko_raw()
+    df_pref = load_jinko_pref()
+JINKO_VERSION = data_version(DATA_DIR / 'daicho_estat.csv')
+years = [int(y) for y in sorted(df_pref['year'].unique())]
 
 # --- ページ ---
 st.title('人口減少')
 st.info(
     '**日本人人口**（総人口 − 外国人人口）の推移。'
     f'住民基本台帳（毎年**1月1日**基準）に基づく。'
-    f'{base_year}年との比較で都道府県・市区町村ごとの増減を確認できる。'
+    '任意の2時点を比較して、都道府県・市区町村ごとの増減を確認できる。'
     '人口減少・少子高齢化は、社会保障・財政・地域経済に直結する政策課題。'
     '\n\n**注**: 総務省が公表する推計人口（**10月1日**基準・国勢調査補正値）とは'
     '集計時点・方法が異なるため、数値に差異が生じる。',
@@ -84,74 +64,96 @@ if selected_pref:
 
 # === 推移グラフ（日本人人口前年比 + 外国人人口）===
 if selected_city:
-    df_chart = df_raw[
-        (df_raw['都道府県名'] == selected_pref) & (df_raw['市区町村名'] == selected_city)
-    ].copy().sort_values('year')
     title_suffix = f'{selected_pref} {selected_city}'
 elif selected_pref:
-    df_chart = df_pref[df_pref['都道府県名'] == selected_pref].copy().sort_values('year')
     title_suffix = selected_pref
 else:
-    df_chart = df_pref.groupby('year').agg(
-        日本人人口=('日本人人口', 'sum'),
-        外国人人口=('外国人人口', 'sum'),
-    ).reset_index().sort_values('year')
     title_suffix = '全国'
+chart_state = (selected_pref, selected_city)
+
+
+def chart_frame():
+    """推移グラフ用の年別データ（選択中の地域）。"""
+    if selected_city:
+        df_chart = df_raw[
+            (df_raw['都道府県名'] == selected_pref) & (df_raw['市区町村名'] == selected_city)
+        ].copy().sort_values('year')
+    elif selected_pref:
+        df_chart = df_pref[df_pref['都道府県名'] == selected_pref].copy().sort_values('year')
+    else:
+        df_chart = df_pref.groupby('year').agg(
+            日本人人口=('日本人人口', 'sum'),
+            外国人人口=('外国人人口', 'sum'),
+        ).reset_index().sort_values('year')
+    return df_chart
+
+
+def build_stack_chart():
+    df_chart = chart_frame()
+    df_chart['外国人比率'] = (df_chart['外国人人口'] / (df_chart['日本人人口'] + df_chart['外国人人口']) * 100).round(2)
+    fig_stack = go.Figure()
+    fig_stack.add_trace(go.Bar(
+        x=df_chart['year'], y=df_chart['日本人人口'],
+        name='日本人人口', marker_color='#d73027', yaxis='y1',
+    ))
+    fig_stack.add_trace(go.Bar(
+        x=df_chart['year'], y=df_chart['外国人人口'],
+        name='外国人人口', marker_color='#4575b4', yaxis='y1',
+    ))
+    fig_stack.add_trace(go.Scatter(
+        x=df_chart['year'], y=df_chart['外国人比率'],
+        name='外国人比率（%）', mode='lines+markers',
+        line=dict(color='#f59e0b', width=2), marker=dict(size=4),
+        yaxis='y2',
+    ))
+    fig_stack.update_layout(
+        barmode='stack',
+        xaxis=dict(tickmode='linear', dtick=1, fixedrange=True, showgrid=False),
+        yaxis=dict(title='人口（人）', fixedrange=True, tickformat=',', showgrid=False),
+        yaxis2=dict(title='外国人比率（%）', overlaying='y', side='right', fixedrange=True, showgrid=False, ticksuffix='%'),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(l=10, r=10, t=30, b=10), height=280,
+        dragmode=False,
+    )
+    return fig_stack
+
+
+def build_diff_chart():
+    df_chart = chart_frame()
+    df_chart['日本人前年比'] = df_chart['日本人人口'].diff()
+    df_chart['外国人前年比'] = df_chart['外国人人口'].diff()
+    df_chart = df_chart[df_chart['日本人前年比'].notna()].copy()
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=df_chart['year'], y=df_chart['日本人前年比'],
+        name='日本人人口 前年比増減',
+        marker_color='#d73027',
+    ))
+    fig.add_trace(go.Bar(
+        x=df_chart['year'], y=df_chart['外国人前年比'],
+        name='外国人人口 前年比増減',
+        marker_color='#4575b4',
+    ))
+    fig.update_layout(
+        barmode='relative',
+        xaxis=dict(tickmode='linear', dtick=1, fixedrange=True),
+        yaxis=dict(title='前年比増減（人）', fixedrange=True, tickformat=','),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(l=10, r=10, t=30, b=10), height=280,
+        dragmode=False,
+    )
+    return fig
+
 
 # === 積み上げ棒グラフ（日本人・外国人人口の実数推移）===
 st.markdown(f'###### 日本人・外国人人口の推移（{title_suffix}）')
-df_chart['外国人比率'] = (df_chart['外国人人口'] / (df_chart['日本人人口'] + df_chart['外国人人口']) * 100).round(2)
-fig_stack = go.Figure()
-fig_stack.add_trace(go.Bar(
-    x=df_chart['year'], y=df_chart['日本人人口'],
-    name='日本人人口', marker_color='#d73027', yaxis='y1',
-))
-fig_stack.add_trace(go.Bar(
-    x=df_chart['year'], y=df_chart['外国人人口'],
-    name='外国人人口', marker_color='#4575b4', yaxis='y1',
-))
-fig_stack.add_trace(go.Scatter(
-    x=df_chart['year'], y=df_chart['外国人比率'],
-    name='外国人比率（%）', mode='lines+markers',
-    line=dict(color='#f59e0b', width=2), marker=dict(size=4),
-    yaxis='y2',
-))
-fig_stack.update_layout(
-    barmode='stack',
-    xaxis=dict(tickmode='linear', dtick=1, fixedrange=True, showgrid=False),
-    yaxis=dict(title='人口（人）', fixedrange=True, tickformat=',', showgrid=False),
-    yaxis2=dict(title='外国人比率（%）', overlaying='y', side='right', fixedrange=True, showgrid=False, ticksuffix='%'),
-    legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
-    margin=dict(l=10, r=10, t=30, b=10), height=280,
-    dragmode=False,
-)
+fig_stack = cached_figure('jinko_stack', chart_state, JINKO_VERSION, build_stack_chart)
 st.plotly_chart(fig_stack, use_container_width=True,
                 config={'displayModeBar': False, 'scrollZoom': False}, key='jinko_stack')
 
-df_chart['日本人前年比'] = df_chart['日本人人口'].diff()
-df_chart['外国人前年比'] = df_chart['外国人人口'].diff()
-df_chart = df_chart[df_chart['日本人前年比'].notna()].copy()
-
 st.markdown(f'###### 日本人・外国人人口の前年比増減（{title_suffix}）')
-fig = go.Figure()
-fig.add_trace(go.Bar(
-    x=df_chart['year'], y=df_chart['日本人前年比'],
-    name='日本人人口 前年比増減',
-    marker_color='#d73027',
-))
-fig.add_trace(go.Bar(
-    x=df_chart['year'], y=df_chart['外国人前年比'],
-    name='外国人人口 前年比増減',
-    marker_color='#4575b4',
-))
-fig.update_layout(
-    barmode='relative',
-    xaxis=dict(tickmode='linear', dtick=1, fixedrange=True),
-    yaxis=dict(title='前年比増減（人）', fixedrange=True, tickformat=','),
-    legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
-    margin=dict(l=10, r=10, t=30, b=10), height=280,
-    dragmode=False,
-)
+fig = cached_figure('jinko_jp_trend', chart_state, JINKO_VERSION, build_diff_chart)
 st.plotly_chart(fig, use_container_width=True,
                 config={'displayModeBar': False, 'scrollZoom': False}, key='jinko_jp_trend')
 
@@ -165,50 +167,126 @@ if selected_cmap_metric is None:
     selected_cmap_metric = '総人口増減率'
 _is_ratio_metric = selected_cmap_metric == '外国人比率'
 
+# === 比較期間（地図・表の基準年と比較先の年）===
+base_year, latest_year = st.select_slider(
+    '比較期間', options=years, value=(years[0], years[-1]),
+    format_func=lambda y: f'{y}年', key='jinko_year_range',
+)
+
+
+def resolve_city_jinko(geo_name, name_set):
+    """GeoJSONの市区町村名を住基データの市区町村名に対応付ける。"""
+    if geo_name in name_set:
+        return geo_name
+    if '郡' in geo_name:
+        base = geo_name.split('郡', 1)[1]
+        if base in name_set:
+            return base
+    return None
+
+
 # === コロプレス地図 ===
-if not selected_pref:
-    # 都道府県別集計（基準年・最新年）
-    df_bp = df_pref[df_pref['year'] == base_year][['都道府県名', '総人口', '日本人人口', '外国人人口']].rename(
-        columns={'総人口': '総人口_b', '日本人人口': '日本人_b', '外国人人口': '外国人_b'})
-    df_lp = df_pref[df_pref['year'] == latest_year][['都道府県名', '総人口', '日本人人口', '外国人人口']]
-    df_mp = df_lp.merge(df_bp, on='都道府県名')
+# 全国表示では、ベクタータイルがあれば市区町村単位の地図も選べる
+tile_meta = geo_assets.load_tile_meta()
+map_level = '都道府県'
+if not selected_pref and tile_meta:
+    map_level = st.segmented_control(
+        '地図の単位', ['都道府県', '市区町村'], default='都道府県',
+        label_visibility='collapsed', key='jinko_map_level'
+    ) or '都道府県'
+
+if not selected_pref and map_level == '市区町村':
+    # 全国: 市区町村別（ベクタータイル）
+    if selected_cmap_metric == '外国人比率':
+        _pop_col, _pop_label, _val_label = '外国人人口', f'{latest_year}年外国人人口', '外国人比率'
+        _caption = f'外国人比率（{latest_year}年、%）'
+    else:
+        _col = selected_cmap_metric.removesuffix('増減率')
+        _pop_col, _pop_label, _val_label = _col, f'{latest_year}年{_col}', '増減率'
+        _caption = f'{selected_cmap_metric}（{base_year}→{latest_year}年、%）'
+
+    def build_municipal_rows():
+        """タイルの市区町村ごとの (キー, 値, 人口) と色の範囲。"""
+        df_nm = load_comparison('市区町村', base_year, latest_year)
+        df_nm = df_nm[df_nm[selected_cmap_metric].notna()]
+        if _is_ratio_metric:
+            vmin, vmax = 0, float(df_nm[selected_cmap_metric].max())
+        else:
+            # 比較期間が同じ年のときは増減がすべて 0
+            _abs = max(float(df_nm[selected_cmap_metric].abs().max()), 0.1)
+            vmin, vmax = -_abs, _abs
+
+        rows = {
+            (pref_name, city_name): (float(val), int(pop))
+            for pref_name, city_name, val, pop in zip(
+                df_nm['都道府県名'], df_nm['市区町村名'], df_nm[selected_cmap_metric], df_nm[_pop_col])
+        }
+        names_by_pref = {}
+        for pref_name, city_name in rows:
+            names_by_pref.setdefault(pref_name, set()).add(city_name)
+
+        entries = []
+        for pref_name, geo_name in tile_meta['features']:
+            matched = resolve_city_jinko(geo_name, names_by_pref.get(pref_name, set()))
+            if not matched:
+                continue
+            entries.append((geo_assets.tile_key(pref_name, geo_name), *rows[(pref_name, matched)]))
+        return {'entries': entries, 'vmin': vmin, 'vmax': vmax}
+
+    municipal = result_cache.cached(
+        'jinko_municipal_rows', (selected_cmap_metric, base_year, latest_year, tile_meta['version']), JINKO_VERSION,
+        build_municipal_rows,
+    )
+    colormap = cm.LinearColormap(
+        colors=['#d73027', '#fee090', '#4575b4'],
+        vmin=municipal['vmin'], vmax=municipal['vmax'], caption=_caption,
+    )
+    colormap.width = 250
+
+    tile_table = {}
+    for key, val, pop in municipal['entries']:
+        val_str = f'{val:.2f}%' if _is_ratio_metric else f'{val:+.1f}%'
+        tile_table[key] = [colormap(val), f'{_pop_label}: {pop:,}<br>{_val_label}: {val_str}']
+    geo_assets.render_municipal_map(tile_table, colormap)
+
+elif not selected_pref:
+    # 都道府県別集計（基準年・比較先の年）
+    df_mp = load_comparison('都道府県', base_year, latest_year)
 
     if selected_cmap_metric == '総人口増減率':
-        df_mp['_val'] = ((df_mp['総人口'] - df_mp['総人口_b']) / df_mp['総人口_b'] * 100).round(1)
         _caption = f'総人口増減率（{base_year}→{latest_year}年、%）'
         _pop_col, _pop_label, _val_label = '総人口', f'{latest_year}年総人口', '増減率(%)'
     elif selected_cmap_metric == '日本人人口増減率':
-        df_mp['_val'] = ((df_mp['日本人人口'] - df_mp['日本人_b']) / df_mp['日本人_b'] * 100).round(1)
         _caption = f'日本人人口増減率（{base_year}→{latest_year}年、%）'
         _pop_col, _pop_label, _val_label = '日本人人口', f'{latest_year}年日本人人口', '日本人増減率(%)'
     elif selected_cmap_metric == '外国人人口増減率':
-        df_mp['_val'] = ((df_mp['外国人人口'] - df_mp['外国人_b']) / df_mp['外国人_b'] * 100).round(1)
         _caption = f'外国人人口増減率（{base_year}→{latest_year}年、%）'
         _pop_col, _pop_label, _val_label = '外国人人口', f'{latest_year}年外国人人口', '外国人増減率(%)'
     else:  # 外国人比率
-        df_mp['_val'] = (df_mp['外国人人口'] / df_mp['総人口'] * 100).round(2)
         _caption = f'外国人比率（{latest_year}年、%）'
         _pop_col, _pop_label, _val_label = '外国人人口', f'{latest_year}年外国人人口', '外国人比率(%)'
 
-    rate_map = dict(zip(df_mp['都道府県名'], df_mp['_val']))
+    rate_map = dict(zip(df_mp['都道府県名'], df_mp[selected_cmap_metric]))
     pop_map_pref = dict(zip(df_mp['都道府県名'], df_mp[_pop_col]))
 
     if _is_ratio_metric:
         vmin, vmax = 0, max(rate_map.values())
     else:
-        _abs = max(abs(min(rate_map.values())), abs(max(rate_map.values())))
+        _abs = max(abs(min(rate_map.values())), abs(max(rate_map.values())), 0.1)
         vmin, vmax = -_abs, _abs
 
     pref_geo_path = GEO_DIR / 'prefectures.geojson'
     if pref_geo_path.exists():
-        geojson = load_geojson_jinko(str(pref_geo_path))
-        geojson = copy.deepcopy(geojson)
+        _, geojson = geo_assets.load_asset(str(pref_geo_path), '都道府県')
 
+        props = {}
         for feat in geojson['features']:
-            name = feat['properties'].get('都道府県', '')
+            name = feat['id']
             v = rate_map.get(name, 0)
-            feat['properties']['_val_str'] = f"{v:.2f}%" if _is_ratio_metric else f"{v:+.1f}%"
-            feat['properties']['_pop'] = f"{pop_map_pref.get(name, 0):,}"
+            props[name] = {
+                '_val_str': f"{v:.2f}%" if _is_ratio_metric else f"{v:+.1f}%",
+                '_pop': f"{pop_map_pref.get(name, 0):,}",
+            }
 
         colormap = cm.LinearColormap(
             colors=['#d73027', '#fee090', '#4575b4'],
@@ -224,8 +302,8 @@ if not selected_pref:
             val = rate_map.get(name, 0)
             return {'fillColor': colormap(val), 'color': '#fff', 'weight': 0.5, 'fillOpacity': 0.75}
 
-        folium.GeoJson(
-            geojson,
+        geo_assets.geojson_layer(
+            pref_geo_path, '都道府県', props,
             style_function=style_fn,
             highlight_function=lambda f: {'weight': 2, 'color': '#333', 'fillOpacity': 0.9},
             tooltip=folium.GeoJsonTooltip(
@@ -235,7 +313,8 @@ if not selected_pref:
             ),
         ).add_to(m)
         colormap.add_to(m)
-        st_folium(m, use_container_width=True, height=400, returned_objects=[])
+        with span('st_folium'):
+            st_folium(m, use_container_width=True, height=400, returned_objects=[])
 
 elif selected_pref:
     # 都道府県別: 市区町村別コロプレス
@@ -243,20 +322,10 @@ elif selected_pref:
     if pref_idx:
         city_geo_path = GEO_DIR / f'{pref_idx:02d}_{selected_pref}.geojson'
         if city_geo_path.exists():
-            geojson_city = load_geojson_jinko(str(city_geo_path))
-            geojson_city = copy.deepcopy(geojson_city)
-
-            df_cb = df_raw[(df_raw['year'] == base_year) & (df_raw['都道府県名'] == selected_pref)][
-                ['市区町村名', '総人口', '日本人人口', '外国人人口']].rename(
-                columns={'総人口': '総人口_b', '日本人人口': '日本人_b', '外国人人口': '外国人_b'})
-            df_cl = df_raw[(df_raw['year'] == latest_year) & (df_raw['都道府県名'] == selected_pref)][
-                ['市区町村名', '総人口', '日本人人口', '外国人人口']]
-            df_cm = df_cl.merge(df_cb, on='市区町村名', how='left')
-            df_cm['総人口増減率'] = ((df_cm['総人口'] - df_cm['総人口_b']) / df_cm['総人口_b'].replace(0, float('nan')) * 100).round(1)
-            df_cm['日本人人口増減率'] = ((df_cm['日本人人口'] - df_cm['日本人_b']) / df_cm['日本人_b'].replace(0, float('nan')) * 100).round(1)
-            df_cm['外国人人口増減率'] = ((df_cm['外国人人口'] - df_cm['外国人_b']) / df_cm['外国人_b'].replace(0, float('nan')) * 100).round(1)
-            df_cm['外国人比率'] = (df_cm['外国人人口'] / df_cm['総人口'].replace(0, float('nan')) * 100).round(2)
-            df_cm['増減数'] = df_cm['総人口'] - df_cm['総人口_b']
+            _, geojson_city = geo_assets.load_asset(str(city_geo_path), '市区町村')
+
+            df_cm = load_comparison('市区町村', base_year, latest_year)
+            df_cm = df_cm[df_cm['都道府県名'] == selected_pref]
 
             city_name_set = set(df_cm['市区町村名'])
             # 総人口増減率は常にテーブルスタイル用に保持
@@ -277,27 +346,18 @@ elif selected_pref:
 
             city_val_map = dict(zip(df_cm['市区町村名'], df_cm[selected_cmap_metric]))
             city_pop_map = dict(zip(df_cm['市区町村名'], df_cm[city_pop_col]))
-            city_change_map = dict(zip(df_cm['市区町村名'], df_cm['増減数']))
-
-            def resolve_city_jinko(geo_name, name_set):
-                if geo_name in name_set:
-                    return geo_name
-                if '郡' in geo_name:
-                    base = geo_name.split('郡', 1)[1]
-                    if base in name_set:
-                        return base
-                return None
+            city_change_map = dict(zip(df_cm['市区町村名'], df_cm['総人口増減数']))
 
             # _abs_c: テーブルスタイル用（常に総人口増減率ベース）
             valid_rates = [v for v in city_rate_map.values() if pd.notna(v)]
-            _abs_c = max(abs(min(valid_rates)), abs(max(valid_rates))) if valid_rates else 20
+            _abs_c = max(abs(min(valid_rates)), abs(max(valid_rates)), 0.1) if valid_rates else 20
 
             # コロプレス用レンジ
             valid_vals = [v for v in city_val_map.values() if pd.notna(v) and v != float('inf') and v != float('-inf')]
             if _is_ratio_metric:
                 vmin_c, vmax_c = 0, max(valid_vals) if valid_vals else 10
             else:
-                _abs_cv = max(abs(min(valid_vals)), abs(max(valid_vals))) if valid_vals else 20
+                _abs_cv = max(abs(min(valid_vals)), abs(max(valid_vals)), 0.1) if valid_vals else 20
                 vmin_c, vmax_c = -_abs_cv, _abs_cv
 
             colormap_city = cm.LinearColormap(
@@ -306,36 +366,26 @@ elif selected_pref:
             )
             colormap_city.width = 250
 
+            city_props = {}
             for feat in geojson_city['features']:
-                geo_name = feat['properties'].get('市区町村', '')
+                geo_name = feat['id']
                 matched = resolve_city_jinko(geo_name, city_name_set)
                 val = city_val_map.get(matched) if matched else None
                 pop = city_pop_map.get(matched) if matched else None
                 change = city_change_map.get(matched) if matched else None
-                feat['properties']['_pop'] = f"{int(pop):,}" if pop is not None else '-'
-                feat['properties']['増減数'] = f"{int(change):+,}" if change is not None else '-'
-                feat['properties']['_val_str'] = (f"{val:.2f}%" if _is_ratio_metric else f"{val:+.1f}%") if (val is not None and pd.notna(val)) else '-'
+                city_props[geo_name] = {
+                    '_pop': f"{int(pop):,}" if pop is not None else '-',
+                    '増減数': f"{int(change):+,}" if (change is not None and pd.notna(change)) else '-',
+                    '_val_str': (f"{val:.2f}%" if _is_ratio_metric else f"{val:+.1f}%") if (val is not None and pd.notna(val)) else '-',
+                }
 
             coords = []
-            for feat in geojson_city['features']:
-                geo_name = feat['properties'].get('市区町村', '')
-                matched = resolve_city_jinko(geo_name, city_name_set)
-                if selected_city and matched != selected_city:
-                    continue
-                geom = feat['geometry']
-                if geom['type'] == 'Polygon':
-                    coords.extend(geom['coordinates'][0])
-                elif geom['type'] == 'MultiPolygon':
-                    for poly in geom['coordinates']:
-                        coords.extend(poly[0])
+            if selected_city:
+                sel_names = {f['id'] for f in geojson_city['features']
+                             if resolve_city_jinko(f['id'], city_name_set) == selected_city}
+                coords = list(geo_assets.iter_coords(geojson_city, names=sel_names))
             if not coords:
-                for feat in geojson_city['features']:
-                    geom = feat['geometry']
-                    if geom['type'] == 'Polygon':
-                        coords.extend(geom['coordinates'][0])
-                    elif geom['type'] == 'MultiPolygon':
-                        for poly in geom['coordinates']:
-                            coords.extend(poly[0])
+                coords = list(geo_assets.iter_coords(geojson_city))
             lats = [c[1] for c in coords]
             lngs = [c[0] for c in coords]
             lat_c = (min(lats) + max(lats)) / 2
@@ -358,8 +408,8 @@ elif selected_pref:
                     'color': '#fff', 'weight': 0.5, 'fillOpacity': 0.75,
                 }
 
-            folium.GeoJson(
-                geojson_city,
+            geo_assets.geojson_layer(
+                city_geo_path, '市区町村', city_props,
                 style_function=style_fn_city,
                 highlight_function=lambda f: {'weight': 2, 'color': '#333', 'fillOpacity': 0.9},
                 tooltip=folium.GeoJsonTooltip(
@@ -369,42 +419,36 @@ elif selected_pref:
                 ),
             ).add_to(m_city)
             colormap_city.add_to(m_city)
-            st_folium(m_city, use_container_width=True, height=400, returned_objects=[])
+            with span('st_folium'):
+                st_folium(m_city, use_container_width=True, height=400, returned_objects=[])
 
 # === テーブル ===
 if selected_city:
     # 特定市区町村: 1行テーブル（基準年比）
     st.markdown(f'###### {selected_pref}の市区町村別総人口増減（{base_year}→{latest_year}年）')
-    base_pop = df_raw[(df_raw['year'] == base_year) & (df_raw['都道府県名'] == selected_pref) & (df_raw['市区町村名'] == selected_city)]['総人口'].values
-    latest_pop = df_raw[(df_raw['year'] == latest_year) & (df_raw['都道府県名'] == selected_pref) & (df_raw['市区町村名'] == selected_city)]['総人口'].values
-    base_pop = base_pop[0] if len(base_pop) > 0 else None
-    latest_pop = latest_pop[0] if len(latest_pop) > 0 else None
-    増減数 = latest_pop - base_pop if base_pop and latest_pop else None
-    増減率 = round(増減数 / base_pop * 100, 1) if base_pop and 増減数 is not None else None
-    df_table = pd.DataFrame([{'市区町村': selected_city, '総人口': latest_pop, '増減数': 増減数, '増減率': 増減率}])
-    _abs_t = max(abs(増減率), 0.1) if 増減率 is not None else 20
-    styled = df_table.style.format({
-        '総人口': '{:,.0f}',
-        '増減数': '{:+,.0f}',
-        '増減率': '{:+.1f}%',
-    }).background_gradient(subset=['総人口'], cmap='Blues',
-    ).background_gradient(subset=['増減率'], cmap=_CMAP_JINKO, vmin=-_abs_c, vmax=_abs_c,
-    ).hide(axis='index')
-    html = styled.to_html().replace('増減数', f'{base_year}年比増減数').replace('増減率', f'{base_year}年比増減率')
-    st.markdown(f'<div class="custom-table">{html}</div>', unsafe_allow_html=True)
+    df_cmp = load_comparison('市区町村', base_year, latest_year)
+    df_table = df_cmp[(df_cmp['都道府県名'] == selected_pref) & (df_cmp['市区町村名'] == selected_city)].rename(
+        columns={'市区町村名': '市区町村', '総人口増減数': '増減数', '総人口増減率': '増減率'},
+    )[['市区町村', '総人口', '増減数', '増減率']]
+    arrow_table(
+        df_table,
+        formats={'総人口': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+        gradients={
+            '総人口': {'cmap': 'Blues'},
+            '増減率': {'cmap': _CMAP_JINKO, 'vmin': -_abs_c, 'vmax': _abs_c},
+        },
+        headers={'増減数': f'{base_year}年比増減数', '増減率': f'{base_year}年比増減率'},
+        key='jinko_city_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 総務省 住民基本台帳に基づく人口（2025年1月）</p>', unsafe_allow_html=True)
 
 elif selected_pref:
     # 都道府県内の市区町村別
     st.markdown(f'###### {selected_pref}の市区町村別総人口増減（{base_year}→{latest_year}年）')
-    df_city_base = df_raw[(df_raw['year'] == base_year) & (df_raw['都道府県名'] == selected_pref)][
-        ['市区町村名', '総人口']].rename(columns={'総人口': '基準人口'})
-    df_city_latest = df_raw[(df_raw['year'] == latest_year) & (df_raw['都道府県名'] == selected_pref)][
-        ['市区町村名', '総人口']].copy()
-    df_table = df_city_latest.merge(df_city_base, on='市区町村名', how='left')
-    df_table['増減数'] = df_table['総人口'] - df_table['基準人口']
-    df_table['増減率'] = (df_table['増減数'] / df_table['基準人口'] * 100).round(1)
-    df_table = df_table.rename(columns={'市区町村名': '市区町村'})[['市区町村', '総人口', '増減数', '増減率']]
+    df_cmp = load_comparison('市区町村', base_year, latest_year)
+    df_table = df_cmp[df_cmp['都道府県名'] == selected_pref].rename(
+        columns={'市区町村名': '市区町村', '総人口増減数': '増減数', '総人口増減率': '増減率'},
+    )[['市区町村', '総人口', '増減数', '増減率']]
 
     sort_opts = ['総人口', '増減数', '増減率']
     selected_sort = st.segmented_control('ソート順', sort_opts, default='総人口',
@@ -416,26 +460,25 @@ elif selected_pref:
     elif selected_sort == '増減率':
         df_table = df_table.sort_values('増減率')
     df_table = df_table.reset_index(drop=True)
-    _abs_t = max(abs(df_table['増減率'].min()), abs(df_table['増減率'].max()))
-    styled = df_table.style.format({
-        '総人口': '{:,.0f}',
-        '増減数': '{:+,.0f}',
-        '増減率': '{:+.1f}%',
-    }).background_gradient(subset=['総人口'], cmap='Blues',
-    ).background_gradient(subset=['増減率'], cmap=_CMAP_JINKO, vmin=-_abs_t, vmax=_abs_t,
-    ).hide(axis='index')
-    html = styled.to_html().replace('増減数', f'{base_year}年比増減数').replace('増減率', f'{base_year}年比増減率')
-    st.markdown(f'<div class="custom-table">{html}</div>', unsafe_allow_html=True)
+    _abs_t = max(abs(df_table['増減率'].min()), abs(df_table['増減率'].max()), 0.1)
+    arrow_table(
+        df_table,
+        formats={'総人口': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+        gradients={
+            '総人口': {'cmap': 'Blues'},
+            '増減率': {'cmap': _CMAP_JINKO, 'vmin': -_abs_t, 'vmax': _abs_t},
+        },
+        headers={'増減数': f'{base_year}年比増減数', '増減率': f'{base_year}年比増減率'},
+        key='jinko_city_list_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 総務省 住民基本台帳に基づく人口（2025年1月）</p>', unsafe_allow_html=True)
 
 else:
     # 都道府県別（総人口ベース）
     st.markdown(f'###### 都道府県別総人口増減（{base_year}→{latest_year}年）')
-    df_base_tot = df_pref[df_pref['year'] == base_year][['都道府県名', '総人口']].rename(columns={'総人口': '基準人口'})
-    df_latest_tot = df_pref[df_pref['year'] == latest_year].merge(df_base_tot, on='都道府県名')
-    df_latest_tot['増減数'] = df_latest_tot['総人口'] - df_latest_tot['基準人口']
-    df_latest_tot['増減率'] = (df_latest_tot['増減数'] / df_latest_tot['基準人口'] * 100).round(1)
-    df_table = df_latest_tot[['都道府県名', '総人口', '増減数', '増減率']].rename(columns={'都道府県名': '都道府県'})
+    df_table = load_comparison('都道府県', base_year, latest_year).rename(
+        columns={'都道府県名': '都道府県', '総人口増減数': '増減数', '総人口増減率': '増減率'},
+    )[['都道府県', '総人口', '増減数', '増減率']]
 
     sort_opts = ['デフォルト', '総人口', '増減数', '増減率']
     selected_sort = st.segmented_control('ソート順', sort_opts, default='デフォルト',
@@ -453,14 +496,201 @@ else:
         df_table = df_table.sort_values('増減率')
 
     df_table = df_table.reset_index(drop=True)
-    _abs_t = max(abs(df_table['増減率'].min()), abs(df_table['増減率'].max()))
-    styled = df_table.style.format({
-        '総人口': '{:,.0f}',
-        '増減数': '{:+,.0f}',
-        '増減率': '{:+.1f}%',
-    }).background_gradient(subset=['総人口'], cmap='Blues',
-    ).background_gradient(subset=['増減率'], cmap=_CMAP_JINKO, vmin=-_abs_t, vmax=_abs_t,
-    ).hide(axis='index')
-    html = styled.to_html().replace('増減数', f'{base_year}年比増減数').replace('増減率', f'{base_year}年比増減率')
-    st.markdown(f'<div class="custom-table">{html}</div>', unsafe_allow_html=True)
+    _abs_t = max(abs(df_table['増減率'].min()), abs(df_table['増減率'].max()), 0.1)
+    arrow_table(
+        df_table,
+        formats={'総人口': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+        gradients={
+            '総人口': {'cmap': 'Blues'},
+            '増減率': {'cmap': _CMAP_JINKO, 'vmin': -_abs_t, 'vmax': _abs_t},
+        },
+        headers={'増減数': f'{base_year}年比増減数', '増減率': f'{base_year}年比増減率'},
+        key='jinko_pref_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 総務省 住民基本台帳に基づく人口（2025年1月）</p>', unsafe_allow_html=True)
+
+
+def render_area_map(df_area, value_col, pop_col, pop_label, val_label, caption, colors, val_fmt, key,
+                    diverging=False):
+    """選択中の地域の塗り分け地図（全国は都道府県別、都道府県選択時は市区町村別）。
+
+    df_area: 都道府県名（市区町村別は市区町村名も）・pop_col・value_col の列を持つ地域ごとのフレーム。
+    diverging: 0 を中心に左右対称の色の範囲にする。
+    """
+    if selected_pref:
+        pref_idx = PREF_ORDER.index(selected_pref) + 1 if selected_pref in PREF_ORDER else None
+        geo_path = GEO_DIR / f'{pref_idx:02d}_{selected_pref}.geojson' if pref_idx else None
+        key_prop = '市区町村'
+        df_area = df_area[df_area['都道府県名'] == selected_pref]
+        names = df_area['市区町村名']
+    else:
+        geo_path = GEO_DIR / 'prefectures.geojson'
+        key_prop = '都道府県'
+        names = df_area['都道府県名']
+    if geo_path is None or not geo_path.exists():
+        return
+    val_map = dict(zip(names, df_area[value_col]))
+    pop_map = dict(zip(names, df_area[pop_col]))
+    name_set = set(val_map)
+    _, geojson_area = geo_assets.load_asset(str(geo_path), key_prop)
+
+    valid = [v for v in val_map.values() if pd.notna(v)]
+    if diverging:
+        _abs = max([abs(v) for v in valid] + [0.1])
+        vmin, vmax = -_abs, _abs
+    else:
+        vmin = min(valid, default=0)
+        vmax = max(max(valid, default=0), vmin + 0.1)
+    colormap_area = cm.LinearColormap(colors=colors, vmin=vmin, vmax=vmax, caption=caption)
+    colormap_area.width = 250
+
+    def match(geo_name):
+        return resolve_city_jinko(geo_name, name_set) if selected_pref else geo_name
+
+    props = {}
+    for feat in geojson_area['features']:
+        matched = match(feat['id'])
+        val, pop = val_map.get(matched), pop_map.get(matched)
+        props[feat['id']] = {
+            '_pop': f'{int(pop):,}' if pop is not None else '-',
+            '_val_str': val_fmt.format(val) if (val is not None and pd.notna(val)) else '-',
+        }
+
+    def style_fn_area(feature):
+        val = val_map.get(match(feature['properties'].get(key_prop, '')))
+        return {
+            'fillColor': colormap_area(val) if (val is not None and pd.notna(val)) else '#cccccc',
+            'color': '#fff', 'weight': 0.5, 'fillOpacity': 0.75,
+        }
+
+    m_area = folium.Map(location=[37, 137], zoom_start=5, tiles='cartodbpositron')
+    if selected_pref:
+        coords = list(geo_assets.iter_coords(geojson_area))
+        lats = [c[1] for c in coords]
+        lngs = [c[0] for c in coords]
+        m_area.fit_bounds([[min(lats), min(lngs)], [max(lats), max(lngs)]])
+    else:
+        m_area.fit_bounds([[24, 122], [46, 146]])
+    geo_assets.geojson_layer(
+        geo_path, key_prop, props,
+        style_function=style_fn_area,
+        highlight_function=lambda f: {'weight': 2, 'color': '#333', 'fillOpacity': 0.9},
+        tooltip=folium.GeoJsonTooltip(
+            fields=[key_prop, '_pop', '_val_str'],
+            aliases=['', pop_label, val_label],
+            sticky=True, style='font-size:13px;',
+        ),
+    ).add_to(m_area)
+    colormap_area.add_to(m_area)
+    with span('st_folium'):
+        st_folium(m_area, use_container_width=True, height=400, returned_objects=[], key=key)
+
+
+# === 年齢構成（年齢別キューブがある場合）===
+if AGE_CUBE_PATH.exists():
+    age_cube = load_age_cube()
+    AGE_VERSION = data_version(AGE_CUBE_PATH, AGE_AXES_PATH)
+    age_year = latest_year if latest_year in age_cube.year_pos else age_cube.years[-1]
+
+    def build_pyramid():
+        pyramid = age_cube.pyramid(age_year, selected_pref, selected_city)
+        colors = {'日本人': '#d73027', '外国人': '#4575b4'}
+        fig = go.Figure()
+        for sex, sign in (('男', -1), ('女', 1)):
+            for nat in age_cube.nationalities:
+                values = pyramid[(sex, nat)]
+                fig.add_trace(go.Bar(
+                    y=pyramid.index, x=values * sign, customdata=values, orientation='h',
+                    name=nat, legendgroup=nat, showlegend=sex == '男', marker_color=colors.get(nat),
+                    hovertemplate=f'{sex}・{nat} %{{y}}: %{{customdata:,}}人<extra></extra>',
+                ))
+        # 横軸は男女の大きい方に合わせて左右対称にする
+        edge = int(pyramid.T.groupby(level='性別').sum().to_numpy().max()) or 1
+        ticks = [edge * f for f in (-1, -0.5, 0, 0.5, 1)]
+        fig.update_layout(
+            barmode='relative', bargap=0.05,
+            xaxis=dict(title='← 男性　人口（人）　女性 →', tickvals=ticks,
+                       ticktext=[f'{abs(t):,.0f}' for t in ticks], fixedrange=True),
+            yaxis=dict(fixedrange=True),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            margin=dict(l=10, r=10, t=30, b=10), height=420,
+            dragmode=False,
+        )
+        return fig
+
+    st.markdown(f'###### 人口ピラミッド（{title_suffix}、{age_year}年）')
+    fig_pyramid = cached_figure('jinko_pyramid', (*chart_state, age_year), AGE_VERSION, build_pyramid)
+    st.plotly_chart(fig_pyramid, use_container_width=True,
+                    config={'displayModeBar': False, 'scrollZoom': False}, key='jinko_pyramid')
+
+    selected_age_metric = st.segmented_control(
+        '年齢構成の指標', list(SHARES), default='高齢化率',
+        label_visibility='collapsed', key='jinko_age_metric'
+    ) or '高齢化率'
+    _age_range = {'高齢化率': '65歳以上', '生産年齢人口割合': '15〜64歳'}[selected_age_metric]
+    age_caption = f'{selected_age_metric}（{_age_range}、{age_year}年、%）'
+    # 高齢化率は高いほど、生産年齢人口割合は低いほど赤
+    age_colors = ['#4575b4', '#fee090', '#d73027']
+    if selected_age_metric == '生産年齢人口割合':
+        age_colors = age_colors[::-1]
+
+    render_area_map(
+        load_shares(age_year, '都道府県' if not selected_pref else '市区町村'), selected_age_metric, '総人口',
+        pop_label=f'{age_year}年総人口', val_label=selected_age_metric, caption=age_caption,
+        colors=age_colors, val_fmt='{:.1f}%', key='jinko_age_map',
+    )
+
+# === 将来推計（コーホート要因法、年齢別キューブがある場合）===
+if AGE_CUBE_PATH.exists():
+    with st.expander('将来推計の前提'):
+        st.caption('直近5年の実績から求めた生残率・出生率・純移動率（市区町村・年齢・性別・国籍ごと）に対する倍率。')
+        proj_years = st.slider('推計年数', 10, 30, 20, step=5, key='jinko_proj_years')
+        proj_col1, proj_col2 = st.columns(2)
+        scenario = Scenario(
+            years=proj_years,
+            fertility=proj_col1.slider('出生率', 0.5, 1.5, 1.0, 0.05, key='jinko_proj_fertility'),
+            mortality=proj_col2.slider('死亡率', 0.5, 1.5, 1.0, 0.05, key='jinko_proj_mortality'),
+            japanese_migration=proj_col1.slider('日本人の純移動', 0.0, 2.0, 1.0, 0.1, key='jinko_proj_jp_migration'),
+            foreign_migration=proj_col2.slider('外国人の純移動', 0.0, 2.0, 1.0, 0.1, key='jinko_proj_fr_migration'),
+        )
+    with span('jinko_projection'):
+        projection = load_projection(scenario)
+    final_year = projection.years[-1]
+
+    def build_projection_chart():
+        df_hist = chart_frame()
+        df_proj = projection.series(selected_pref, selected_city).round()
+        fig = go.Figure()
+        for nat, color, axis in (('日本人', '#d73027', 'y1'), ('外国人', '#4575b4', 'y2')):
+            fig.add_trace(go.Scatter(
+                x=df_hist['year'], y=df_hist[f'{nat}人口'], name=f'{nat}人口（実績）',
+                mode='lines', line=dict(color=color, width=2), yaxis=axis,
+            ))
+            fig.add_trace(go.Scatter(
+                x=df_proj.index, y=df_proj[nat], name=f'{nat}人口（推計）',
+                mode='lines', line=dict(color=color, width=2, dash='dot'), yaxis=axis,
+            ))
+        fig.update_layout(
+            xaxis=dict(fixedrange=True, showgrid=False),
+            yaxis=dict(title='日本人人口（人）', fixedrange=True, tickformat=',', showgrid=False),
+            yaxis2=dict(title='外国人人口（人）', overlaying='y', side='right', fixedrange=True,
+                        tickformat=',', showgrid=False),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            margin=dict(l=10, r=10, t=30, b=10), height=300,
+            dragmode=False,
+        )
+        return fig
+
+    st.markdown(f'###### 将来推計（{title_suffix}、{projection.base_year}→{final_year}年）')
+    fig_proj = cached_figure('jinko_projection', (*chart_state, scenario), AGE_VERSION, build_projection_chart)
+    st.plotly_chart(fig_proj, use_container_width=True,
+                    config={'displayModeBar': False, 'scrollZoom': False}, key='jinko_projection')
+
+    render_area_map(
+        projection.change(final_year, '都道府県' if not selected_pref else '市区町村'), '増減率', '推計人口',
+        pop_label=f'{final_year}年推計人口', val_label='推計増減率',
+        caption=f'推計人口増減率（{projection.base_year}→{final_year}年、%）',
+        colors=['#d73027', '#fee090', '#4575b4'], val_fmt='{:+.1f}%', key='jinko_projection_map', diverging=True,
+    )
+    st.caption('住民基本台帳の年齢別人口（1月1日基準）による簡易推計。'
+               '国立社会保障・人口問題研究所の将来推計人口とは方法・前提が異なる。')
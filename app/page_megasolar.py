@@ -1,14 +1,21 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import copy
-import json
-import unicodedata
-from collections import defaultdict
 from pathlib import Path
 import folium
 from streamlit_folium import st_folium
 import branca.colormap as cm
 import plotly.graph_objects as go
+import geo_assets
+from arrow_table import arrow_table
+from figure_cache import cached_figure
+from datastore import (SOLAR_HISTORY_PATH, SOLAR_LOCATION_DIR, data_version, load_solar_cube,
+                       load_solar_history, load_solar_prefectures, parcels_of, solar_version)
+from solar_history import capacity_timeline, conversions
+from solar_points import load_index as load_point_index, render_point_map
+from solar_query import load_index
+from solar_search import load_index as load_search_index
+from tracing import span
 
 # CSS読み込み
 css_path = Path(__file__).parent / 'styles.css'
@@ -29,71 +36,7 @@ PREF_ORDER = [
 ]
 
 
-@st.cache_data
-def load_mega_solar():
-    df = pd.read_parquet(DATA_DIR / 'solar_nintei.parquet')
-    df = df[df['発電設備区分'].str.contains('太陽光', na=False)].copy()
-    df['出力kW'] = pd.to_numeric(df['太陽電池の合計出力kW'], errors='coerce').fillna(0)
-    df = df[df['出力kW'] >= 1000].copy()
-
-    # 市区町村名の抽出
-    cities_df = pd.read_csv(DATA_DIR / 'daicho' / 'dantai_code_w_name.csv')
-    level3 = cities_df[cities_df['エリアレベル'] == 'level3']
-    level2 = cities_df[cities_df['エリアレベル'] == 'level2']
-
-    pref_cities_l3 = defaultdict(list)
-    for _, row in level3.iterrows():
-        pref_cities_l3[row['都道府県名']].append(row['市区町村名'])
-    for pref in pref_cities_l3:
-        pref_cities_l3[pref].sort(key=len, reverse=True)
-
-    # level2 fallback (政令指定都市など)
-    pref_cities_l2 = defaultdict(list)
-    for _, row in level2.iterrows():
-        pref_cities_l2[row['都道府県名']].append(row['市区町村名'])
-    for pref in pref_cities_l2:
-        pref_cities_l2[pref].sort(key=len, reverse=True)
-
-    def extract_city(pref, addr):
-        addr = unicodedata.normalize('NFKC', str(addr))
-        if addr.startswith(pref):
-            addr = addr[len(pref):]
-        # level3 最長一致
-        for name in pref_cities_l3.get(pref, []):
-            if addr.startswith(name):
-                return name
-        # 郡付き住所: 郡の後ろでマッチ
-        if '郡' in addr:
-            rest = addr.split('郡', 1)[1]
-            for name in pref_cities_l3.get(pref, []):
-                if rest.startswith(name):
-                    return name
-        # level2 fallback (旧区名など → 親市)
-        for name in pref_cities_l2.get(pref, []):
-            if addr.startswith(name):
-                return name
-        return None
-
-    df['市区町村'] = df.apply(lambda r: extract_city(r['都道府県'], r['代表住所']), axis=1)
-
-    # 調達期間終了年月をパース
-    def parse_end_ym(s):
-        try:
-            parts = s.replace('年', ' ').replace('月', '').split()
-            return pd.Timestamp(year=int(parts[0]), month=int(parts[1]), day=1)
-        except Exception:
-            return pd.NaT
-
-    df['_調達終了'] = df['調達期間終了年月'].apply(parse_end_ym)
-
-    # 新規認定日（Excelシリアル値 → 年）
-    origin = pd.Timestamp('1899-12-30')
-    df['認定年'] = (origin + pd.to_timedelta(df['新規認定日'], unit='D')).dt.year
-
-    return df
-
-
-df_nintei = load_mega_solar()
+SOLAR_VERSION = solar_version()
 today = pd.Timestamp.today().normalize()
 
 st.title('メガソーラー')
@@ -106,97 +49,125 @@ st.info(
 )
 
 # 都道府県フィルター
-available_prefs = ['全国'] + [p for p in PREF_ORDER if p in df_nintei['都道府県'].unique()]
+available_prefs = ['全国'] + load_solar_prefectures()
 selected_pref_raw = st.selectbox('都道府県を選択', available_prefs,
                                   label_visibility='collapsed', key='solar_pref_filter')
 selected_pref = None if selected_pref_raw == '全国' else selected_pref_raw
 
-# フィルタ適用
-if selected_pref:
-    df_view = df_nintei[df_nintei['都道府県'] == selected_pref]
-else:
-    df_view = df_nintei
+# 件数・出力の集計は (都道府県, 市区町村, 状態, 認定年) のキューブから引く
+with span('load_solar_cube'):
+    cube = load_solar_cube(today)
+cube_view = cube[cube['都道府県'] == selected_pref] if selected_pref else cube
 
 # 運転終了 / 運転中 / 運転予定 に分類
-df_ended = df_view[df_view['_調達終了'].notna() & (df_view['_調達終了'] < today)]
-df_rest = df_view[~df_view.index.isin(df_ended.index)]
-df_operating = df_rest[df_rest['運転開始報告年月'] != '-']
-df_planned = df_rest[df_rest['運転開始報告年月'] == '-']
-
-status_options = [
-    f'運転中（{len(df_operating):,}件）',
-    f'運転予定（{len(df_planned):,}件）',
-    f'運転終了（{len(df_ended):,}件）',
-]
+status_counts = cube_view.groupby('状態')['件数'].sum()
+status_options = [f'{s}（{status_counts.get(s, 0):,}件）' for s in ['運転中', '運転予定', '運転終了']]
 status_label = st.radio('ステータス', status_options,
                         horizontal=True, label_visibility='collapsed', key='solar_status_radio')
-if status_label.startswith('運転終了'):
-    df_target = df_ended
-elif status_label.startswith('運転予定'):
-    df_target = df_planned
-else:
-    df_target = df_operating
+selected_status = status_label.split('（', 1)[0]
+cube_target = cube_view[cube_view['状態'] == selected_status]
 
 # === 年別認定推移グラフ ===
 title_suffix = selected_pref if selected_pref else '全国'
-df_trend_src = df_view  # ステータスフィルタ前の全件を使う
-trend = df_trend_src.groupby('認定年').agg(
-    件数=('設備ID', 'count'),
-    合計出力MW=('出力kW', lambda x: x.sum() / 1_000),
-).reset_index().sort_values('認定年')
-trend = trend[trend['認定年'] <= pd.Timestamp.today().year]
-trend['累計出力MW'] = trend['合計出力MW'].cumsum()
+
+
+def build_trend_chart():
+    # ステータスフィルタ前の全件を使う
+    trend = cube_view.groupby('認定年').agg(
+        件数=('件数', 'sum'),
+        合計出力MW=('合計出力kW', lambda x: x.sum() / 1_000),
+    ).reset_index().sort_values('認定年')
+    trend = trend[trend['認定年'] <= today.year]
+    trend['累計出力MW'] = trend['合計出力MW'].cumsum()
+
+    fig_trend = go.Figure()
+    fig_trend.add_trace(go.Bar(
+        x=trend['認定年'], y=trend['件数'],
+        name='新規認定件数',
+        marker_color='#fc8d59',
+        yaxis='y1',
+    ))
+    fig_trend.add_trace(go.Scatter(
+        x=trend['認定年'], y=trend['累計出力MW'].round(0),
+        name='累計出力（MW）', mode='lines+markers',
+        line=dict(color='#d73027', width=2),
+        yaxis='y2',
+    ))
+    fig_trend.update_layout(
+        xaxis=dict(tickmode='linear', dtick=1, fixedrange=True, showgrid=False),
+        yaxis=dict(title='認定件数', fixedrange=True, tickformat=',', showgrid=False),
+        yaxis2=dict(title='累計出力（MW）', overlaying='y', side='right', fixedrange=True, tickformat=',', showgrid=False),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(l=10, r=10, t=30, b=10), height=260,
+        dragmode=False,
+    )
+    return fig_trend
+
 
 st.markdown(f'###### 年別新規認定件数・出力の推移（{title_suffix}）')
-fig_trend = go.Figure()
-fig_trend.add_trace(go.Bar(
-    x=trend['認定年'], y=trend['件数'],
-    name='新規認定件数',
-    marker_color='#fc8d59',
-    yaxis='y1',
-))
-fig_trend.add_trace(go.Scatter(
-    x=trend['認定年'], y=trend['累計出力MW'].round(0),
-    name='累計出力（MW）', mode='lines+markers',
-    line=dict(color='#d73027', width=2),
-    yaxis='y2',
-))
-fig_trend.update_layout(
-    xaxis=dict(tickmode='linear', dtick=1, fixedrange=True, showgrid=False),
-    yaxis=dict(title='認定件数', fixedrange=True, tickformat=',', showgrid=False),
-    yaxis2=dict(title='累計出力（MW）', overlaying='y', side='right', fixedrange=True, tickformat=',', showgrid=False),
-    legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
-    margin=dict(l=10, r=10, t=30, b=10), height=260,
-    dragmode=False,
-)
+fig_trend = cached_figure('solar_trend', (selected_pref, today.year), SOLAR_VERSION, build_trend_chart)
 st.plotly_chart(fig_trend, use_container_width=True,
                 config={'displayModeBar': False, 'scrollZoom': False}, key='solar_trend')
 
+# === 運転予定 → 運転中 の推移（月次の履歴から） ===
+if SOLAR_HISTORY_PATH.exists():
+    with span('load_solar_history'):
+        solar_history = load_solar_history()
+    if selected_pref:
+        solar_history = solar_history[solar_history['都道府県'] == selected_pref]
+
+    def build_history_chart():
+        timeline = capacity_timeline(solar_history) / 1_000
+        converted = conversions(solar_history)
+        fig = go.Figure()
+        for status, color in [('運転中', '#d73027'), ('運転予定', '#fdae61')]:
+            if status in timeline:
+                fig.add_trace(go.Scatter(
+                    x=timeline.index, y=timeline[status].round(0), name=f'{status}（MW）',
+                    mode='lines', stackgroup='capacity', line=dict(color=color, width=1),
+                ))
+        fig.add_trace(go.Bar(
+            x=converted.index, y=(converted['出力kW'] / 1_000).round(1), name='運転開始（MW）',
+            customdata=converted['件数'], hovertemplate='%{y:,.1f}MW（%{customdata:,}件）',
+            marker_color='#4575b4', yaxis='y2',
+        ))
+        fig.update_layout(
+            xaxis=dict(fixedrange=True, showgrid=False, tickformat='%Y-%m'),
+            yaxis=dict(title='合計出力（MW）', fixedrange=True, tickformat=',', showgrid=False),
+            yaxis2=dict(title='運転開始（MW）', overlaying='y', side='right', fixedrange=True, tickformat=',',
+                        showgrid=False),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            margin=dict(l=10, r=10, t=30, b=10), height=260,
+            dragmode=False,
+        )
+        return fig
+
+    if solar_history['valid_from'].nunique() > 1:
+        st.markdown(f'###### 運転予定・運転中の出力の推移（{title_suffix}、月次）')
+        fig_history = cached_figure('solar_history', (selected_pref,), data_version(SOLAR_HISTORY_PATH),
+                                    build_history_chart)
+        st.plotly_chart(fig_history, use_container_width=True,
+                        config={'displayModeBar': False, 'scrollZoom': False}, key='solar_history')
+
 # コロプレス地図
 GEO_DIR = DATA_DIR / 'geo'
 
 
-@st.cache_data
-def load_geojson(path):
-    with open(path) as f:
-        return json.load(f)
-
-
-def render_choropleth(geojson_data, agg_data, key_col):
+@span('choropleth')
+def render_choropleth(geo_path, agg_data, key_col):
     """コロプレス地図を描画する。"""
-    geojson_data = copy.deepcopy(geojson_data)
     value_map = dict(zip(agg_data[key_col], agg_data['合計出力kW']))
     if not value_map:
         return
 
     count_map = dict(zip(agg_data[key_col], agg_data['件数']))
 
-    # featureにプロパティ追加
-    for feat in geojson_data['features']:
-        name = feat['properties'].get(key_col, '')
-        mw = value_map.get(name, 0) / 1_000
-        feat['properties']['出力MW'] = round(mw, 1)
-        feat['properties']['件数'] = count_map.get(name, 0)
+    # ツールチップ用プロパティ
+    _, geojson = geo_assets.load_asset(str(geo_path), key_col)
+    props = {
+        feat['id']: {'出力MW': round(value_map.get(feat['id'], 0) / 1_000, 1), '件数': count_map.get(feat['id'], 0)}
+        for feat in geojson['features']
+    }
 
     vmin = min(value_map.values())
     vmax = max(value_map.values())
@@ -208,16 +179,7 @@ def render_choropleth(geojson_data, agg_data, key_col):
     colormap.width = 250
 
     # 地図の中心を計算
-    coords = []
-    for feat in geojson_data['features']:
-        name = feat['properties'].get(key_col, '')
-        if name in value_map:
-            geom = feat['geometry']
-            if geom['type'] == 'Polygon':
-                coords.extend(geom['coordinates'][0])
-            elif geom['type'] == 'MultiPolygon':
-                for poly in geom['coordinates']:
-                    coords.extend(poly[0])
+    coords = list(geo_assets.iter_coords(geojson, names=value_map))
     if not coords:
         return
     lats = [c[1] for c in coords]
@@ -239,8 +201,8 @@ def render_choropleth(geojson_data, agg_data, key_col):
             'fillOpacity': 0.7,
         }
 
-    folium.GeoJson(
-        geojson_data,
+    geo_assets.geojson_layer(
+        geo_path, key_col, props,
         style_function=style_fn,
         highlight_function=lambda f: {'weight': 2, 'color': '#333', 'fillOpacity': 0.9},
         tooltip=folium.GeoJsonTooltip(
@@ -253,48 +215,68 @@ def render_choropleth(geojson_data, agg_data, key_col):
     ).add_to(m)
     colormap.add_to(m)
 
-    st_folium(m, use_container_width=True, height=400, returned_objects=[])
+    with span('st_folium'):
+        st_folium(m, use_container_width=True, height=400, returned_objects=[])
 
 
 # 地図の集計データ（ソート前）
-map_agg = df_target.groupby('都道府県' if not selected_pref else '市区町村').agg(
-    件数=('設備ID', 'count'),
-    合計出力kW=('出力kW', 'sum'),
-).reset_index()
-
-if selected_pref:
+with span('aggregate'):
+    group_col = '都道府県' if not selected_pref else '市区町村'
+    map_agg = cube_target.groupby(group_col)[['件数', '合計出力kW']].sum().reset_index()
+
+# 全国表示では、ベクタータイルがあれば市区町村単位の地図も選べる
+tile_meta = geo_assets.load_tile_meta()
+map_level = '都道府県'
+if not selected_pref and tile_meta:
+    map_level = st.segmented_control(
+        '地図の単位', ['都道府県', '市区町村'], default='都道府県',
+        label_visibility='collapsed', key='solar_map_level'
+    ) or '都道府県'
+
+if not selected_pref and map_level == '市区町村':
+    city_agg = cube_target.groupby(['都道府県', '市区町村'])[['件数', '合計出力kW']].sum().reset_index()
+    if not city_agg.empty:
+        colormap = cm.LinearColormap(
+            colors=['#fee0d2', '#fc9272', '#de2d26'],
+            vmin=city_agg['合計出力kW'].min() / 1_000, vmax=city_agg['合計出力kW'].max() / 1_000,
+            caption='合計出力 (MW)',
+        )
+        colormap.width = 250
+        tile_table = {
+            geo_assets.tile_key(r.都道府県, r.市区町村): [
+                colormap(r.合計出力kW / 1_000),
+                f'件数: {r.件数:,}<br>出力(MW): {r.合計出力kW / 1_000:,.1f}',
+            ]
+            for r in city_agg.itertuples(index=False)
+        }
+        geo_assets.render_municipal_map(tile_table, colormap)
+elif selected_pref:
     geo_path = None
     pref_idx = PREF_ORDER.index(selected_pref) + 1 if selected_pref in PREF_ORDER else None
     if pref_idx:
         geo_path = GEO_DIR / f'{pref_idx:02d}_{selected_pref}.geojson'
     if geo_path and geo_path.exists():
-        geojson = load_geojson(str(geo_path))
-        render_choropleth(geojson, map_agg, '市区町村')
+        render_choropleth(geo_path, map_agg, '市区町村')
 else:
     pref_geo = GEO_DIR / 'prefectures.geojson'
     if pref_geo.exists():
-        geojson = load_geojson(str(pref_geo))
-        render_choropleth(geojson, map_agg, '都道府県')
+        render_choropleth(pref_geo, map_agg, '都道府県')
+
+# 設備ごとの地図（表示範囲のクラスタ・設備だけを送る）
+if st.toggle('設備ごとの地図を表示', key='solar_point_map_toggle'):
+    with span('load_point_index'):
+        point_index = load_point_index(selected_pref, selected_status, today)
+    render_point_map(point_index, key=f'solar_point_map_{selected_pref or "全国"}_{selected_status}')
 
-# 集計
+# 集計（地図と同じ集計を並べ替える）
+agg = map_agg.copy()
+agg['合計出力MW'] = (agg['合計出力kW'] / 1_000).round(1)
 if selected_pref:
     # 市区町村別
-    group_col = '市区町村'
-    agg = df_target.groupby(group_col).agg(
-        件数=('設備ID', 'count'),
-        合計出力kW=('出力kW', 'sum'),
-    ).reset_index()
-    agg['合計出力MW'] = (agg['合計出力kW'] / 1_000).round(1)
     agg = agg.sort_values('合計出力kW', ascending=False).reset_index(drop=True)
 else:
     # 都道府県別
-    group_col = '都道府県'
     pref_order_map = {p: i for i, p in enumerate(PREF_ORDER)}
-    agg = df_target.groupby(group_col).agg(
-        件数=('設備ID', 'count'),
-        合計出力kW=('出力kW', 'sum'),
-    ).reset_index()
-    agg['合計出力MW'] = (agg['合計出力kW'] / 1_000).round(1)
     agg['_order'] = agg['都道府県'].map(pref_order_map)
     agg = agg.sort_values('_order').reset_index(drop=True)
 
@@ -308,33 +290,129 @@ if selected_sort == '件数':
     agg = agg.sort_values('件数', ascending=False).reset_index(drop=True)
 elif selected_sort == '出力':
     agg = agg.sort_values('合計出力kW', ascending=False).reset_index(drop=True)
-disp = agg[[group_col, '件数', '合計出力MW']].copy()
-format_cols = {'件数': '{:,.0f}', '合計出力MW': '{:,.1f}'}
-grad_cols = ['件数', '合計出力MW']
-
-styled = disp.style.format(format_cols).background_gradient(
-    subset=grad_cols,
-    cmap='OrRd',
-).hide(axis='index')
-html = styled.to_html().replace('合計出力MW', '合計出力<br>(MW)')
-st.markdown(f'<div class="custom-table">{html}</div>', unsafe_allow_html=True)
-
-# Top10 ランキング（個別設備）
-st.markdown('###### 発電設備別Top20')
-top20 = (df_target[['発電事業者名', '都道府県', '市区町村', '出力kW']]
-    .sort_values('出力kW', ascending=False)
-    .head(20)
-    .reset_index(drop=True))
+disp = agg[[group_col, '件数', '合計出力MW']]
+arrow_table(
+    disp,
+    formats={'件数': '{:,.0f}', '合計出力MW': '{:,.1f}'},
+    gradients={'件数': {'cmap': 'OrRd'}, '合計出力MW': {'cmap': 'OrRd'}},
+    headers={'合計出力MW': '合計出力\n(MW)'},
+    key='solar_agg_table',
+)
+
+# 発電設備別ランキング（条件で絞り込み、出力の大きい順にページ送り）
+st.markdown('###### 発電設備別ランキング')
+with span('load_facility_index'):
+    facility_index = load_index(selected_pref, today)
+
+
+def _range(key, label, extent, scale=1, step=None):
+    """範囲スライダー。全範囲のままなら None（値のない設備も含める）。"""
+    if extent is None:
+        return None
+    lo, hi = extent[0] / scale, extent[1] / scale
+    if step is None:
+        lo, hi = int(lo), int(hi)
+    else:
+        lo, hi = float(np.floor(lo)), float(np.ceil(hi))
+    if lo >= hi:
+        return None
+    value = st.slider(label, lo, hi, (lo, hi), step=step, key=key)
+    if value == (lo, hi):
+        return None
+    return (value[0] * scale, value[1] * scale)
+
+
+with st.expander('絞り込み'):
+    col_a, col_b = st.columns(2)
+    with col_a:
+        output_range = _range('solar_fac_output', '出力（MW）', facility_index.extent('output'), scale=1_000, step=1.0)
+        end_range = _range('solar_fac_end', '調達期間終了年', facility_index.extent('end_year'))
+    with col_b:
+        year_range = _range('solar_fac_year', '認定年', facility_index.extent('year'))
+        selected_cities = st.multiselect('市区町村', facility_index.cities(), key='solar_fac_city')
+
+FACILITY_PAGE_SIZE = 20
+facility_filters = dict(
+    statuses=[selected_status], cities=selected_cities or None,
+    output=output_range, year=year_range, end_year=end_range,
+)
+with span('facility_query'):
+    _, facility_total = facility_index.query(**facility_filters, limit=0)
+n_pages = max(1, -(-facility_total // FACILITY_PAGE_SIZE))
+if st.session_state.get('solar_fac_page', 1) > n_pages:
+    st.session_state['solar_fac_page'] = 1
+page_no = 1
+if n_pages > 1:
+    page_no = st.number_input(f'ページ（全{n_pages:,}ページ）', min_value=1, max_value=n_pages,
+                              step=1, key='solar_fac_page')
+offset = (page_no - 1) * FACILITY_PAGE_SIZE
+with span('facility_query'):
+    facilities, _ = facility_index.query(**facility_filters, offset=offset, limit=FACILITY_PAGE_SIZE)
+st.caption(f'{facility_total:,}件中 {min(offset + 1, facility_total):,}〜{offset + len(facilities):,}件目')
+
+top20 = facilities[['発電事業者名', '都道府県', '市区町村', '出力kW']].reset_index(drop=True)
 top20['合計出力MW'] = (top20['出力kW'] / 1_000).round(1)
 top20 = top20.drop(columns=['出力kW'])
 
-styled_top = top20.style.format({
-    '合計出力MW': '{:,.1f}',
-}).background_gradient(
-    subset=['合計出力MW'],
-    cmap='OrRd',
-).hide(axis='index')
-html_top = styled_top.to_html().replace('合計出力MW', '合計出力<br>(MW)')
-st.markdown(f'<div class="custom-table">{html_top}</div>', unsafe_allow_html=True)
+selected_facility = arrow_table(
+    top20,
+    formats={'合計出力MW': '{:,.1f}'},
+    gradients={'合計出力MW': {'cmap': 'OrRd'}},
+    headers={'合計出力MW': '合計出力\n(MW)'},
+    key='solar_top20_table',
+    row_ids=facilities['設備ID'],
+)
+
+# 行をクリックした設備の所在地（複数の市区町村にまたがる設備もある）
+if SOLAR_LOCATION_DIR.exists():
+    if selected_facility is not None and selected_facility in set(facilities['設備ID']):
+        with span('parcels_of'):
+            parcels = parcels_of(selected_facility)
+        facility = facilities[facilities['設備ID'] == selected_facility].iloc[0]
+        st.markdown(f'###### {facility["発電事業者名"]} の所在地（{len(parcels):,}筆）')
+        if parcels.empty:
+            st.caption('所在地のデータがありません')
+        else:
+            by_city = parcels['市区町村'].fillna('不明').value_counts()
+            st.caption('・'.join(f'{city}（{n:,}筆）' for city, n in by_city.items()))
+            arrow_table(
+                parcels[['連番', '市区町村', '発電設備の所在地']].reset_index(drop=True),
+                max_height=300,
+                key='solar_parcel_table',
+            )
+    else:
+        st.caption('行をクリックすると設備の所在地を表示します')
+
+# 発電事業者・代表者・住所の検索（全国）
+st.markdown('###### 発電事業者の検索')
+search_query = st.text_input('発電事業者名・代表者名・住所', placeholder='例: 〇〇ソーラー合同会社、〇〇市〇〇',
+                             label_visibility='collapsed', key='solar_search')
+if search_query.strip():
+    with span('load_search_index'):
+        search_index = load_search_index()
+    with span('search'):
+        hit_ids, fuzzy = search_index.search(search_query)
+    if not len(hit_ids):
+        st.caption('該当する設備はありません')
+    else:
+        st.caption(f'{"類似する候補" if fuzzy else "該当"} {len(hit_ids):,}件')
+        arrow_table(
+            search_index.portfolios(hit_ids).head(100),
+            formats={'件数': '{:,.0f}', '合計出力MW': '{:,.1f}'},
+            gradients={'合計出力MW': {'cmap': 'OrRd'}},
+            headers={'合計出力MW': '合計出力\n(MW)'},
+            max_height=300,
+            key='solar_search_operators',
+        )
+        hits = search_index.df.iloc[hit_ids[:100]][['発電事業者名', '都道府県', '市区町村', '出力kW']]
+        hits = hits.assign(合計出力MW=(hits['出力kW'] / 1_000).round(1)).drop(columns=['出力kW'])
+        arrow_table(
+            hits.reset_index(drop=True),
+            formats={'合計出力MW': '{:,.1f}'},
+            gradients={'合計出力MW': {'cmap': 'OrRd'}},
+            headers={'合計出力MW': '合計出力\n(MW)'},
+            max_height=400,
+            key='solar_search_facilities',
+        )
 
 st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 再生可能エネルギー発電事業計画 認定情報（認定設備一覧）</p>', unsafe_allow_html=True)
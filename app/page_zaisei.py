@@ -1,5 +1,3 @@
-import copy
-import json
 import streamlit as st
 import pandas as pd
 import folium
@@ -8,6 +6,10 @@ import branca.colormap as cm
 import matplotlib.colors as mcolors
 from pathlib import Path
 from constants import PREF_ORDER
+import geo_assets
+from arrow_table import arrow_table
+from datastore import load_zaisei_pref, load_zaisei_city
+from tracing import span
 
 _CMAP_ZAISEI = mcolors.LinearSegmentedColormap.from_list('zaisei', ['#d73027', '#fee090', '#4575b4'])
 _CMAP_ZAISEI_R = mcolors.LinearSegmentedColormap.from_list('zaisei_r', ['#4575b4', '#fee090', '#d73027'])
@@ -21,24 +23,9 @@ DATA_DIR = BASE_DIR / 'data'
 GEO_DIR = DATA_DIR / 'geo'
 
 
-@st.cache_data
-def load_zaisei_pref():
-    return pd.read_csv(DATA_DIR / 'zaisei_pref.csv')
-
-
-@st.cache_data
-def load_zaisei_city():
-    return pd.read_csv(DATA_DIR / 'zaisei_city.csv')
-
-
-@st.cache_data
-def load_geojson_zaisei(path):
-    with open(path) as f:
-        return json.load(f)
-
-
-df_pref = load_zaisei_pref()
-df_city = load_zaisei_city()
+with span('load_zaisei'):
+    df_pref = load_zaisei_pref()
+    df_city = load_zaisei_city()
 
 st.title('財政力指数')
 st.info(
@@ -78,8 +65,9 @@ def resolve_city_name(geo_name, fiscal_set, seirei_cities):
     return None
 
 
-def render_choropleth_zaisei(geojson_data, val_map, caption, vmin, vmax, key_prop):
-    geojson_data = copy.deepcopy(geojson_data)
+@span('choropleth')
+def render_choropleth_zaisei(geo_path, val_map, caption, vmin, vmax, key_prop):
+    _, geojson_data = geo_assets.load_asset(str(geo_path), key_prop)
     colormap = cm.LinearColormap(
         colors=['#d73027', '#fee090', '#4575b4'],
         vmin=vmin, vmax=vmax,
@@ -90,21 +78,14 @@ def render_choropleth_zaisei(geojson_data, val_map, caption, vmin, vmax, key_pro
     fiscal_set = set(val_map.keys())
     seirei_cities = sorted([k for k in fiscal_set if k.endswith('市')], key=len, reverse=True)
 
+    props = {}
     for feat in geojson_data['features']:
-        geo_name = feat['properties'].get(key_prop, '')
+        geo_name = feat['id']
         matched = resolve_city_name(geo_name, fiscal_set, seirei_cities)
         val = val_map.get(matched, None) if matched else None
-        feat['properties']['_val'] = round(val, 3) if val is not None else '-'
-
-    coords = []
-    for feat in geojson_data['features']:
-        geom = feat['geometry']
-        if geom['type'] == 'Polygon':
-            coords.extend(geom['coordinates'][0])
-        elif geom['type'] == 'MultiPolygon':
-            for poly in geom['coordinates']:
-                coords.extend(poly[0])
+        props[geo_name] = {'_val': round(val, 3) if val is not None else '-'}
 
+    coords = list(geo_assets.iter_coords(geojson_data))
     lats = [c[1] for c in coords]
     lngs = [c[0] for c in coords]
     m = folium.Map(
@@ -122,8 +103,8 @@ def render_choropleth_zaisei(geojson_data, val_map, caption, vmin, vmax, key_pro
             'color': '#fff', 'weight': 0.5, 'fillOpacity': 0.75,
         }
 
-    folium.GeoJson(
-        geojson_data,
+    geo_assets.geojson_layer(
+        geo_path, key_prop, props,
         style_function=style_fn,
         highlight_function=lambda f: {'weight': 2, 'color': '#333', 'fillOpacity': 0.9},
         tooltip=folium.GeoJsonTooltip(
@@ -133,18 +114,55 @@ def render_choropleth_zaisei(geojson_data, val_map, caption, vmin, vmax, key_pro
         ),
     ).add_to(m)
     colormap.add_to(m)
-    st_folium(m, use_container_width=True, height=400, returned_objects=[])
+    with span('st_folium'):
+        st_folium(m, use_container_width=True, height=400, returned_objects=[])
 
 
 # === コロプレス地図 ===
-if not selected_pref:
+# 全国表示では、ベクタータイルがあれば市区町村単位の地図も選べる
+tile_meta = geo_assets.load_tile_meta()
+map_level = '都道府県'
+if not selected_pref and tile_meta:
+    map_level = st.segmented_control(
+        '地図の単位', ['都道府県', '市区町村'], default='都道府県',
+        label_visibility='collapsed', key='zaisei_map_level'
+    ) or '都道府県'
+
+if not selected_pref and map_level == '市区町村':
+    # 全国: 市区町村別（ベクタータイル）
+    all_vals = df_city['財政力指数'].dropna()
+    colormap = cm.LinearColormap(
+        colors=['#d73027', '#fee090', '#4575b4'],
+        vmin=all_vals.min(), vmax=all_vals.max(),
+        caption='財政力指数（令和5年度・3か年平均）',
+    )
+    colormap.width = 250
+
+    val_maps = {
+        pref_name: dict(zip(g['市区町村'], g['財政力指数']))
+        for pref_name, g in df_city[df_city['財政力指数'].notna()].groupby('都道府県名')
+    }
+    seirei_by_pref = {
+        pref_name: sorted([k for k in vals if k.endswith('市')], key=len, reverse=True)
+        for pref_name, vals in val_maps.items()
+    }
+    tile_table = {}
+    for pref_name, geo_name in tile_meta['features']:
+        vals = val_maps.get(pref_name, {})
+        matched = resolve_city_name(geo_name, vals, seirei_by_pref.get(pref_name, []))
+        if matched:
+            tile_table[geo_assets.tile_key(pref_name, geo_name)] = [
+                colormap(vals[matched]), f'財政力指数: {vals[matched]:.3f}',
+            ]
+    geo_assets.render_municipal_map(tile_table, colormap)
+
+elif not selected_pref:
     # 全国: 都道府県別
     pref_geo_path = GEO_DIR / 'prefectures.geojson'
     if pref_geo_path.exists():
-        geojson = load_geojson_zaisei(str(pref_geo_path))
         val_map = dict(zip(df_pref['都道府県名'], df_pref['財政力指数']))
         render_choropleth_zaisei(
-            geojson, val_map,
+            pref_geo_path, val_map,
             caption='財政力指数（令和5年度・3か年平均）',
             vmin=df_pref['財政力指数'].min(),
             vmax=df_pref['財政力指数'].max(),
@@ -156,12 +174,11 @@ else:
     if pref_idx:
         city_geo_path = GEO_DIR / f'{pref_idx:02d}_{selected_pref}.geojson'
         if city_geo_path.exists():
-            geojson = load_geojson_zaisei(str(city_geo_path))
             df_city_pref = df_city[df_city['都道府県名'] == selected_pref]
             val_map = dict(zip(df_city_pref['市区町村'], df_city_pref['財政力指数']))
             all_vals = df_city_pref['財政力指数'].dropna()
             render_choropleth_zaisei(
-                geojson, val_map,
+                city_geo_path, val_map,
                 caption='財政力指数（令和5年度・3か年平均）',
                 vmin=all_vals.min(),
                 vmax=all_vals.max(),
@@ -207,18 +224,21 @@ else:
 df_table = df_table.reset_index(drop=True)
 display_cols = [rename_col, '財政力指数', '経常収支比率', '実質公債費比率', '将来負担比率']
 
-styled = df_table[display_cols].style.format({
-    '財政力指数': '{:.3f}',
-    '経常収支比率': lambda v: f'{v:.1f}%' if pd.notna(v) else '-',
-    '実質公債費比率': lambda v: f'{v:.1f}%' if pd.notna(v) else '-',
-    '将来負担比率': lambda v: f'{v:.1f}%' if pd.notna(v) else '-',
-}).background_gradient(subset=['財政力指数'], cmap=_CMAP_ZAISEI, vmin=0.2, vmax=1.1,
-).background_gradient(subset=['経常収支比率'], cmap=_CMAP_ZAISEI_R, vmin=80, vmax=100,
-).background_gradient(subset=['将来負担比率'], cmap=_CMAP_ZAISEI_R, vmin=0, vmax=350,
-).hide(axis='index')
-
-html = styled.to_html()
-st.markdown(f'<div class="custom-table">{html}</div>', unsafe_allow_html=True)
+arrow_table(
+    df_table[display_cols],
+    formats={
+        '財政力指数': '{:.3f}',
+        '経常収支比率': '{:.1f}%',
+        '実質公債費比率': '{:.1f}%',
+        '将来負担比率': '{:.1f}%',
+    },
+    gradients={
+        '財政力指数': {'cmap': _CMAP_ZAISEI, 'vmin': 0.2, 'vmax': 1.1},
+        '経常収支比率': {'cmap': _CMAP_ZAISEI_R, 'vmin': 80, 'vmax': 100},
+        '将来負担比率': {'cmap': _CMAP_ZAISEI_R, 'vmin': 0, 'vmax': 350},
+    },
+    key='zaisei_table',
+)
 st.markdown(
     '<p style="font-size:12px; color:gray; margin-top:-10px;">'
     'Source: 総務省 令和5年度地方公共団体の主要財政指標一覧｜'
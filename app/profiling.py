@@ -0,0 +1,70 @@
+"""再実行単位のサンプリングプロファイル（運用者向け）。
+
+環境変数 OPENJP_PROFILE にトークンを設定したサーバーでのみ有効。URLに ?profile=<トークン> を
+付けるとその再実行を pyinstrument でプロファイルし、コールツリー・フレームグラフのHTMLを
+OPENJP_PROFILE_DIR（既定: logs/profiles/、新しい OPENJP_PROFILE_KEEP 件だけ残す）に保存して、
+サイドバーからダウンロードできるようにする。
+サイドバーのプロファイルの欄はトークンが一致するセッションにだけ表示する。
+OPENJP_PROFILE 未設定時は環境変数を1回参照するだけで、計測のオーバーヘッドはない。
+"""
+import os
+import re
+import time
+from pathlib import Path
+
+import streamlit as st
+
+TOKEN = os.environ.get('OPENJP_PROFILE')
+PROFILE_DIR = Path(os.environ.get('OPENJP_PROFILE_DIR', Path(__file__).resolve().parent.parent / 'logs' / 'profiles'))
+# 保存しておくプロファイルの数（古いものから削除する）
+MAX_PROFILES = int(os.environ.get('OPENJP_PROFILE_KEEP', 50))
+INTERVAL = 0.001
+
+
+def _authorized():
+    """URLの ?profile= がトークンと一致するセッションか。"""
+    return bool(TOKEN) and st.query_params.get('profile') == TOKEN
+
+
+def start():
+    """プロファイルが要求されていれば開始し、Profiler を返す（それ以外は None）。"""
+    if not _authorized():
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        st.sidebar.warning('プロファイルには pyinstrument が必要です')
+        return None
+    profiler = Profiler(interval=INTERVAL, async_mode='disabled')
+    profiler.start()
+    return profiler
+
+
+def _rotate():
+    """PROFILE_DIR のプロファイルを新しい MAX_PROFILES 件だけ残す。"""
+    files = sorted(PROFILE_DIR.glob('*.html'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[MAX_PROFILES:]:
+        old.unlink(missing_ok=True)
+
+
+def finish(profiler, page):
+    """プロファイルを終了して保存し、ダウンロードボタンを表示する。"""
+    if profiler is not None:
+        profiler.stop()
+        html = profiler.output_html()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}_{re.sub(r"[^0-9A-Za-z぀-ヿ一-鿿]+", "_", page)}.html'
+        (PROFILE_DIR / name).write_text(html, encoding='utf-8')
+        _rotate()
+        st.session_state['_profile_last'] = (name, html)
+    if not _authorized():
+        return
+
+    with st.sidebar.expander('プロファイル'):
+        if st.button('再実行してプロファイル', key='_profile_button'):
+            st.rerun()
+        if '_profile_last' in st.session_state:
+            name, html = st.session_state['_profile_last']
+            st.caption(f'保存先: {PROFILE_DIR / name}')
+            st.download_button('プロファイルをダウンロード', html, file_name=name, mime='text/html',
+                               key='_profile_download')
@@ -0,0 +1,120 @@
+"""計算結果の永続キャッシュ（2次キャッシュ）。
+
+プロセス内のキャッシュ（cache_resource・figure_cache）の下に置く、ディスク上の SQLite の
+キー・バリューストア。環境変数 OPENJP_RESULT_CACHE にファイルパスを指定したときだけ有効で、
+同じファイルを参照するレプリカや再起動後のプロセスが、集計結果・図・地図用のテーブルを再利用できる
+（複数ホストなら共有ボリューム上に置く）。
+
+キーは (名前, 引数, データバージョン, アプリのコードのバージョン) のハッシュ。値は pickle で保存するので、
+信頼できないプロセスとファイルを共有しないこと。
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import telemetry
+
+PATH = os.environ.get('OPENJP_RESULT_CACHE')
+APP_DIR = Path(__file__).resolve().parent
+# この日数以上参照されていないエントリは起動時に削除する
+MAX_AGE_DAYS = float(os.environ.get('OPENJP_RESULT_CACHE_MAX_AGE_DAYS', 30))
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def enabled():
+    return bool(PATH)
+
+
+def _connect():
+    global _initialized
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        return conn
+    conn = sqlite3.connect(PATH, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with _init_lock:
+        if not _initialized:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' key TEXT PRIMARY KEY, name TEXT, value BLOB, created REAL, accessed REAL)'
+            )
+            conn.execute('DELETE FROM results WHERE accessed < ?', (time.time() - MAX_AGE_DAYS * 86400,))
+            conn.commit()
+            _report(conn)
+            _initialized = True
+    _local.conn = conn
+    return conn
+
+
+def _report(conn):
+    """ファイルにあるエントリの数と値のサイズを記録する。"""
+    count, nbytes = conn.execute('SELECT count(*), coalesce(sum(length(value)), 0) FROM results').fetchone()
+    telemetry.resident('result_cache', count, nbytes)
+
+
+def _code_version():
+    """アプリのコード（app/*.py）のハッシュ。図・集計の構築方法が変わったデプロイでは別のキーになる。"""
+    h = hashlib.sha1()
+    for path in sorted(APP_DIR.glob('*.py')):
+        h.update(path.name.encode() + b'\0' + path.read_bytes())
+    return h.hexdigest()[:12]
+
+
+CODE_VERSION = _code_version()
+
+
+def make_key(name, args, version):
+    return hashlib.sha256(pickle.dumps((name, args, version, CODE_VERSION), protocol=4)).hexdigest()
+
+
+def get(key):
+    """保存済みの値（なければ None）。"""
+    conn = _connect()
+    row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+    conn.commit()
+    return pickle.loads(row[0])
+
+
+def put(key, name, value):
+    conn = _connect()
+    now = time.time()
+    conn.execute(
+        'INSERT OR REPLACE INTO results (key, name, value, created, accessed) VALUES (?, ?, ?, ?, ?)',
+        (key, name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now),
+    )
+    conn.commit()
+    _report(conn)
+
+
+def cached(name, args, version, build):
+    """永続キャッシュにあればそれを、なければ build() の結果を保存して返す。
+
+    args: 結果に影響する引数（pickle 可能な値のタプル）。無効時は build() をそのまま呼ぶ。
+    """
+    if not enabled():
+        return build()
+    key = make_key(name, args, version)
+    try:
+        value = get(key)
+    except (sqlite3.Error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # 壊れたエントリや旧バージョンのオブジェクトは作り直す
+        value = None
+    telemetry.record('result_cache', hit=value is not None)
+    if value is None:
+        value = build()
+        try:
+            put(key, name, value)
+        except sqlite3.Error:
+            pass
+    return value
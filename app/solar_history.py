@@ -0,0 +1,29 @@
+"""メガソーラーの月次履歴の集計。
+
+履歴は datastore.load_solar_history() の有効期間付きの行（SCD type 2）。
+ある時点の状態は有効期間がその時点を含む行で、月ごとの推移は各行の
+valid_from に +出力・valid_to に -出力 を置いた増減の累積和で求める（月ごとに全件を走査しない）。
+"""
+import pandas as pd
+
+
+def as_of(history, t):
+    """時点 t に有効だった行。"""
+    valid = (history['valid_from'] <= t) & (history['valid_to'].isna() | (history['valid_to'] > t))
+    return history[valid]
+
+
+def capacity_timeline(history):
+    """取得月 × 状態（運転中 / 運転予定）の合計出力kW。"""
+    starts = history[['valid_from', '状態', '出力kW']].rename(columns={'valid_from': '月'})
+    ends = history.loc[history['valid_to'].notna(), ['valid_to', '状態', '出力kW']].rename(columns={'valid_to': '月'})
+    events = pd.concat([starts, ends.assign(出力kW=-ends['出力kW'])], ignore_index=True)
+    return events.pivot_table(index='月', columns='状態', values='出力kW', aggfunc='sum', fill_value=0).cumsum()
+
+
+def conversions(history):
+    """取得月ごとの 運転予定 → 運転中 に変わった設備の件数・合計出力kW。"""
+    h = history.sort_values(['設備ID', 'valid_from'], kind='stable')
+    previous = h.groupby('設備ID')['状態'].shift()
+    converted = h[(previous == '運転予定') & (h['状態'] == '運転中')]
+    return converted.groupby('valid_from').agg(件数=('設備ID', 'count'), 出力kW=('出力kW', 'sum'))
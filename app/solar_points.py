@@ -0,0 +1,176 @@
+"""メガソーラーの設備単位の地図（サーバー側のクラスタリング）。
+
+設備の位置は、代表住所から対応付けた市区町村の境界の内部の代表点（geo_assets の索引）を
+設備IDから決まる量だけずらした点（所在地のジオコーディングはしていないので市区町村単位のおおよその位置）。
+ズームレベルごとに画面上 CELL_PX ピクセル四方のグリッドで設備をまとめた集計を事前に作り、
+地図には表示範囲のクラスタだけを送る。POINT_ZOOM 以上では表示範囲の設備を個別に送る。
+地図は st_folium の feature_group_to_add で、地図自体を作り直さずにマーカーだけを差し替える。
+"""
+import math
+from pathlib import Path
+
+import folium
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit_folium import st_folium
+
+import geo_assets
+from constants import PREF_ORDER
+from datastore import load_mega_solar, solar_status
+from telemetry import tracked
+from tracing import span
+
+GEO_DIR = Path(__file__).resolve().parent.parent / 'data' / 'geo'
+MIN_ZOOM = 4
+POINT_ZOOM = 12
+CELL_PX = 60
+# 個別表示の上限（出力の大きい順）
+MAX_POINTS = 1000
+# 代表点の周りに設備をずらす幅（外接矩形の幅・高さに対する割合と、その上限の度数。
+# 離島を含む都道府県の矩形で海上まで広がらないようにする）
+JITTER = 0.08
+MAX_JITTER_DEG = 0.02
+
+
+def _places(geo_path, key_prop):
+    """{名前: (外接矩形, 代表点)}。郡部は郡名を除いた名前でも引けるようにする。"""
+    _, index = geo_assets.load_asset(str(geo_path), key_prop)
+    places = {}
+    for feat in index['features']:
+        if feat['bbox'] is None:
+            continue
+        place = (feat['bbox'], feat['point'])
+        places[feat['id']] = place
+        if '郡' in feat['id']:
+            places.setdefault(feat['id'].split('郡', 1)[1], place)
+    return places
+
+
+def _lookup(places, name):
+    """名前の (外接矩形, 代表点)。政令指定都市など区単位の境界しかない場合は前方一致する区を合わせ、
+    代表点は最も大きい区のものを使う。"""
+    if name in places:
+        return places[name]
+    parts = [p for key, p in places.items() if key.startswith(name)]
+    if not parts:
+        return None
+    boxes = [b for b, _ in parts]
+    box = [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+    _, point = max(parts, key=lambda p: (p[0][2] - p[0][0]) * (p[0][3] - p[0][1]))
+    return box, point
+
+
+def _locate(df):
+    """設備の (緯度, 経度)。市区町村が不明な設備は都道府県の代表点の周りに置く。"""
+    pref_places = _places(GEO_DIR / 'prefectures.geojson', '都道府県')
+    box = np.full((len(df), 4), np.nan)
+    point = np.full((len(df), 2), np.nan)
+    for pref, rows in df.groupby('都道府県').indices.items():
+        if pref not in PREF_ORDER:
+            continue
+        city_places = _places(GEO_DIR / f'{PREF_ORDER.index(pref) + 1:02d}_{pref}.geojson', '市区町村')
+        cities = df['市区町村'].to_numpy()[rows]
+        for row, city in zip(rows, cities):
+            place = (_lookup(city_places, city) if isinstance(city, str) else None) or pref_places.get(pref)
+            if place:
+                box[row], point[row] = place
+
+    # 同じ市区町村の設備が重ならないよう、設備IDのハッシュで代表点の周りに少しずらす
+    h = pd.util.hash_pandas_object(df['設備ID'], index=False).to_numpy()
+    u = (h & 0xFFFF) / 0xFFFF - 0.5
+    v = ((h >> 16) & 0xFFFF) / 0xFFFF - 0.5
+    lng = point[:, 0] + u * np.minimum((box[:, 2] - box[:, 0]) * JITTER, MAX_JITTER_DEG)
+    lat = point[:, 1] + v * np.minimum((box[:, 3] - box[:, 1]) * JITTER, MAX_JITTER_DEG)
+    return lat, lng
+
+
+class PointIndex:
+    """設備の位置とズームレベルごとのクラスタ。"""
+
+    def __init__(self, df):
+        lat, lng = _locate(df)
+        ok = ~np.isnan(lat)
+        self.points = df[ok].assign(lat=lat[ok], lng=lng[ok]).sort_values('出力kW', ascending=False)
+        # Web メルカトルの正規化座標（0〜1）
+        mx = (self.points['lng'].to_numpy() + 180) / 360
+        rad = np.radians(self.points['lat'].to_numpy())
+        my = (1 - np.log(np.tan(rad) + 1 / np.cos(rad)) / math.pi) / 2
+
+        self.levels = {}
+        for zoom in range(MIN_ZOOM, POINT_ZOOM):
+            n = 2 ** zoom * 256 / CELL_PX
+            cell = np.floor(mx * n).astype(np.int64) * (1 << 32) + np.floor(my * n).astype(np.int64)
+            self.levels[zoom] = self.points.assign(_cell=cell).groupby('_cell').agg(
+                lat=('lat', 'mean'),
+                lng=('lng', 'mean'),
+                件数=('設備ID', 'count'),
+                出力kW=('出力kW', 'sum'),
+            ).reset_index(drop=True)
+
+    def bounds(self):
+        """全設備の [[南, 西], [北, 東]]。"""
+        p = self.points
+        return [[p['lat'].min(), p['lng'].min()], [p['lat'].max(), p['lng'].max()]]
+
+    def query(self, bounds, zoom):
+        """表示範囲の (クラスタまたは設備のフレーム, 個別か)。"""
+        (south, west), (north, east) = bounds
+        if zoom >= POINT_ZOOM:
+            df = self.points
+        else:
+            df = self.levels[max(MIN_ZOOM, int(zoom))]
+        inside = df['lat'].between(south, north) & df['lng'].between(west, east)
+        if zoom >= POINT_ZOOM:
+            return df[inside].head(MAX_POINTS), True
+        return df[inside], False
+
+
+@tracked('load_point_index', resource=True, max_entries=8)
+def load_index(pref, status, today):
+    """都道府県（None なら全国）・状態の設備の地図用インデックス。"""
+    df = load_mega_solar(pref)
+    return PointIndex(df[solar_status(df, today) == status])
+
+
+@span('point_map')
+def render_point_map(index, key):
+    """設備の地図を描画する。パン・ズームのたびに表示範囲のクラスタ・設備だけを送る。"""
+    if index.points.empty:
+        return
+    initial = index.bounds()
+    view = st.session_state.get(key) or {}
+    if view.get('bounds') and view['bounds'].get('_southWest'):
+        sw, ne = view['bounds']['_southWest'], view['bounds']['_northEast']
+        bounds = [[sw['lat'], sw['lng']], [ne['lat'], ne['lng']]]
+        zoom = view.get('zoom') or MIN_ZOOM
+    else:
+        # 初回は fit_bounds 後のおおよそのズーム（幅 700px 程度の地図）
+        span_deg = max(initial[1][1] - initial[0][1], (initial[1][0] - initial[0][0]) * 1.5, 0.01)
+        bounds, zoom = initial, min(POINT_ZOOM - 1, max(MIN_ZOOM, int(math.log2(360 / span_deg * 700 / 256))))
+
+    rows, individual = index.query(bounds, zoom)
+    layer = folium.FeatureGroup(name='設備')
+    if individual:
+        for r in rows.itertuples(index=False):
+            folium.CircleMarker(
+                [r.lat, r.lng], radius=5, color='#de2d26', weight=1, fill=True, fill_opacity=0.7,
+                tooltip=f'{r.発電事業者名}<br>{r.市区町村 if isinstance(r.市区町村, str) else r.都道府県}'
+                        f' / {r.出力kW / 1_000:,.1f}MW<br>（位置は市区町村単位のおおよその位置）',
+            ).add_to(layer)
+    else:
+        for r in rows.itertuples(index=False):
+            folium.CircleMarker(
+                [r.lat, r.lng], radius=6 + 4 * math.log10(r.件数), color='#de2d26', weight=1,
+                fill=True, fill_opacity=0.5,
+                tooltip=f'{r.件数:,}件 / {r.出力kW / 1_000:,.0f}MW',
+            ).add_to(layer)
+
+    m = folium.Map(location=[37, 137], zoom_start=5, tiles='cartodbpositron')
+    m.fit_bounds(initial)
+    with span('st_folium'):
+        st_folium(m, feature_group_to_add=layer, use_container_width=True, height=450,
+                  returned_objects=['bounds', 'zoom'], key=key)
+    st.caption((f'表示範囲の設備 {len(rows):,}件' if individual else
+                f'表示範囲 {int(rows["件数"].sum()):,}件（拡大すると個別の設備を表示）')
+               + '。設備は所在地の市区町村内のおおよその位置に表示しています')
@@ -0,0 +1,103 @@
+"""メガソーラーの設備検索。
+
+出力・認定年・調達期間終了年の範囲、市区町村、状態を組み合わせた条件で設備を絞り込み、
+出力の大きい順にページ単位で返す。範囲条件は値で整列済みのインデックスを二分探索して
+候補を絞り、残りの条件は候補にだけ適用する。順位は出力の降順の順位を事前に持っておき、
+必要な件数（offset + limit）だけを部分選択してから並べる。
+"""
+import numpy as np
+import pandas as pd
+
+from constants import PREF_ORDER
+from datastore import load_mega_solar, solar_status
+from telemetry import tracked
+
+
+class FacilityIndex:
+    """設備の検索用インデックス（状態は作成日の基準）。"""
+
+    def __init__(self, df, today):
+        self.df = df.reset_index(drop=True)
+        self.values = {
+            'output': self.df['出力kW'].to_numpy(float),
+            'year': self.df['認定年'].to_numpy(float),
+            'end_year': self.df['_調達終了'].dt.year.to_numpy(float),
+        }
+        # 値の昇順に並べた行番号と値（NaN は末尾）
+        self.sorted = {}
+        for name, values in self.values.items():
+            order = np.argsort(values, kind='stable')
+            self.sorted[name] = (order, values[order])
+
+        self.status_codes, statuses = pd.factorize(solar_status(self.df, today))
+        self.status_ids = {s: i for i, s in enumerate(statuses)}
+        self.city_codes, cities = pd.factorize(self.df['市区町村'])
+        self.city_ids = {c: i for i, c in enumerate(cities)}
+
+        # 出力の降順の順位（0 が最大）
+        self.by_output = np.argsort(-self.values['output'], kind='stable')
+        self.rank = np.empty(len(self.df), np.int64)
+        self.rank[self.by_output] = np.arange(len(self.df))
+
+    def extent(self, name):
+        """範囲条件の列の (最小, 最大)。値がなければ None。"""
+        _, values = self.sorted[name]
+        values = values[~np.isnan(values)]
+        return (values[0], values[-1]) if len(values) else None
+
+    def cities(self):
+        return sorted(c for c in self.city_ids if isinstance(c, str))
+
+    def _candidates(self, name, lo, hi):
+        order, values = self.sorted[name]
+        start = np.searchsorted(values, lo, 'left') if lo is not None else 0
+        stop = np.searchsorted(values, hi if hi is not None else np.inf, 'right')
+        return order[start:stop]
+
+    def query(self, statuses=None, cities=None, output=None, year=None, end_year=None, offset=0, limit=20):
+        """条件に合う設備を出力の大きい順に offset から limit 件返す。(DataFrame, 該当件数)
+
+        output / year / end_year: (下限, 上限) の範囲。どちらも None 可（片側のみの条件）。
+        statuses / cities: いずれかに一致する設備。None なら条件にしない。
+        """
+        ranges = {name: r for name, r in (('output', output), ('year', year), ('end_year', end_year))
+                  if r is not None and r != (None, None)}
+        if ranges:
+            # 最も狭い範囲条件の候補から始める（候補は出力順ではない）
+            candidates = min((self._candidates(name, *r) for name, r in ranges.items()), key=len)
+        else:
+            candidates = self.by_output
+
+        mask = np.ones(len(candidates), bool)
+        for name, (lo, hi) in ranges.items():
+            values = self.values[name][candidates]
+            if lo is not None:
+                mask &= values >= lo
+            if hi is not None:
+                mask &= values <= hi
+        if statuses is not None:
+            codes = [self.status_ids[s] for s in statuses if s in self.status_ids]
+            mask &= np.isin(self.status_codes[candidates], codes)
+        if cities is not None:
+            codes = [self.city_ids[c] for c in cities if c in self.city_ids]
+            mask &= np.isin(self.city_codes[candidates], codes)
+
+        hits = candidates[mask]
+        total = len(hits)
+        k = min(offset + limit, total)
+        if ranges and k > 0:
+            ranks = self.rank[hits]
+            if k < total:
+                # 上位 k 件だけを部分選択してから並べる
+                top = np.argpartition(ranks, k - 1)[:k]
+                hits, ranks = hits[top], ranks[top]
+            hits = hits[np.argsort(ranks)]
+        return self.df.iloc[hits[offset:k]], total
+
+
+# ウォームアップは既定の表示（全国）のみ
+@tracked('load_facility_index', resource=True, max_entries=len(PREF_ORDER) + 1,
+         warm=lambda: [(None, pd.Timestamp.today().normalize())])
+def load_index(pref, today):
+    """都道府県（None なら全国）の設備の検索用インデックス。"""
+    return FacilityIndex(load_mega_solar(pref), today)
@@ -0,0 +1,121 @@
+"""メガソーラーの発電事業者・代表者・住所の検索。
+
+設備ごとに発電事業者名・代表者名・代表住所・設備の所在地を NFKC で正規化し（'(株)' などの略記は
+正式名にそろえる）、連結して文字 2-gram の転置インデックス（2-gram → 設備の行番号の配列）を作っておく。
+検索語も同じ正規化をする。
+検索語の 2-gram の転置リストを積集合で絞ってから部分一致を確かめるので、全件を走査しない。
+部分一致がなければ、検索語の 2-gram を一定割合以上含む設備を類似候補として返す。
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from constants import PREF_ORDER
+from datastore import SOLAR_LOCATION_DIR, load_mega_solar, load_solar_locations
+from telemetry import tracked
+
+N = 2
+# 類似候補とみなす、検索語の n-gram のうち一致した割合
+FUZZY_RATIO = 0.6
+# フィールドの区切り（n-gram がフィールドをまたがないようにする）
+SEP = '\x00'
+
+_CORPORATE_FORMS = {'(株)': '株式会社', '(有)': '有限会社', '(同)': '合同会社', '(一社)': '一般社団法人'}
+
+
+def normalize(text):
+    """NFKC・小文字化し、空白を除く。"""
+    return re.sub(r'\s+', '', unicodedata.normalize('NFKC', str(text))).lower()
+
+
+def operator_key(name):
+    """発電事業者の名寄せ用のキー（'(株)' などの略記を正式名にそろえる）。"""
+    key = normalize(name)
+    for short, full in _CORPORATE_FORMS.items():
+        key = key.replace(short, full)
+    return key
+
+
+def _grams(text):
+    return {text[i:i + N] for i in range(len(text) - N + 1) if SEP not in text[i:i + N]}
+
+
+class SearchIndex:
+    """設備の n-gram 転置インデックス。"""
+
+    def __init__(self, df, locations):
+        self.df = df.reset_index(drop=True)
+        extra = locations.groupby('設備ID')['発電設備の所在地'].agg(lambda s: SEP.join(s.astype(str)))
+        fields = [self.df[col].fillna('').astype(str) for col in ('発電事業者名', '代表者名', '代表住所')]
+        fields.append(self.df['設備ID'].map(extra).fillna(''))
+        self.texts = [SEP.join(operator_key(v) for v in values) for values in zip(*fields)]
+
+        postings = defaultdict(list)
+        for i, text in enumerate(self.texts):
+            for gram in _grams(text):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.operators = self.df['発電事業者名'].map(operator_key)
+
+    def search(self, query):
+        """(該当する行番号の配列, 類似候補か) を返す。行番号は出力の大きい順。"""
+        # 索引と同じく '(株)' などの略記を正式名にそろえる
+        q = operator_key(query)
+        if not q:
+            return np.array([], dtype=np.int32), False
+        grams = _grams(q)
+        if not grams:
+            # 1文字の検索語は全件の部分一致
+            ids = np.array([i for i, t in enumerate(self.texts) if q in t], dtype=np.int32)
+            return self._by_output(ids), False
+
+        lists = sorted((self.postings.get(g, np.array([], dtype=np.int32)) for g in grams), key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        # 2-gram をすべて含んでも連続して現れるとは限らないので部分一致を確かめる
+        ids = np.array([i for i in candidates if q in self.texts[i]], dtype=np.int32)
+        if len(ids):
+            return self._by_output(ids), False
+
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return np.array([], dtype=np.int32), True
+        counts = np.bincount(np.concatenate(hits), minlength=len(self.texts))
+        ids = np.nonzero(counts >= math.ceil(len(grams) * FUZZY_RATIO))[0]
+        # 一致した n-gram が多い順、同数なら出力の大きい順
+        order = np.lexsort((-self.df['出力kW'].to_numpy()[ids], -counts[ids]))
+        return ids[order], True
+
+    def _by_output(self, ids):
+        return ids[np.argsort(-self.df['出力kW'].to_numpy()[ids], kind='stable')]
+
+    def portfolios(self, ids):
+        """該当設備の発電事業者ごとの件数・合計出力・都道府県（件数の多い順）。"""
+        hits = self.df.iloc[ids].assign(_operator=self.operators.iloc[ids].to_numpy())
+        pref_order = {p: i for i, p in enumerate(PREF_ORDER)}
+        agg = hits.groupby('_operator').agg(
+            発電事業者名=('発電事業者名', lambda s: s.value_counts().index[0]),
+            件数=('設備ID', 'count'),
+            合計出力kW=('出力kW', 'sum'),
+            都道府県=('都道府県', lambda s: '・'.join(sorted(set(s), key=lambda p: pref_order.get(p, 99)))),
+        ).reset_index(drop=True)
+        agg['合計出力MW'] = (agg['合計出力kW'] / 1_000).round(1)
+        return agg.sort_values(['件数', '合計出力kW'], ascending=False).drop(columns='合計出力kW')
+
+
+@tracked('load_search_index', resource=True, max_entries=1, warm=True)
+def load_index():
+    """全国のメガソーラーの検索用インデックス。"""
+    if SOLAR_LOCATION_DIR.exists():
+        locations = load_solar_locations()
+    else:
+        # 所在地データがなければ代表住所までで検索する
+        locations = pd.DataFrame(columns=['設備ID', '発電設備の所在地'])
+    return SearchIndex(load_mega_solar(None), locations)
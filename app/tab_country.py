@@ -1,13 +1,16 @@
 import streamlit as st
-import pandas as pd
 import tab_zairyugaikokujin
 from constants import COUNTRY_ORDER, PREF_ORDER
+from arrow_table import arrow_table
+from tracing import span
+from datastore import load_zairyu_pref_country
 
 
+@span('tab_country')
 def render(data_dir):
     """国籍別タブ: フィルター + グラフ + 都道府県別テーブル"""
     # フィルター（一番上）- COUNTRY_ORDERの順序で表示
-    df_country_long = pd.read_csv(data_dir / 'zairyu_pref_country.csv')
+    df_country_long = load_zairyu_pref_country()
     available_countries = set(df_country_long['国籍'].unique()) - {'総数'}
     country_list = ['すべての国籍'] + [c for c in COUNTRY_ORDER if c in available_countries]
     selected_country = st.selectbox('国籍を選択', country_list, label_visibility='collapsed', key='country_tab_filter')
@@ -55,15 +58,10 @@ def render(data_dir):
         sort_col = '人口（2025）' if selected_sort_metric == '人口' else selected_sort_metric
         df_country_pref_pivot = df_country_pref_pivot.sort_values(sort_col, ascending=False).reset_index(drop=True)
 
-    styled_country_pref = df_country_pref_pivot.style.format({
-        '人口（2025）': '{:,.0f}',
-        '増減数': '{:+,.0f}',
-        '増減率': '{:+.1f}%'
-    }).background_gradient(
-        subset=['人口（2025）', '増減数', '増減率'],
-        cmap='Blues'
-    ).hide(axis='index')
-
-    html_country_pref = f'<div class="custom-table">{styled_country_pref.to_html()}</div>'
-    st.markdown(html_country_pref, unsafe_allow_html=True)
+    arrow_table(
+        df_country_pref_pivot,
+        formats={'人口（2025）': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+        gradients={col: {'cmap': 'Blues'} for col in ['人口（2025）', '増減数', '増減率']},
+        key='country_pref_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計（2025年6月）</p>', unsafe_allow_html=True)
@@ -3,47 +3,58 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from constants import COUNTRY_ORDER, STATUS_ORDER
+from arrow_table import arrow_table
+from tracing import span
+from figure_cache import cached_figure
+from datastore import data_version, load_jinko_raw, load_zairyu_pref_country, load_zairyu_pref_status
 
 
+@span('tab_pref')
 def render(data_dir):
     """都道府県別タブ: 外国人数推移 + 都道府県別比率 + 国籍別・在留資格別グラフ"""
     # 都道府県リストをCSVから取得（都道府県番号順）
-    df_daicho_all = pd.read_csv(data_dir / 'daicho_estat.csv')
-    df_daicho_all['pref_code'] = df_daicho_all['団体コード'].astype(str).str.zfill(6).str[:2]
-    pref_list = df_daicho_all[['pref_code', '都道府県名']].drop_duplicates().sort_values('pref_code')['都道府県名'].tolist()
+    df_daicho_all = load_jinko_raw()
+    daicho_version = data_version(data_dir / 'daicho_estat.csv')
+    df_pref_code = df_daicho_all[['団体コード', '都道府県名']].assign(
+        pref_code=df_daicho_all['団体コード'].astype(str).str.zfill(6).str[:2])
+    pref_list = df_pref_code[['pref_code', '都道府県名']].drop_duplicates().sort_values('pref_code')['都道府県名'].tolist()
     selected_pref = st.selectbox('都道府県を選択', ['全国'] + pref_list, label_visibility='collapsed', key='tab_pref_select')
     pref_filter = '総数' if selected_pref == '全国' else selected_pref
 
     # 1. 外国人数・比率推移グラフ
-    if selected_pref == '全国':
-        st.markdown('###### 外国人数・比率推移（全国）')
-        df_chart = df_daicho_all.groupby('year').agg({'総人口': 'sum', '外国人人口': 'sum'}).reset_index()
-    else:
-        st.markdown(f'###### 外国人数・比率推移（{selected_pref}）')
-        df_chart = df_daicho_all[df_daicho_all['都道府県名'] == selected_pref].groupby('year').agg({'総人口': 'sum', '外国人人口': 'sum'}).reset_index()
-
-    df_chart['比率'] = round(df_chart['外国人人口'] / df_chart['総人口'] * 100, 2)
-    df_chart['外国人人口（万人）'] = df_chart['外国人人口'] / 10000
-
-    fig_trend = go.Figure()
-    fig_trend.add_trace(go.Bar(
-        x=df_chart['year'], y=df_chart['外国人人口（万人）'],
-        name='外国人数（万人）', marker_color='#636EFA', yaxis='y',
-    ))
-    fig_trend.add_trace(go.Scatter(
-        x=df_chart['year'], y=df_chart['比率'],
-        name='外国人比率（%）', mode='lines+markers',
-        line=dict(color='#EF553B', width=2), marker=dict(size=5), yaxis='y2',
-    ))
-    fig_trend.update_layout(
-        yaxis=dict(title='', showgrid=False, automargin=False, fixedrange=True),
-        yaxis2=dict(title='', showgrid=False, overlaying='y', side='right', automargin=False, fixedrange=True, ticksuffix='%'),
-        xaxis=dict(fixedrange=True, dtick=1),
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='center', x=0.5,
-                    itemclick=False, itemdoubleclick=False),
-        margin=dict(l=30, r=30, t=30, b=30), height=320,
-        dragmode=False,
-    )
+    st.markdown(f'###### 外国人数・比率推移（{selected_pref}）')
+
+    def build_trend_chart():
+        if selected_pref == '全国':
+            df_chart = df_daicho_all.groupby('year').agg({'総人口': 'sum', '外国人人口': 'sum'}).reset_index()
+        else:
+            df_chart = df_daicho_all[df_daicho_all['都道府県名'] == selected_pref].groupby('year').agg({'総人口': 'sum', '外国人人口': 'sum'}).reset_index()
+
+        df_chart['比率'] = round(df_chart['外国人人口'] / df_chart['総人口'] * 100, 2)
+        df_chart['外国人人口（万人）'] = df_chart['外国人人口'] / 10000
+
+        fig_trend = go.Figure()
+        fig_trend.add_trace(go.Bar(
+            x=df_chart['year'], y=df_chart['外国人人口（万人）'],
+            name='外国人数（万人）', marker_color='#636EFA', yaxis='y',
+        ))
+        fig_trend.add_trace(go.Scatter(
+            x=df_chart['year'], y=df_chart['比率'],
+            name='外国人比率（%）', mode='lines+markers',
+            line=dict(color='#EF553B', width=2), marker=dict(size=5), yaxis='y2',
+        ))
+        fig_trend.update_layout(
+            yaxis=dict(title='', showgrid=False, automargin=False, fixedrange=True),
+            yaxis2=dict(title='', showgrid=False, overlaying='y', side='right', automargin=False, fixedrange=True, ticksuffix='%'),
+            xaxis=dict(fixedrange=True, dtick=1),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='center', x=0.5,
+                        itemclick=False, itemdoubleclick=False),
+            margin=dict(l=30, r=30, t=30, b=30), height=320,
+            dragmode=False,
+        )
+        return fig_trend
+
+    fig_trend = cached_figure('pref_trend_chart', (selected_pref,), daicho_version, build_trend_chart)
     st.plotly_chart(fig_trend, use_container_width=True, key='pref_trend_chart', config={'displayModeBar': False, 'scrollZoom': False})
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 総務省 住民基本台帳に基づく人口</p>', unsafe_allow_html=True)
 
@@ -93,23 +104,17 @@ def render(data_dir):
 
     df_styled = df_display[display_cols].reset_index(drop=True)
 
-    styled = df_styled.style.format({
-        '総人口': '{:,.0f}',
-        '外国人': '{:,.0f}',
-        '比率': '{:.1f}',
-        '前年比': '{:+.1f}%'
-    }).background_gradient(
-        subset=['総人口', '外国人', '比率', '前年比'],
-        cmap='Purples'
-    ).hide(axis='index')
-
-    html = f'<div class="custom-table">{styled.to_html()}</div>'
-    st.markdown(html, unsafe_allow_html=True)
+    arrow_table(
+        df_styled,
+        formats={'総人口': '{:,.0f}', '外国人': '{:,.0f}', '比率': '{:.1f}', '前年比': '{:+.1f}%'},
+        gradients={col: {'cmap': 'Purples'} for col in ['総人口', '外国人', '比率', '前年比']},
+        key='pref_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 総務省 住民基本台帳に基づく人口（2025年1月）</p>', unsafe_allow_html=True)
 
     # 3. 国籍別人口（前年比）バーグラフ
     st.markdown(f'###### {selected_pref}の国籍別人口と増減（前年比）')
-    df_country_long = pd.read_csv(data_dir / 'zairyu_pref_country.csv')
+    df_country_long = load_zairyu_pref_country()
     df_country_chart = df_country_long[df_country_long['都道府県'] == pref_filter].copy()
 
     # ピボットして2024/06と2025/06を横に並べる
@@ -141,23 +146,28 @@ def render(data_dir):
         selected_metric = '人口'
     metric_options = {'人口': '人口', '増減数': '増減数', '増減率': '増減率（%）'}
 
-    fig_country = px.bar(
-        df_country_pivot, y='国籍', x=selected_metric, orientation='h',
-        labels={'国籍': '', selected_metric: metric_options[selected_metric]},
-        color_discrete_sequence=['#636EFA']
-    )
-    fig_country.update_layout(
-        xaxis=dict(fixedrange=True),
-        yaxis=dict(fixedrange=True, tickmode='linear', dtick=1),
-        margin=dict(l=120, r=20, t=30, b=30), height=500,
-        dragmode=False,
-    )
+    def build_country_chart():
+        fig_country = px.bar(
+            df_country_pivot, y='国籍', x=selected_metric, orientation='h',
+            labels={'国籍': '', selected_metric: metric_options[selected_metric]},
+            color_discrete_sequence=['#636EFA']
+        )
+        fig_country.update_layout(
+            xaxis=dict(fixedrange=True),
+            yaxis=dict(fixedrange=True, tickmode='linear', dtick=1),
+            margin=dict(l=120, r=20, t=30, b=30), height=500,
+            dragmode=False,
+        )
+        return fig_country
+
+    fig_country = cached_figure('country_bar', (pref_filter, selected_metric),
+                                data_version(data_dir / 'zairyu_pref_country.csv'), build_country_chart)
     st.plotly_chart(fig_country, use_container_width=True, config={'displayModeBar': False, 'scrollZoom': False}, key='country_bar')
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計（2025年6月）</p>', unsafe_allow_html=True)
 
     # 4. 在留資格別人口バーグラフ
     st.markdown(f'###### {selected_pref}の在留資格別人口と増減（前年比）')
-    df_status_long = pd.read_csv(data_dir / 'zairyu_pref_status.csv')
+    df_status_long = load_zairyu_pref_status()
     df_status_chart = df_status_long[df_status_long['都道府県'] == pref_filter].copy()
 
     # ピボットして2024/06と2025/06を横に並べる
@@ -186,16 +196,21 @@ def render(data_dir):
         selected_status_metric = '人口'
     status_metric_options = {'人口': '人口', '増減数': '増減数', '増減率': '増減率（%）'}
 
-    fig_status = px.bar(
-        df_status_pivot, y='在留資格', x=selected_status_metric, orientation='h',
-        labels={'在留資格': '', selected_status_metric: status_metric_options[selected_status_metric]},
-        color_discrete_sequence=['#00CC96']
-    )
-    fig_status.update_layout(
-        xaxis=dict(fixedrange=True),
-        yaxis=dict(fixedrange=True, tickmode='linear', dtick=1),
-        margin=dict(l=160, r=20, t=30, b=30), height=350,
-        dragmode=False,
-    )
+    def build_status_chart():
+        fig_status = px.bar(
+            df_status_pivot, y='在留資格', x=selected_status_metric, orientation='h',
+            labels={'在留資格': '', selected_status_metric: status_metric_options[selected_status_metric]},
+            color_discrete_sequence=['#00CC96']
+        )
+        fig_status.update_layout(
+            xaxis=dict(fixedrange=True),
+            yaxis=dict(fixedrange=True, tickmode='linear', dtick=1),
+            margin=dict(l=160, r=20, t=30, b=30), height=350,
+            dragmode=False,
+        )
+        return fig_status
+
+    fig_status = cached_figure('status_bar', (pref_filter, selected_status_metric),
+                               data_version(data_dir / 'zairyu_pref_status.csv'), build_status_chart)
     st.plotly_chart(fig_status, use_container_width=True, config={'displayModeBar': False, 'scrollZoom': False}, key='status_bar')
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計（2025年6月）</p>', unsafe_allow_html=True)
@@ -1,13 +1,16 @@
 import streamlit as st
-import pandas as pd
 import tab_zairyugaikokujin
 from constants import STATUS_ORDER, PREF_ORDER
+from arrow_table import arrow_table
+from tracing import span
+from datastore import load_zairyu_pref_status
 
 
+@span('tab_status')
 def render(data_dir):
     """在留資格別タブ: フィルター + グラフ + 都道府県別テーブル"""
     # フィルター（一番上）- STATUS_ORDERの順序で表示
-    df_status_long = pd.read_csv(data_dir / 'zairyu_pref_status.csv')
+    df_status_long = load_zairyu_pref_status()
     available_statuses = set(df_status_long['在留資格'].unique()) - {'総数'}
     status_list = ['すべての在留資格'] + [s for s in STATUS_ORDER if s in available_statuses]
     selected_status = st.selectbox('在留資格を選択', status_list, label_visibility='collapsed', key='status_tab_filter')
@@ -61,15 +64,10 @@ def render(data_dir):
         status_sort_col = '人口（2025）' if selected_status_sort_metric == '人口' else selected_status_sort_metric
         df_status_pref_pivot = df_status_pref_pivot.sort_values(status_sort_col, ascending=False).reset_index(drop=True)
 
-    styled_status_pref = df_status_pref_pivot.style.format({
-        '人口（2025）': '{:,.0f}',
-        '増減数': '{:+,.0f}',
-        '増減率': '{:+.1f}%'
-    }).background_gradient(
-        subset=['人口（2025）', '増減数', '増減率'],
-        cmap='BuGn'
-    ).hide(axis='index')
-
-    html_status_pref = f'<div class="custom-table">{styled_status_pref.to_html()}</div>'
-    st.markdown(html_status_pref, unsafe_allow_html=True)
+    arrow_table(
+        df_status_pref_pivot,
+        formats={'人口（2025）': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+        gradients={col: {'cmap': 'BuGn'} for col in ['人口（2025）', '増減数', '増減率']},
+        key='status_pref_table',
+    )
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計（2025年6月）</p>', unsafe_allow_html=True)
@@ -1,7 +1,9 @@
-import re
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from arrow_table import arrow_table
+from figure_cache import cached_figure
+from tracing import span
+from datastore import data_version, load_zairyu_country
 
 CATEGORY_MAP = {
     '特別永住者': '特別永住者',
@@ -49,11 +51,6 @@ MAIN_COUNTRIES = ['中国', 'ベトナム', '韓国・朝鮮', 'フィリピン'
                   'パキスタン', 'カンボジア', 'モンゴル', '英国']
 
 
-def _date_sort_key(s):
-    m = re.match(r'(\d{4})年(\d+)月', s)
-    return int(m.group(1)) * 100 + int(m.group(2)) if m else 0
-
-
 def _get_country_names(df_total, selected_region, latest_date):
     """地域に応じた国籍リストを返す"""
     if selected_region == '全地域':
@@ -75,6 +72,7 @@ def _filter_by_visa(df, selected_visa):
     return df[df['在留資格'].isin(visa_keys)].copy()
 
 
+@span('tab_zairyugaikokujin')
 def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_filter=True, country_mode=False, show_table=True, title_label=None):
     """
     ext_country: 外部から国籍フィルターを指定（例: '中国', 'ベトナム'）
@@ -84,12 +82,8 @@ def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_fi
     show_table: 外国人数・比率推移テーブルを表示するかどうか
     title_label: チャートタイトルに表示するラベル（例: '中国', '技能実習'）
     """
-    df_zairyu = pd.read_csv(data_dir / 'zairyu_country.csv')
-    if df_zairyu['人口'].dtype == 'object':
-        df_zairyu['人口'] = df_zairyu['人口'].str.replace(',', '').astype(float)
-
-    # ソートキー付与
-    df_zairyu['_sort_key'] = df_zairyu['集計時点'].apply(_date_sort_key)
+    df_zairyu = load_zairyu_country()
+    zairyu_version = data_version(data_dir / 'zairyu_country.csv')
     latest_sort_key = df_zairyu['_sort_key'].max()
     latest_date = df_zairyu[df_zairyu['_sort_key'] == latest_sort_key]['集計時点'].iloc[0]
 
@@ -119,6 +113,9 @@ def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_fi
         selected_country = ext_country if ext_country else '全国籍'
         selected_visa = ext_visa if ext_visa else '全在留資格'
 
+    # 図のキャッシュキー（チャートに影響するフィルター状態）
+    chart_state = (selected_region, selected_country, selected_visa, country_mode)
+
     # --- チャート1: 国籍・地域別推移 ---
     df_filtered = _filter_by_visa(df_zairyu, selected_visa)
     # 在留資格フィルタで個別資格を選んだ場合、国籍・地域ごとに合算
@@ -192,21 +189,26 @@ def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_fi
             df_chart_data[df_chart_data['集計時点'] == chart_latest]
             .sort_values('人口', ascending=False)[color_col].tolist()
         )
-        fig1 = px.line(
-            df_chart_data, x='集計時点', y='人口', color=color_col,
-            category_orders={color_col: order_list, '集計時点': date_order},
-            labels={'人口': '在留外国人数', '集計時点': ''}
-        )
-        fig1.update_traces(mode='lines+markers')
-        fig1.update_layout(
-            xaxis=dict(tickangle=-45, fixedrange=True),
-            yaxis=dict(fixedrange=True),
-            hovermode='x unified', height=450,
-            margin=dict(l=40, r=20, t=50, b=30),
-            template='plotly_white',
-            legend=dict(orientation='h', yanchor='bottom', y=1.08, xanchor='center', x=0.5),
-            dragmode=False,
-        )
+
+        def build_chart1():
+            fig1 = px.line(
+                df_chart_data, x='集計時点', y='人口', color=color_col,
+                category_orders={color_col: order_list, '集計時点': date_order},
+                labels={'人口': '在留外国人数', '集計時点': ''}
+            )
+            fig1.update_traces(mode='lines+markers')
+            fig1.update_layout(
+                xaxis=dict(tickangle=-45, fixedrange=True),
+                yaxis=dict(fixedrange=True),
+                hovermode='x unified', height=450,
+                margin=dict(l=40, r=20, t=50, b=30),
+                template='plotly_white',
+                legend=dict(orientation='h', yanchor='bottom', y=1.08, xanchor='center', x=0.5),
+                dragmode=False,
+            )
+            return fig1
+
+        fig1 = cached_figure('zairyu_chart1', chart_state, zairyu_version, build_chart1)
         st.plotly_chart(fig1, use_container_width=True, config={'displayModeBar': False, 'scrollZoom': False}, key=f'{key_prefix}_chart1')
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計</p>', unsafe_allow_html=True)
 
@@ -239,21 +241,26 @@ def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_fi
         # VISA_GROUP_ORDERの順序で凡例を表示（データに存在するもののみ）
         available_groups = df_visa['在留資格グループ'].unique().tolist()
         visa_order = [g for g in VISA_GROUP_ORDER if g in available_groups]
-        fig_bar2 = px.bar(
-            df_visa, x='集計時点', y='人口', color='在留資格グループ',
-            category_orders={'在留資格グループ': visa_order, '集計時点': visa_date_order},
-            labels={'人口': '在留外国人数', '集計時点': ''}
-        )
-        fig_bar2.update_layout(
-            barmode='stack',
-            xaxis=dict(tickangle=-45, fixedrange=True),
-            yaxis=dict(fixedrange=True),
-            hovermode='x unified', height=450,
-            margin=dict(l=40, r=20, t=50, b=30),
-            template='plotly_white',
-            legend=dict(orientation='h', yanchor='bottom', y=1.08, xanchor='center', x=0.5),
-            dragmode=False,
-        )
+
+        def build_chart2():
+            fig_bar2 = px.bar(
+                df_visa, x='集計時点', y='人口', color='在留資格グループ',
+                category_orders={'在留資格グループ': visa_order, '集計時点': visa_date_order},
+                labels={'人口': '在留外国人数', '集計時点': ''}
+            )
+            fig_bar2.update_layout(
+                barmode='stack',
+                xaxis=dict(tickangle=-45, fixedrange=True),
+                yaxis=dict(fixedrange=True),
+                hovermode='x unified', height=450,
+                margin=dict(l=40, r=20, t=50, b=30),
+                template='plotly_white',
+                legend=dict(orientation='h', yanchor='bottom', y=1.08, xanchor='center', x=0.5),
+                dragmode=False,
+            )
+            return fig_bar2
+
+        fig_bar2 = cached_figure('zairyu_chart2', chart_state, zairyu_version, build_chart2)
         st.plotly_chart(fig_bar2, use_container_width=True, config={'displayModeBar': False, 'scrollZoom': False}, key=f'{key_prefix}_chart2')
     st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計</p>', unsafe_allow_html=True)
 
@@ -291,14 +298,10 @@ def render(data_dir, key_prefix='tab1', ext_country=None, ext_visa=None, show_fi
         # 最新を上に
         df_table = df_table.iloc[::-1].reset_index(drop=True)
 
-        styled_table = df_table.style.format({
-            '人口': '{:,.0f}',
-            '増減数': lambda x: f'{x:+,.0f}' if pd.notna(x) else '-',
-            '増減率': lambda x: f'{x:+.1f}%' if pd.notna(x) else '-'
-        }).background_gradient(
-            subset=['人口'],
-            cmap='Blues'
-        ).hide(axis='index')
-
-        st.markdown(f'<div class="custom-table">{styled_table.to_html()}</div>', unsafe_allow_html=True)
+        arrow_table(
+            df_table,
+            formats={'人口': '{:,.0f}', '増減数': '{:+,.0f}', '増減率': '{:+.1f}%'},
+            gradients={'人口': {'cmap': 'Blues'}},
+            key=f'{key_prefix}_table',
+        )
         st.markdown('<p style="font-size:12px; color:gray; margin-top:-10px;">Source: 出入国在留管理庁 在留外国人統計</p>', unsafe_allow_html=True)
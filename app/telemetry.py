@@ -0,0 +1,289 @@
+"""キャッシュとメモリのテレメトリ。
+
+@tracked('名前') を @st.cache_data / @st.cache_resource の代わりに使うと、キャッシュごとに
+呼び出し・ヒット・ミス回数と、キャッシュにあるエントリの推定サイズを記録する。エントリ数の上限・
+サイズの予算を超えたら、最も長く参照されていないエントリから削除する（削除はこのラッパーだけが行う）。
+
+計測値はプロセスの RSS とあわせて Prometheus のテキスト形式で
+http://127.0.0.1:{OPENJP_METRICS_PORT}/metrics に公開する（OPENJP_METRICS_PORT 未指定なら公開しない）。
+
+予算は環境変数 OPENJP_CACHE_BUDGETS で上書きできる（例: 'load_mega_solar=512,load_asset=128'、単位MB）。
+
+@tracked(..., warm=...) で登録した関数は、warmup.py がサーバー内の最初の再実行時にバックグラウンドで呼ぶ。
+"""
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from resource import RUSAGE_SELF, getrusage
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from cachetools import LRUCache
+
+MB = 1024 * 1024
+
+
+def _budget_overrides():
+    overrides = {}
+    for item in os.environ.get('OPENJP_CACHE_BUDGETS', '').split(','):
+        name, _, mb = item.partition('=')
+        if name.strip() and mb.strip():
+            overrides[name.strip()] = float(mb) * MB
+    return overrides
+
+
+_BUDGET_OVERRIDES = _budget_overrides()
+
+
+@dataclass
+class CacheStats:
+    budget: float = None
+    calls: int = 0
+    misses: int = 0
+    entries: int = 0
+    bytes: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self):
+        return self.calls - self.misses
+
+
+_stats = {}
+_lock = threading.Lock()
+# ウォームアップの対象 [(キャッシュ名, 関数, 引数のリストを返す関数)]（登録順）
+_warm = []
+
+
+def estimate_size(obj):
+    """オブジェクトのおおよそのメモリ量（バイト）。"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, (pa.Table, pa.RecordBatch, np.ndarray)):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def record(name, hit):
+    """キャッシュの参照を1回記録する（tracked を使わないキャッシュ用）。
+
+    エントリ数・サイズはキャッシュにあるものを resident() で記録する（TrackedLRU なら自動）。
+    """
+    with _lock:
+        stats = _stats.setdefault(name, CacheStats())
+        stats.calls += 1
+        if not hit:
+            stats.misses += 1
+
+
+def resident(name, entries, nbytes):
+    """キャッシュに現在あるエントリの数と推定サイズを記録する。"""
+    with _lock:
+        stats = _stats.setdefault(name, CacheStats())
+        stats.entries = entries
+        stats.bytes = nbytes
+
+
+class TrackedLRU(LRUCache):
+    """エントリ数を上限とする LRU（cachetools）。キャッシュにあるエントリの数・推定サイズと
+    削除数を name の統計に記録する。スレッドセーフではないので、呼び出し側のロックの中で使うこと。
+
+    sizeof: 値の推定サイズ（バイト）を返す関数。
+    """
+
+    def __init__(self, name, maxsize, sizeof=estimate_size):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self._sizeof = sizeof
+        self._sizes = {}
+        resident(name, 0, 0)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._sizes[key] = self._sizeof(value)
+        resident(self.name, len(self), sum(self._sizes.values()))
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._sizes.pop(key, None)
+        resident(self.name, len(self), sum(self._sizes.values()))
+
+    def popitem(self):
+        # 上限を超えたときの削除
+        item = super().popitem()
+        with _lock:
+            _stats[self.name].evictions += 1
+        return item
+
+
+def tracked(name, resource=False, budget_mb=None, max_entries=None, warm=None, **cache_kwargs):
+    """計測付きの st.cache_data（resource=True なら st.cache_resource）。
+
+    cache_kwargs は ttl など Streamlit のキャッシュにそのまま渡す。引数はハッシュ可能な値に限る。
+    max_entries: エントリ数の上限。budget_mb: 推定サイズの合計の上限（MB）。
+        どちらも超えたら最も長く参照されていないエントリから削除する。
+        Streamlit 側の max_entries は使わない（削除されたエントリのサイズを差し引けないため）。
+    warm: ウォームアップで呼ぶ引数の組のリストを返す関数（引数なしで呼ぶだけなら True）。
+    """
+    budget = _BUDGET_OVERRIDES.get(name, budget_mb * MB if budget_mb else None)
+    with _lock:
+        _stats[name] = CacheStats(budget=budget)
+    cache = st.cache_resource if resource else st.cache_data
+
+    def decorator(fn):
+        # キャッシュにあるエントリ {(args, kwargs): (推定サイズ, args, kwargs)}（参照の古い順）
+        entries = OrderedDict()
+
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            value = fn(*args, **kwargs)
+            size = estimate_size(value)
+            with _lock:
+                _stats[name].misses += 1
+                entries[(args, tuple(sorted(kwargs.items())))] = (size, args, kwargs)
+            return value
+
+        cached = cache(**cache_kwargs)(compute)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                _stats[name].calls += 1
+            value = cached(*args, **kwargs)
+            key = (args, tuple(sorted(kwargs.items())))
+            evicted = []
+            with _lock:
+                stats = _stats[name]
+                if key in entries:
+                    entries.move_to_end(key)
+                total = sum(size for size, _, _ in entries.values())
+                # 今回のエントリは残す（消しても再計算になるだけ）
+                while len(entries) > 1 and (
+                    (max_entries is not None and len(entries) > max_entries)
+                    or (stats.budget is not None and total > stats.budget)
+                ):
+                    _, (size, old_args, old_kwargs) = entries.popitem(last=False)
+                    total -= size
+                    evicted.append((old_args, old_kwargs))
+                stats.evictions += len(evicted)
+                stats.entries = len(entries)
+                stats.bytes = total
+            for old_args, old_kwargs in evicted:
+                # 返したオブジェクトは呼び出し元が保持しているので、次回以降の呼び出しから再計算される
+                cached.clear(*old_args, **old_kwargs)
+            return value
+
+        def clear():
+            with _lock:
+                entries.clear()
+                _stats[name].entries = 0
+                _stats[name].bytes = 0
+            cached.clear()
+
+        wrapper.clear = clear
+        if warm:
+            with _lock:
+                _warm.append((name, wrapper, warm if callable(warm) else lambda: [()]))
+        return wrapper
+
+    return decorator
+
+
+def rss_bytes():
+    """プロセスの現在の RSS（取得できなければ None）。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes():
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def warm_registry():
+    """tracked(warm=...) で登録した (キャッシュ名, 関数, 引数のリストを返す関数) のリスト。"""
+    with _lock:
+        return list(_warm)
+
+
+def snapshot():
+    """{キャッシュ名: CacheStats} のコピー。"""
+    with _lock:
+        return {name: CacheStats(**vars(s)) for name, s in _stats.items()}
+
+
+def render_metrics():
+    """Prometheus テキスト形式の計測値。"""
+    stats = snapshot()
+    lines = []
+
+    def metric(metric_name, kind, help_text, values):
+        lines.append(f'# HELP {metric_name} {help_text}')
+        lines.append(f'# TYPE {metric_name} {kind}')
+        for labels, value in values:
+            label_str = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'{metric_name}{{{label_str}}} {value}' if label_str else f'{metric_name} {value}')
+
+    metric('openjp_cache_hits_total', 'counter', 'Cache hits per cached function.',
+           [({'cache': n}, s.hits) for n, s in stats.items()])
+    metric('openjp_cache_misses_total', 'counter', 'Cache misses per cached function.',
+           [({'cache': n}, s.misses) for n, s in stats.items()])
+    metric('openjp_cache_evictions_total', 'counter', 'Entries evicted by max_entries or the size budget.',
+           [({'cache': n}, s.evictions) for n, s in stats.items()])
+    metric('openjp_cache_entries', 'gauge', 'Entries currently cached.',
+           [({'cache': n}, s.entries) for n, s in stats.items()])
+    metric('openjp_cache_bytes', 'gauge', 'Estimated size of the entries currently cached.',
+           [({'cache': n}, s.bytes) for n, s in stats.items()])
+    metric('openjp_cache_budget_bytes', 'gauge', 'Configured size budget.',
+           [({'cache': n}, int(s.budget)) for n, s in stats.items() if s.budget is not None])
+    rss = rss_bytes()
+    if rss is not None:
+        metric('openjp_process_resident_memory_bytes', 'gauge', 'Resident set size.', [({}, rss)])
+    metric('openjp_process_peak_resident_memory_bytes', 'gauge', 'Peak resident set size.',
+           [({}, peak_rss_bytes())])
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def start_exporter():
+    """OPENJP_METRICS_PORT が指定されていれば /metrics の配信を開始する（プロセスにつき1回）。"""
+    port = os.environ.get('OPENJP_METRICS_PORT')
+    if not port:
+        return None
+    server = ThreadingHTTPServer(('127.0.0.1', int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,140 @@
+"""区間ごとの処理時間の計測。
+
+span('名前') をコンテキストマネージャまたはデコレーターとして使い、スクリプト実行（rerun）ごとに
+各区間の経過時間を記録する。rerun の終了時に1行のJSONとしてログに出力し、直近の rerun の
+履歴から区間ごとの p50/p95 を集計する。
+
+環境変数:
+    OPENJP_TRACE_LOG: JSONログの出力先ファイル（未指定ならロガー 'openjp.trace' に出力するのみ）
+    OPENJP_TRACE_ALLOC: 1 なら tracemalloc を有効にし、区間ごとの確保メモリ量も記録する
+
+URLに ?debug=1 を付けるとサイドバーにデバッグパネルを表示する。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import ContextDecorator
+
+import pandas as pd
+import streamlit as st
+
+HISTORY = 200
+
+logger = logging.getLogger('openjp.trace')
+if os.environ.get('OPENJP_TRACE_LOG') and not logger.handlers:
+    _handler = logging.FileHandler(os.environ['OPENJP_TRACE_LOG'], encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+if os.environ.get('OPENJP_TRACE_ALLOC') == '1' and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# rerun はセッションごとのスクリプトスレッドで実行されるので、記録はスレッドごとに持つ
+_local = threading.local()
+
+
+def _traced_memory():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+
+class span(ContextDecorator):
+    """名前付き区間の計測。rerun の外（ウォームアップのワーカーなど）では何も記録しない。"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _recreate_cm(self):
+        # デコレーターとして使うと呼び出しごとに別インスタンスで計測する（スレッド間で共有しない）
+        return span(self.name)
+
+    def __enter__(self):
+        records = getattr(_local, 'records', None)
+        self._record = None
+        if records is None:
+            return self
+        # 開始時に追加するので、記録はネストの親が先に並ぶ
+        self._record = {'name': self.name, 'depth': _local.depth, 'ms': None}
+        records.append(self._record)
+        _local.depth += 1
+        self._mem = _traced_memory()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self._record is None:
+            return False
+        self._record['ms'] = round((time.perf_counter() - self._t0) * 1000, 2)
+        if self._mem is not None:
+            self._record['alloc_kb'] = round((_traced_memory() - self._mem) / 1024, 1)
+        _local.depth = self._record['depth']
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def _history():
+    """ページごとの直近 rerun の {区間名: ms}。"""
+    return defaultdict(lambda: deque(maxlen=HISTORY)), threading.Lock()
+
+
+def begin_run():
+    """rerun の計測を開始する。"""
+    _local.records = []
+    _local.depth = 0
+    _local.t0 = time.perf_counter()
+
+
+def end_run(page):
+    """rerun の計測を終了し、ログと履歴に記録する。記録した区間のリストを返す。"""
+    records = getattr(_local, 'records', None)
+    if records is None:
+        return []
+    total_ms = round((time.perf_counter() - _local.t0) * 1000, 2)
+    _local.records = None
+    # 例外で抜けた区間など、終了していないものは除く
+    records = [r for r in records if r['ms'] is not None]
+
+    logger.info(json.dumps({
+        'ts': time.time(), 'page': page, 'total_ms': total_ms, 'spans': records,
+    }, ensure_ascii=False))
+
+    summary = {'合計': total_ms}
+    for r in records:
+        summary[r['name']] = summary.get(r['name'], 0) + r['ms']
+    history, lock = _history()
+    with lock:
+        history[page].append(summary)
+    return [{'name': '合計', 'depth': 0, 'ms': total_ms}] + records
+
+
+def debug_enabled():
+    return st.query_params.get('debug') == '1'
+
+
+def render_debug_panel(page, records):
+    """今回の rerun の内訳と、直近 rerun の p50/p95 をサイドバーに表示する。"""
+    history, lock = _history()
+    with lock:
+        runs = list(history[page])
+
+    with st.sidebar.expander('トレース', expanded=True):
+        st.caption(f'今回の rerun（{page}）')
+        df_now = pd.DataFrame(records)
+        if not df_now.empty:
+            df_now['name'] = ['　' * d + n for d, n in zip(df_now['depth'], df_now['name'])]
+            st.dataframe(df_now.drop(columns='depth'), hide_index=True, use_container_width=True)
+
+        st.caption(f'直近 {len(runs)} 回の rerun')
+        df_hist = pd.DataFrame(runs)
+        if not df_hist.empty:
+            stats = pd.DataFrame({
+                'p50': df_hist.quantile(0.5),
+                'p95': df_hist.quantile(0.95),
+                '回数': df_hist.count(),
+            }).round(1)
+            st.dataframe(stats, use_container_width=True)
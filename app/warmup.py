@@ -0,0 +1,193 @@
+"""キャッシュのウォームアップ。
+
+サーバーの起動時に実行する:
+
+    python app/warmup.py --serve        # このプロセスで全ページを温めてから streamlit run app/app.py を起動
+    python app/warmup.py                # ディスク上のキャッシュだけを作る（起動済み・別プロセスのサーバー向け）
+
+各ページを Streamlit の AppTest でヘッドレス実行し、全国と47都道府県の表示を1回ずつ再生する。
+データセットの読み込み（data/arrow/ の Arrow ファイル）、集計・図（result_cache が有効ならディスクにも）、
+比較・地図の表、設備の地図のインデックス、境界GeoJSONの公開まで、実際の閲覧と同じ経路で作られる。
+--serve では同じプロセスの cache_resource も温まった状態でサーバーが接続を受け付ける。
+
+また、サーバー内では最初のスクリプト実行で start() を呼び、tracked(warm=...) で登録された
+読み込み関数をバックグラウンドのワーカーで呼ぶ（引数の展開もワーカーで行い、閲覧の再実行を待たせない）。
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import streamlit as st
+
+import telemetry
+from constants import PREF_ORDER
+# 以下は tracked(warm=...) で読み込み関数を登録させるために import する
+import datastore  # noqa: F401
+import geo_assets  # noqa: F401
+import jinko_age  # noqa: F401
+import jinko_compare  # noqa: F401
+import solar_query  # noqa: F401
+import solar_search  # noqa: F401
+
+APP_DIR = Path(__file__).resolve().parent
+MAX_WORKERS = 4
+
+# {ページ: (都道府県のウィジェットのkey, 再生時に合わせて設定するウィジェット)}
+PAGES = {
+    'page_megasolar': ('solar_pref_filter', {'solar_point_map_toggle': True}),
+    'page_imin': ('tab_pref_select', {}),
+    'page_jinko': ('jinko_pref_filter', {}),
+    'page_zaisei': ('zaisei_pref_filter', {}),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _tasks(name, warm):
+    """登録された読み込み関数の引数の組のリスト。"""
+    try:
+        return warm()
+    except Exception:
+        # 引数を決めるためのデータがないなど。実際の閲覧時に改めてエラーになる
+        logger.exception('warmup skipped: %s', name)
+        return []
+
+
+class Warmup:
+    """ウォームアップの進捗。"""
+
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.expanded = False
+        self.failed = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.expanded and self.done >= self.total
+
+    def _run(self, name, fn, args):
+        t0 = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception:
+            # データ未生成など。実際の閲覧時に改めてエラーになる
+            logger.exception('warmup failed: %s', name)
+            with self._lock:
+                self.failed.append(name)
+        else:
+            logger.info('warmup %s: %.2fs', name, time.perf_counter() - t0)
+        with self._lock:
+            self.done += 1
+
+    def _expand(self, executor):
+        """登録順（import 順・モジュール内の定義順）に引数を展開して投入する。"""
+        for name, fn, warm in telemetry.warm_registry():
+            for args in _tasks(name, warm):
+                label = f'{name}({", ".join(str(a) for a in args)})' if args else name
+                with self._lock:
+                    self.total += 1
+                executor.submit(self._run, label, fn, args)
+        self.expanded = True
+        executor.shutdown(wait=False)
+
+    def start(self):
+        executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='warmup')
+        executor.submit(self._expand, executor)
+
+
+@st.cache_resource(show_spinner=False)
+def start():
+    """ウォームアップを開始する（プロセスにつき1回）。進捗の Warmup を返す。"""
+    warmup = Warmup()
+    warmup.start()
+    return warmup
+
+
+def show_progress(warmup):
+    """ウォームアップ中はサイドバーに進捗を表示する。"""
+    if warmup.finished:
+        return
+    done, total = warmup.done, max(warmup.total, 1)
+    st.sidebar.progress(min(done / total, 1.0), text=f'キャッシュ準備中（{done}/{warmup.total}）')
+
+
+def _pref_options(at, key):
+    """実行済みの AppTest の都道府県のウィジェットの選択肢。"""
+    try:
+        return list(at.selectbox(key=key).options)
+    except KeyError:
+        return []
+
+
+def replay_page(page, prefs, timeout):
+    """ページを全国・prefs の都道府県について1回ずつ実行し、(実行した数, エラー) を返す。"""
+    from streamlit.testing.v1 import AppTest
+
+    pref_key, extra = PAGES[page]
+    path = str(APP_DIR / f'{page}.py')
+    at = AppTest.from_file(path, default_timeout=timeout)
+    at.run()
+    if at.exception:
+        return 0, [f'{page}: {at.exception[0].message}']
+    # データのない都道府県は選択肢にない
+    options = _pref_options(at, pref_key)
+    count, errors = 0, []
+    for pref in ['全国'] + prefs:
+        if pref not in options:
+            continue
+        t0 = time.perf_counter()
+        # 実行済みの AppTest に set_value すると失敗するウィジェットがあるので、都道府県ごとに作り直す
+        at = AppTest.from_file(path, default_timeout=timeout)
+        for key, value in {pref_key: pref, **extra}.items():
+            at.session_state[key] = value
+        at.run()
+        if at.exception:
+            errors.append(f'{page}/{pref}: {at.exception[0].message}')
+            continue
+        count += 1
+        logger.info('warmup %s %s: %.2fs', page, pref, time.perf_counter() - t0)
+    return count, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='キャッシュのウォームアップ（全ページ × 全国・47都道府県）')
+    parser.add_argument('--page', action='append', choices=list(PAGES), help='対象ページ（省略時は全ページ）')
+    parser.add_argument('--pref', action='append', help='対象の都道府県（省略時は47都道府県）')
+    parser.add_argument('--timeout', type=float, default=300, help='1回の実行のタイムアウト（秒）')
+    parser.add_argument('--serve', action='store_true',
+                        help='温めたあと、このプロセスで streamlit run app/app.py を起動する')
+    parser.add_argument('streamlit_args', nargs=argparse.REMAINDER,
+                        help='--serve 時に streamlit run に渡す引数（-- の後に指定）')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    main_module = sys.modules['__main__']
+    t0 = time.perf_counter()
+    errors = []
+    for page in args.page or list(PAGES):
+        count, page_errors = replay_page(page, args.pref or PREF_ORDER, args.timeout)
+        errors += page_errors
+        print(f'{page}: {count} views')
+    # AppTest は __main__ を実行したページに置き換える
+    sys.modules['__main__'] = main_module
+    print(f'warmup: {time.perf_counter() - t0:.0f}s')
+    for e in errors:
+        print(f'ERROR {e}')
+
+    if not args.serve:
+        return 1 if errors else 0
+    # データのないページのエラーでもサーバーは起動する（閲覧時に同じエラーを表示する）
+    from streamlit.web import cli
+    extra = [a for a in args.streamlit_args if a != '--']
+    sys.argv = ['streamlit', 'run', str(APP_DIR / 'app.py'), *extra]
+    return cli.main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,8 +6,10 @@
 #############################################################
 
 import pandas as pd
+import numpy as np
 import requests
 import io
+import json
 from pathlib import Path
 
 # --- 1. 設定エリア ---
@@ -24,6 +26,14 @@ AGE_COLS = [
     '75歳～79歳', '80歳以上'
 ]
 
+# 年齢別キューブの軸（年齢区分は総数を除く5歳階級）
+AGE_BANDS = AGE_COLS[1:]
+SEXES = ['男', '女']
+NATIONALITIES = ['日本人', '外国人']
+# (市区町村, 年, 年齢区分, 性別, 国籍) の int32 配列と軸のラベル
+AGE_CUBE_PATH = DATA_DIR / 'daicho_age.npy'
+AGE_AXES_PATH = DATA_DIR / 'daicho_age.json'
+
 # 市区町村の合併・移行対応辞書
 REMAP_DICT = {
     ("033057", "岩手郡滝沢村"): ("032166", "滝沢市"),
@@ -141,7 +151,7 @@ links_foreigner = [
 ]
 
 
-def generate_dtaframe(links):
+def generate_long(links):
     print('\n ---- generate dataframe ----')
     # データの取得と結合
     all_df = [fetch_and_clean(link['year'], link['url']) for link in links]
@@ -176,7 +186,10 @@ def generate_dtaframe(links):
         on=['都道府県名', '市区町村名'], 
         how="left"
     )
+    return df_long
+
 
+def generate_dtaframe(df_long):
     # --- 5. 集計結果の確認 ---
     # 市区町村別
     df_filtered = df_long[
@@ -189,9 +202,47 @@ def generate_dtaframe(links):
 
     return df_filtered
 
-df_total = generate_dtaframe(links_total).rename(columns={'人口':'総人口'})
-df_japanese = generate_dtaframe(links_japanese).rename(columns={'人口':'日本人人口'})
-df_foreigner= generate_dtaframe(links_foreigner).rename(columns={'人口':'外国人人口'})
+def generate_age_cube(long_by_nationality):
+    """市区町村 × 年 × 年齢区分 × 性別 × 国籍の int32 配列と軸のラベル。"""
+    df = pd.concat([d.assign(国籍=n) for n, d in long_by_nationality.items()], ignore_index=True)
+    df = df[
+        (df['エリアレベル'] == 'level3') &
+        df['性別'].isin(SEXES) &
+        df['年齢区分'].isin(AGE_BANDS)
+    ]
+    areas = df[['団体コード', '都道府県名', '市区町村名']].drop_duplicates(['都道府県名', '市区町村名'], keep='last')
+    areas = areas.sort_values('団体コード').reset_index(drop=True)
+    years = sorted(int(y) for y in df['year'].unique())
+
+    area_idx = pd.MultiIndex.from_frame(areas[['都道府県名', '市区町村名']]).get_indexer(
+        pd.MultiIndex.from_frame(df[['都道府県名', '市区町村名']]))
+    idx = (
+        area_idx,
+        pd.Categorical(df['year'].astype(int), categories=years).codes,
+        pd.Categorical(df['年齢区分'], categories=AGE_BANDS).codes,
+        pd.Categorical(df['性別'], categories=SEXES).codes,
+        pd.Categorical(df['国籍'], categories=NATIONALITIES).codes,
+    )
+    cube = np.zeros((len(areas), len(years), len(AGE_BANDS), len(SEXES), len(NATIONALITIES)), dtype=np.int32)
+    # 合併で同じ市区町村にまとめた行は足し合わせる
+    np.add.at(cube, idx, df['人口'].to_numpy(np.int32))
+    axes = {
+        'areas': areas.values.tolist(),
+        'years': years,
+        'ages': AGE_BANDS,
+        'sexes': SEXES,
+        'nationalities': NATIONALITIES,
+    }
+    return cube, axes
+
+
+long_total = generate_long(links_total)
+long_japanese = generate_long(links_japanese)
+long_foreigner = generate_long(links_foreigner)
+
+df_total = generate_dtaframe(long_total).rename(columns={'人口':'総人口'})
+df_japanese = generate_dtaframe(long_japanese).rename(columns={'人口':'日本人人口'})
+df_foreigner= generate_dtaframe(long_foreigner).rename(columns={'人口':'外国人人口'})
 df = pd.merge(df_total,df_japanese, on=['year','団体コード','都道府県名','市区町村名'], how='left')
 df = pd.merge(df,df_foreigner, on=['year','団体コード','都道府県名','市区町村名'], how='left')
 
@@ -211,4 +262,10 @@ df.to_parquet(output_path, engine="pyarrow", index=False)
 
 print(f"\n完了！ 保存先: {output_path}")
 
+# 年齢別キューブ（アプリからメモリマップで読む）
+cube, axes = generate_age_cube({'日本人': long_japanese, '外国人': long_foreigner})
+np.save(AGE_CUBE_PATH, cube)
+AGE_AXES_PATH.write_text(json.dumps(axes, ensure_ascii=False), encoding='utf-8')
+print(f"年齢別キューブ: {cube.shape} ({cube.nbytes / 1e6:.1f}MB) 保存先: {AGE_CUBE_PATH}")
+
 
@@ -2,15 +2,26 @@
 
 Source: smartnews-smri/japan-topography (国土数値情報 行政区域データ N03)
 """
+import hashlib
 import json
+import shutil
 import requests
 import geopandas as gpd
+import mapbox_vector_tile
+from shapely.geometry import box
 from pathlib import Path
 
 DATA_DIR = Path(__file__).resolve().parent
 GEO_DIR = DATA_DIR / 'geo'
 GEO_DIR.mkdir(exist_ok=True)
 
+# 市区町村ベクタータイル（アプリの静的配信ディレクトリに出力）
+TILE_DIR = DATA_DIR.parent / 'app' / 'static' / 'tiles' / 'municipalities'
+TILE_LAYER = 'municipalities'
+TILE_MINZOOM, TILE_MAXZOOM = 4, 10
+TILE_EXTENT = 4096
+MERCATOR_HALF = 20037508.342789244
+
 # 全国の市区町村GeoJSON (s0001 = 簡略化済み, ~1.6MB)
 URL = 'https://raw.githubusercontent.com/smartnews-smri/japan-topography/main/data/municipality/geojson/s0001/N03-21_210101.json'
 
@@ -69,4 +80,56 @@ for i, pref in enumerate(PREF_ORDER, 1):
     city_gdf.to_file(out, driver='GeoJSON')
     print(f'  {pref}: {len(city_gdf)} cities')
 
+# --- 市区町村ベクタータイル (全国) ---
+# 表示範囲のタイルだけをブラウザが取得するので、全国の市区町村を一度に送らずに済む。
+print('Generating municipality vector tiles...')
+muni = gdf.dissolve(by=['都道府県', '市区町村']).reset_index()[['都道府県', '市区町村', 'geometry']]
+muni = muni.to_crs(epsg=3857)
+sindex = muni.sindex
+minx, miny, maxx, maxy = muni.total_bounds
+
+if TILE_DIR.exists():
+    shutil.rmtree(TILE_DIR)
+n_tiles = 0
+for z in range(TILE_MINZOOM, TILE_MAXZOOM + 1):
+    size = 2 * MERCATOR_HALF / 2 ** z
+    # 1ピクセル相当で簡略化、タイル境界の継ぎ目が出ないよう少し広めに切り抜く
+    simplified = muni.geometry.simplify(size / TILE_EXTENT, preserve_topology=True)
+    pad = size * 8 / TILE_EXTENT
+    for x in range(int((minx + MERCATOR_HALF) // size), int((maxx + MERCATOR_HALF) // size) + 1):
+        for y in range(int((MERCATOR_HALF - maxy) // size), int((MERCATOR_HALF - miny) // size) + 1):
+            bounds = (-MERCATOR_HALF + x * size, MERCATOR_HALF - (y + 1) * size,
+                      -MERCATOR_HALF + (x + 1) * size, MERCATOR_HALF - y * size)
+            clip = box(bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+            features = []
+            for i in sindex.query(clip, predicate='intersects'):
+                geom = simplified.iloc[i].intersection(clip)
+                if geom.is_empty:
+                    continue
+                features.append({
+                    'geometry': geom,
+                    'properties': {'都道府県': muni['都道府県'].iloc[i], '市区町村': muni['市区町村'].iloc[i]},
+                })
+            if not features:
+                continue
+            tile = mapbox_vector_tile.encode(
+                [{'name': TILE_LAYER, 'features': features}],
+                default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT},
+            )
+            out = TILE_DIR / str(z) / str(x) / f'{y}.pbf'
+            out.parent.mkdir(parents=True, exist_ok=True)
+            out.write_bytes(tile)
+            n_tiles += 1
+    print(f'  z{z}: done')
+
+meta = {
+    'version': hashlib.sha256(r.content).hexdigest()[:12],
+    'layer': TILE_LAYER,
+    'minzoom': TILE_MINZOOM,
+    'maxzoom': TILE_MAXZOOM,
+    'features': muni[['都道府県', '市区町村']].values.tolist(),
+}
+(TILE_DIR / 'tiles.json').write_text(json.dumps(meta, ensure_ascii=False))
+print(f'  {n_tiles} tiles → {TILE_DIR}')
+
 print('Done.')
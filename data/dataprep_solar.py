@@ -1,6 +1,10 @@
 import io
+import shutil
+import sys
 import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 from pathlib import Path
 
 BASE_URL = 'https://www.fit-portal.go.jp'
@@ -68,6 +72,18 @@ PREF_LINKS = {
 }
 
 DATA_DIR = Path(__file__).resolve().parent
+# 行グループの行数（統計で読み飛ばす単位）
+ROWS_PER_GROUP = 16_384
+
+# 月次の履歴（SCD type 2）。引数で取得月を指定できる（例: 2026-10）。省略時は当月
+HISTORY_PATH = DATA_DIR / 'solar_history.parquet'
+HISTORY_COLUMNS = ['都道府県', '発電事業者名', '発電設備区分', '出力kW', '代表住所',
+                   '新規認定日', '運転開始報告年月', '調達期間終了年月']
+AS_OF = pd.Timestamp(sys.argv[1] if len(sys.argv) > 1 else pd.Timestamp.today().strftime('%Y-%m')).replace(day=1)
+
+# 取得月が履歴より前なら、ダウンロード・データセットの上書きの前に止める
+if HISTORY_PATH.exists() and (pd.read_parquet(HISTORY_PATH, columns=['valid_from'])['valid_from'] >= AS_OF).any():
+    raise ValueError(f'{AS_OF:%Y-%m} 以降の取得分が履歴にあります')
 
 frames_nintei = []
 frames_shozaichi = []
@@ -95,15 +111,68 @@ for pref, path in PREF_LINKS.items():
     print(f'認定{len(df1):,}件 / 所在地{len(df2):,}件')
 
 
-def save_parquet(frames, name):
+def concat_frames(frames):
+    """都道府県ごとの表を結合し、文字列をそろえて出力の数値列（出力kW）を加える。"""
     df = pd.concat(frames, ignore_index=True)
     for col in df.columns:
         if df[col].dtype == object:
             df[col] = df[col].astype(str).replace('nan', '')
-    out = DATA_DIR / f'{name}.parquet'
-    df.to_parquet(out, index=False)
-    print(f'{name}: {len(df):,}件 → {out}')
+    df['出力kW'] = pd.to_numeric(df['太陽電池の合計出力kW'], errors='coerce').fillna(0)
+    return df
+
+
+def save_dataset(df, name):
+    """都道府県・発電設備区分で Hive 形式に分割した Parquet データセットとして保存する。
+
+    パーティション内を出力順に並べて書くので、行グループの統計（最小・最大）で
+    出力の範囲指定に合わない行グループを読み飛ばせる。
+    """
+    df = df.sort_values(['都道府県', '発電設備区分', '出力kW'], kind='stable')
+    out = DATA_DIR / name
+    if out.exists():
+        shutil.rmtree(out)
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False), out, format='parquet',
+        partitioning=['都道府県', '発電設備区分'], partitioning_flavor='hive',
+        max_rows_per_group=ROWS_PER_GROUP, min_rows_per_group=ROWS_PER_GROUP // 4,
+    )
+    print(f'{name}: {len(df):,}件 → {out}/')
+
+
+def update_history(df, as_of):
+    """今回の取得分を履歴と設備IDで突き合わせ、変化した設備だけ有効期間付きの行を追加する（SCD type 2）。
+
+    履歴の各行は valid_from 以降 valid_to より前（valid_to が空なら現在まで）有効。
+    属性が変わった設備・一覧から消えた設備は現在の行の valid_to を as_of で閉じ、
+    変わった設備・新しい設備は valid_from = as_of の行を追加する。
+    """
+    snap = df[['設備ID'] + HISTORY_COLUMNS].drop_duplicates('設備ID', keep='last')
+    snap = snap.assign(_hash=pd.util.hash_pandas_object(snap[HISTORY_COLUMNS], index=False).to_numpy())
+
+    if HISTORY_PATH.exists():
+        hist = pd.read_parquet(HISTORY_PATH)
+        current = hist['valid_to'].isna()
+        merged = hist.loc[current, ['設備ID', '_hash']].merge(
+            snap[['設備ID', '_hash']], on='設備ID', how='outer', suffixes=('_old', '_new'), indicator=True)
+        changed = merged.loc[(merged['_merge'] == 'both') & (merged['_hash_old'] != merged['_hash_new']), '設備ID']
+        removed = merged.loc[merged['_merge'] == 'left_only', '設備ID']
+        added = merged.loc[merged['_merge'] == 'right_only', '設備ID']
+        hist.loc[current & hist['設備ID'].isin(pd.concat([changed, removed])), 'valid_to'] = as_of
+        new_rows = snap[snap['設備ID'].isin(pd.concat([changed, added]))]
+        print(f'履歴: 変更{len(changed):,}件 / 追加{len(added):,}件 / 削除{len(removed):,}件')
+    else:
+        hist = None
+        new_rows = snap
+        print(f'履歴: 初回{len(snap):,}件')
+
+    new_rows = new_rows.assign(valid_from=as_of, valid_to=pd.NaT)
+    hist = new_rows if hist is None else pd.concat([hist, new_rows], ignore_index=True)
+    hist = hist.sort_values(['設備ID', 'valid_from'], kind='stable')
+    hist.to_parquet(HISTORY_PATH, index=False, row_group_size=ROWS_PER_GROUP)
+    print(f'solar_history: {len(hist):,}行 → {HISTORY_PATH}')
 
 
-save_parquet(frames_nintei, 'solar_nintei')
-save_parquet(frames_shozaichi, 'solar_shozaichi')
+df_nintei = concat_frames(frames_nintei)
+save_dataset(df_nintei, 'solar_nintei')
+save_dataset(concat_frames(frames_shozaichi), 'solar_shozaichi')
+update_history(df_nintei, AS_OF)
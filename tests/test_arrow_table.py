@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+import matplotlib.colors as mcolors
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'app'))
+
+import arrow_table  # noqa: E402
+
+
+def _render(monkeypatch, df, **kwargs):
+    calls = []
+    monkeypatch.setattr(arrow_table, '_component', lambda **args: calls.append(args))
+    arrow_table.arrow_table(df, **kwargs)
+    assert len(calls) == 1
+    return calls[0]
+
+
+def test_gradients(monkeypatch):
+    df = pd.DataFrame({'都道府県': ['北海道', '沖縄県'], '総人口': [5_000_000, 1_400_000], '増減率': [-5.2, 1.1]})
+    cmap = mcolors.LinearSegmentedColormap.from_list('jinko', ['#d73027', '#fee090', '#4575b4'])
+    args = _render(
+        monkeypatch, df,
+        formats={'総人口': '{:,.0f}', '増減率': '{:+.1f}%'},
+        gradients={'総人口': {'cmap': 'Blues'}, '増減率': {'cmap': cmap, 'vmin': -6, 'vmax': 6}},
+        key='t',
+    )
+    columns = {c['name']: c for c in args['columns']}
+    assert columns['都道府県']['gradient'] is None
+    assert columns['総人口']['gradient']['vmin'] is None
+    assert len(columns['総人口']['gradient']['colors']) == arrow_table._N_STOPS
+    assert columns['増減率']['gradient']['vmin'] == -6
+    assert columns['増減率']['gradient']['colors'][0] == '#d73027'
+    assert columns['増減率']['format'] == {'prefix': '', 'sign': True, 'comma': False, 'decimals': 1, 'suffix': '%'}
+    assert pa.ipc.open_stream(args['data']).read_all().num_rows == 2
+
+
+def test_row_ids(monkeypatch):
+    args = _render(monkeypatch, pd.DataFrame({'a': [1, 2]}), row_ids=[10, 20])
+    assert args['row_ids'] == ['10', '20']
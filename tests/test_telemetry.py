@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'app'))
+
+import telemetry  # noqa: E402
+
+
+def test_max_entries_evicts_least_recently_used():
+    calls = []
+
+    @telemetry.tracked('test_max_entries', resource=True, max_entries=2)
+    def load(n):
+        calls.append(n)
+        return b'x' * n
+
+    load(100)
+    load(200)
+    load(100)
+    load(300)
+    stats = telemetry.snapshot()['test_max_entries']
+    assert stats.entries == 2
+    assert stats.evictions == 1
+    assert stats.bytes == telemetry.estimate_size(b'x' * 100) + telemetry.estimate_size(b'x' * 300)
+
+    # 200 だけが削除されている
+    load(100)
+    load(300)
+    load(200)
+    assert calls == [100, 200, 300, 200]
+    load.clear()
+
+
+def test_budget_keeps_size_of_cached_entries():
+    size = telemetry.estimate_size(b'x' * 1000)
+
+    @telemetry.tracked('test_budget', resource=True)
+    def load(n):
+        return b'x' * 1000
+
+    telemetry._stats['test_budget'].budget = size * 2.5
+    for n in range(10):
+        load(n)
+    stats = telemetry.snapshot()['test_budget']
+    assert stats.entries == 2
+    assert stats.bytes == size * 2
+    assert stats.evictions == 8
+    load.clear()
+    assert telemetry.snapshot()['test_budget'].bytes == 0
+
+
+def test_tracked_lru_reports_resident_entries():
+    cache = telemetry.TrackedLRU('test_lru', 2, sizeof=len)
+    for i in range(5):
+        telemetry.record('test_lru', hit=False)
+        cache[i] = b'x' * (i + 1) * 10
+    stats = telemetry.snapshot()['test_lru']
+    assert (stats.calls, stats.misses) == (5, 5)
+    assert stats.entries == 2
+    assert stats.bytes == 40 + 50
+    assert stats.evictions == 3
+    del cache[4]
+    assert telemetry.snapshot()['test_lru'].bytes == 40
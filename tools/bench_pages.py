@@ -0,0 +1,233 @@
+"""ページごとの再実行レイテンシのベンチマーク（Streamlit の AppTest でヘッドレス実行）。
+
+各ページについて、キャッシュを空にした初回表示、全国・北海道・東京都・沖縄県の表示、
+指標・ソートなどの切り替えを順に実行し、再実行ごとのレイテンシ・ピークメモリ・
+出力ペイロード（要素の protobuf サイズの合計）を記録する。
+
+    python tools/bench_pages.py                  # 計測してベースラインと比較
+    python tools/bench_pages.py --save-baseline  # 計測結果をベースラインとして保存
+    python tools/bench_pages.py --page page_jinko --repeat 5
+
+ベースラインより閾値以上遅い・大きい手順や、例外が出た手順があれば終了コード 1 で終わる。
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / 'app'
+BASELINE_PATH = Path(__file__).resolve().parent / 'bench_baseline.json'
+
+# ページは app/ 直下のモジュールを名前で import する
+sys.path.insert(0, str(APP_DIR))
+
+PREFS = ['全国', '北海道', '東京都', '沖縄県']
+
+# {ページ: [(手順名, {ウィジェットのkey: 値})]}。値は直前の状態に上書きで適用する
+SCENARIOS = {
+    'page_megasolar': (
+        [(pref, {'solar_pref_filter': pref}) for pref in PREFS]
+        + [
+            ('運転予定', {'solar_pref_filter': '全国', 'solar_status_radio': '運転予定'}),
+            ('運転終了', {'solar_status_radio': '運転終了'}),
+            ('運転中', {'solar_status_radio': '運転中'}),
+            ('市区町村地図', {'solar_map_level': '市区町村'}),
+            ('都道府県地図', {'solar_map_level': '都道府県'}),
+        ]
+        + [(f'ソート:{s}', {'solar_nintei_sort': s}) for s in ['件数', '出力', 'デフォルト']]
+    ),
+    'page_imin': (
+        [(pref, {'tab_pref_select': pref}) for pref in PREFS]
+        + [(f'表ソート:{s}', {'pref_table_sort_seg': s}) for s in ['総人口', '外国人', '比率', '前年比', 'デフォルト']]
+        + [(f'国籍指標:{m}', {'country_metric_seg': m}) for m in ['増減数', '増減率', '人口']]
+        + [(f'資格指標:{m}', {'status_metric_seg': m}) for m in ['増減数', '増減率', '人口']]
+        + [('国籍:中国', {'country_tab_filter': '中国'}), ('国籍:ベトナム', {'country_tab_filter': 'ベトナム'})]
+        + [(f'国籍ソート:{s}', {'country_pref_sort_seg': s}) for s in ['人口', '増減数', '増減率', 'デフォルト']]
+        + [('資格:永住者', {'status_tab_filter': '永住者'}), ('資格:特定技能', {'status_tab_filter': '特定技能'})]
+        + [(f'資格ソート:{s}', {'status_pref_sort_seg': s}) for s in ['人口', '増減数', '増減率', 'デフォルト']]
+    ),
+    'page_jinko': (
+        [(pref, {'jinko_pref_filter': pref}) for pref in PREFS]
+        + [(f'地図指標:{m}', {'jinko_cmap_metric': m})
+           for m in ['日本人人口増減率', '外国人人口増減率', '外国人比率', '総人口増減率']]
+        + [(f'市区町村ソート:{s}', {'jinko_city_sort': s}) for s in ['増減数', '増減率', '総人口']]
+        + [('全国に戻す', {'jinko_pref_filter': '全国'}), ('市区町村地図', {'jinko_map_level': '市区町村'}),
+           ('都道府県地図', {'jinko_map_level': '都道府県'})]
+        + [(f'都道府県ソート:{s}', {'jinko_pref_sort': s}) for s in ['総人口', '増減数', '増減率', 'デフォルト']]
+    ),
+    'page_zaisei': (
+        [(pref, {'zaisei_pref_filter': pref}) for pref in PREFS]
+        + [(f'市区町村ソート:{s}', {'zaisei_city_sort': s}) for s in ['経常収支比率', '将来負担比率', '財政力指数']]
+        + [('全国に戻す', {'zaisei_pref_filter': '全国'}), ('市区町村地図', {'zaisei_map_level': '市区町村'}),
+           ('都道府県地図', {'zaisei_map_level': '都道府県'})]
+        + [(f'都道府県ソート:{s}', {'zaisei_pref_sort': s})
+           for s in ['財政力指数', '経常収支比率', '将来負担比率', 'デフォルト']]
+    ),
+}
+
+
+def resolve_widget(at, key, value):
+    """直前の実行で表示された key のウィジェットに設定する値。選択肢が value で始まるものがあればそれを選ぶ。
+
+    表示されていないウィジェット（タイル未生成時の地図の単位など）は None。
+    """
+    for kind in ('selectbox', 'radio', 'button_group'):
+        finder = getattr(at, kind, None)
+        if finder is None:
+            continue
+        try:
+            widget = finder(key=key)
+        except KeyError:
+            continue
+        options = list(getattr(widget, 'options', []) or [])
+        if options and value not in options:
+            value = next((o for o in options if str(o).startswith(value)), value)
+        return value
+    return None
+
+
+def new_app(page, state, timeout):
+    """state（{key: 値}）を初回実行前の session_state に入れた AppTest。
+
+    実行済みの AppTest のウィジェットに set_value すると、単一選択の segmented_control で
+    値の型が合わず失敗する（Streamlit 1.53）ため、手順ごとに作り直して session_state で渡す。
+    キャッシュはプロセス全体で共有されるので、作り直しても計測には影響しない。
+    """
+    at = AppTest.from_file(str(APP_DIR / f'{page}.py'), default_timeout=timeout)
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+
+def _payload_bytes(node):
+    """要素ツリーの protobuf サイズの合計。"""
+    size = 0
+    proto = getattr(node, 'proto', None)
+    if proto is not None and hasattr(proto, 'ByteSize'):
+        size += proto.ByteSize()
+    for child in getattr(node, 'children', {}).values():
+        size += _payload_bytes(child)
+    return size
+
+
+def _run(at, measure_memory):
+    if measure_memory:
+        tracemalloc.reset_peak()
+        mem0 = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    at.run()
+    ms = (time.perf_counter() - t0) * 1000
+    peak_kb = (tracemalloc.get_traced_memory()[1] - mem0) / 1024 if measure_memory else None
+    return {
+        'ms': round(ms, 1),
+        'peak_kb': round(peak_kb, 1) if peak_kb is not None else None,
+        'payload_bytes': _payload_bytes(at._tree),
+        'exceptions': len(at.exception),
+    }
+
+
+def bench_page(page, repeat, timeout, measure_memory):
+    """ページのシナリオを実行し、{手順名: 計測値} を返す。"""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    at = new_app(page, {}, timeout)
+
+    results = {'初回表示': _run(at, measure_memory)}
+    state = {}
+    for step, widgets in SCENARIOS[page]:
+        values = {key: resolve_widget(at, key, value) for key, value in widgets.items()}
+        applied = {key: value for key, value in values.items() if value is not None}
+        if not applied:
+            results[step] = None
+            continue
+        state.update(applied)
+        at = new_app(page, state, timeout)
+        runs = [_run(at, measure_memory) for _ in range(repeat)]
+        results[step] = {
+            'ms': round(statistics.median(r['ms'] for r in runs), 1),
+            'peak_kb': max((r['peak_kb'] for r in runs if r['peak_kb'] is not None), default=None),
+            'payload_bytes': runs[-1]['payload_bytes'],
+            'exceptions': runs[-1]['exceptions'],
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ベースラインより threshold（比率）以上悪化した (ページ, 手順, 指標, 基準値, 今回) のリスト。
+
+    例外が出た手順はベースラインによらず 'exceptions' の回帰とする。
+    """
+    regressions = []
+    for page, steps in results.items():
+        for step, r in steps.items():
+            if r and r.get('exceptions'):
+                regressions.append((page, step, 'exceptions', 0, r['exceptions']))
+            b = baseline.get(page, {}).get(step)
+            if not r or not b:
+                continue
+            for metric in ('ms', 'peak_kb', 'payload_bytes'):
+                if r.get(metric) is None or not b.get(metric):
+                    continue
+                if r[metric] > b[metric] * (1 + threshold):
+                    regressions.append((page, step, metric, b[metric], r[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page', action='append', choices=list(SCENARIOS),
+                        help='対象ページ（複数指定可、省略時は全ページ）')
+    parser.add_argument('--repeat', type=int, default=3, help='各手順の再実行回数（中央値を記録）')
+    parser.add_argument('--timeout', type=float, default=120, help='1回の再実行のタイムアウト（秒）')
+    parser.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす悪化率')
+    parser.add_argument('--no-memory', action='store_true', help='tracemalloc を使わない（レイテンシのみ）')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', type=Path, help='計測結果のJSONの出力先')
+    args = parser.parse_args()
+
+    measure_memory = not args.no_memory
+    if measure_memory:
+        tracemalloc.start()
+
+    results = {}
+    for page in args.page or list(SCENARIOS):
+        print(f'== {page}')
+        results[page] = bench_page(page, args.repeat, args.timeout, measure_memory)
+        for step, r in results[page].items():
+            if r is None:
+                print(f'  {step:<24} (skipped)')
+                continue
+            peak = f'{r["peak_kb"]:>10,.0f}KB' if r['peak_kb'] is not None else ' ' * 12
+            error = f'  exceptions={r["exceptions"]}' if r['exceptions'] else ''
+            print(f'  {step:<24} {r["ms"]:>9,.1f}ms {peak} {r["payload_bytes"]:>10,}B{error}')
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, ensure_ascii=False, indent=2))
+        print(f'baseline saved: {args.baseline}')
+        baseline = {}
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    else:
+        print('no baseline (run with --save-baseline)')
+        baseline = {}
+    regressions = compare(results, baseline, args.threshold)
+    for page, step, metric, before, after in regressions:
+        print(f'REGRESSION {page} / {step} / {metric}: {before:,} -> {after:,}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""ページ × 都道府県 × 指標の静的スナップショットを書き出す。
+
+各ページを Streamlit の AppTest でヘッドレス実行し、全国・47都道府県と主な指標の組み合わせごとに
+描画結果（見出し・指標・Plotly のグラフ・ランキング表・地図）を静的なHTMLとJSONに変換する。
+組み合わせは (ページ, 都道府県) 単位でワーカープロセスに分けて並列に実行する。
+出力先はそのまま静的ファイルサーバー・CDNで配信できる。
+
+    python tools/export_snapshots.py --out dist/snapshots
+    python tools/export_snapshots.py --page page_jinko --pref 東京都 --workers 1
+
+    {out}/index.html                         一覧
+    {out}/{ページ}/{都道府県}/{指標}.html     スナップショット（地図は {指標}.map{n}.html）
+    {out}/{ページ}/{都道府県}/{指標}.json     同じ内容のJSON（グラフの spec・表のレコード）
+
+地図が参照する境界データ・タイル（app/static/）は {out}/static/ にコピーする。
+OPENJP_RESULT_CACHE を指定すると、ワーカー間で集計結果・図を共有できる。
+"""
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import quote
+
+import pyarrow as pa
+from plotly.offline import get_plotlyjs
+from streamlit.testing.v1 import AppTest
+
+from bench_pages import APP_DIR, new_app, resolve_widget
+from constants import PREF_ORDER
+from geo_assets import _geo_sources, publish
+
+# {ページ: (都道府県のウィジェットのkey, 指標のウィジェットのkey, [指標])}
+VIEWS = {
+    'page_megasolar': ('solar_pref_filter', 'solar_status_radio', ['運転中', '運転予定', '運転終了']),
+    'page_imin': ('tab_pref_select', None, ['index']),
+    'page_jinko': ('jinko_pref_filter', 'jinko_cmap_metric',
+                   ['総人口増減率', '日本人人口増減率', '外国人人口増減率', '外国人比率']),
+    'page_zaisei': ('zaisei_pref_filter', None, ['index']),
+}
+TEXT_TYPES = ('title', 'header', 'subheader', 'markdown', 'caption', 'text')
+ALERT_TYPES = ('info', 'success', 'warning', 'error')
+
+
+def _slug(s):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', s)
+
+
+def _markdown(text):
+    """st.markdown の本文をHTMLにする（HTMLはそのまま、Markdown は太字と改行のみ対応）。"""
+    if text.lstrip().startswith('<'):
+        return text
+    body = html.escape(text)
+    body = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', body)
+    return body.replace('\n', '<br>')
+
+
+def _format(value, spec):
+    if value is None or value != value:
+        return '-'
+    if spec is None:
+        return html.escape(str(value))
+    fmt = f'{{:{"+" if spec["sign"] else ""}{"," if spec["comma"] else ""}.{spec["decimals"]}f}}'
+    return html.escape(f'{spec["prefix"]}{fmt.format(value)}{spec["suffix"]}')
+
+
+def _table(args, data):
+    """arrow_table の引数を (HTML, レコード) にする。"""
+    df = pa.ipc.open_stream(data).read_all().to_pandas()
+    columns = args['columns']
+    head = ''.join(f'<th>{html.escape(c["label"]).replace(chr(10), "<br>")}</th>' for c in columns)
+    rows = ''.join(
+        '<tr>' + ''.join(f'<td>{_format(row[c["name"]], c["format"])}</td>' for c in columns) + '</tr>'
+        for row in df.to_dict('records')
+    )
+    table_html = f'<div class="custom-table"><table><thead><tr>{head}</tr></thead><tbody>{rows}</tbody></table></div>'
+    return table_html, json.loads(df.to_json(orient='records', force_ascii=False))
+
+
+def _map_page(args, root):
+    """st_folium の引数から単独で表示できる地図のHTMLを組み立てる。"""
+    links = ''.join(f'<link rel="stylesheet" href="{u}">' for u in args.get('css_links', []))
+    scripts = ''.join(f'<script src="{u}"></script>' for u in args.get('js_links', []))
+    body = args.get('html', '')
+    if 'map_div' not in body:
+        body = '<div id="map_div" style="width:100%;height:100%"></div>' + body
+    page = (f'<!doctype html><html><head><meta charset="utf-8">{links}{scripts}'
+            f'<style>html,body{{margin:0;height:100%}}</style></head>'
+            f'<body>{body}<script>{args.get("script", "")}</script></body></html>')
+    # 境界データ・タイルはコピーした static/ を相対パスで参照する
+    return page.replace('/app/static/', f'{root}static/')
+
+
+def _convert(node, root, elements, parts, maps):
+    """要素ツリーを順にたどり、JSON の要素・HTML の断片・地図のHTMLを集める。"""
+    kind = getattr(node, 'type', None)
+    proto = getattr(node, 'proto', None)
+    if kind in TEXT_TYPES:
+        text = node.value
+        if not text.lstrip().startswith('<style'):
+            elements.append({'kind': kind, 'text': text})
+            tag = {'title': 'h1', 'header': 'h2', 'subheader': 'h3'}.get(kind, 'div')
+            parts.append(f'<{tag} class="st-{kind}">{_markdown(text)}</{tag}>')
+    elif kind in ALERT_TYPES:
+        elements.append({'kind': kind, 'text': node.value})
+        parts.append(f'<div class="alert alert-{kind}">{_markdown(node.value)}</div>')
+    elif kind == 'metric':
+        elements.append({'kind': 'metric', 'label': node.label, 'value': node.value, 'delta': node.delta})
+        delta = f'<div class="metric-delta">{html.escape(node.delta)}</div>' if node.delta else ''
+        parts.append(f'<div class="metric"><div class="metric-label">{html.escape(node.label)}</div>'
+                     f'<div class="metric-value">{html.escape(node.value)}</div>{delta}</div>')
+    elif kind == 'plotly_chart':
+        spec = json.loads(proto.spec)
+        elements.append({'kind': 'plotly', 'spec': spec})
+        div_id = f'chart{len(elements)}'
+        parts.append(f'<div id="{div_id}"></div><script>'
+                     f'Plotly.newPlot("{div_id}", {proto.spec}, {{"displayModeBar": false, "responsive": true}});'
+                     f'</script>')
+    elif kind == 'component_instance':
+        args = json.loads(proto.json_args or '{}')
+        special = {a.key: a.bytes for a in proto.special_args if a.WhichOneof('value') == 'bytes'}
+        if 'columns' in args and 'data' in special:
+            table_html, records = _table(args, special['data'])
+            elements.append({'kind': 'table', 'columns': args['columns'], 'rows': records})
+            parts.append(table_html)
+        elif 'script' in args:
+            maps.append(_map_page(args, root))
+            elements.append({'kind': 'map', 'index': len(maps) - 1})
+            parts.append(f'<iframe class="map" data-map="{len(maps) - 1}" loading="lazy"></iframe>')
+    elif kind == 'tab':
+        label = getattr(node, 'label', '')
+        elements.append({'kind': 'tab', 'label': label})
+        parts.append(f'<h2 class="st-tab">{html.escape(label)}</h2>')
+    for key in sorted(getattr(node, 'children', {})):
+        _convert(node.children[key], root, elements, parts, maps)
+
+
+def _write(out_dir, page, pref, variant, at):
+    """現在の描画結果を {指標}.html / .json / .map{n}.html に書き出す。"""
+    view_dir = out_dir / page / _slug(pref)
+    view_dir.mkdir(parents=True, exist_ok=True)
+    root = '../../'
+    elements, parts, maps = [], [], []
+    _convert(at.main, root, elements, parts, maps)
+
+    name = _slug(variant)
+    for i, map_html in enumerate(maps):
+        (view_dir / f'{name}.map{i}.html').write_text(map_html, encoding='utf-8')
+    body = ''.join(parts)
+    for i in range(len(maps)):
+        body = body.replace(f'data-map="{i}"', f'src="{quote(name)}.map{i}.html"', 1)
+    title = f'{pref} {variant}' if variant != 'index' else pref
+    (view_dir / f'{name}.html').write_text(
+        f'<!doctype html><html lang="ja"><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+        f'<link rel="stylesheet" href="{root}styles.css"><script src="{root}plotly.min.js"></script>'
+        f'<style>body{{max-width:1100px;margin:0 auto;padding:1rem;font-family:sans-serif}}'
+        f'iframe.map{{width:100%;height:400px;border:0}}</style></head>'
+        f'<body>{body}<p class="st-caption">{time.strftime("%Y-%m-%d")} 時点のスナップショット</p></body></html>',
+        encoding='utf-8',
+    )
+    (view_dir / f'{name}.json').write_text(json.dumps(
+        {'page': page, 'pref': pref, 'variant': variant, 'elements': elements}, ensure_ascii=False,
+    ), encoding='utf-8')
+    return f'{page}/{_slug(pref)}/{name}.html'
+
+
+def export_pref(page, pref, out_dir, timeout):
+    """1ページ・1都道府県の全指標を書き出し、(書き出したパス, エラー) を返す。"""
+    pref_key, metric_key, variants = VIEWS[page]
+    at = new_app(page, {}, timeout)
+    at.run()
+    state = {pref_key: resolve_widget(at, pref_key, pref)}
+    written, errors = [], []
+    for variant in variants:
+        if metric_key:
+            state[metric_key] = resolve_widget(at, metric_key, variant)
+        # 表示されていないウィジェットは設定しない
+        at = new_app(page, {k: v for k, v in state.items() if v is not None}, timeout)
+        at.run()
+        if at.exception:
+            errors.append(f'{page}/{pref}/{variant}: {at.exception[0].message}')
+            continue
+        written.append(_write(out_dir, page, pref, variant, at))
+    return written, errors
+
+
+def _write_index(out_dir, written):
+    items = ''.join(f'<li><a href="{quote(p)}">{html.escape(p[:-5])}</a></li>' for p in sorted(written))
+    (out_dir / 'index.html').write_text(
+        f'<!doctype html><html lang="ja"><head><meta charset="utf-8"><title>OpenJP スナップショット</title></head>'
+        f'<body><h1>OpenJP スナップショット</h1><ul>{items}</ul></body></html>',
+        encoding='utf-8',
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', type=Path, default=Path('dist/snapshots'), help='出力先ディレクトリ')
+    parser.add_argument('--page', action='append', choices=list(VIEWS), help='対象ページ（省略時は全ページ）')
+    parser.add_argument('--pref', action='append', help='対象の都道府県（省略時は全国と47都道府県）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--timeout', type=float, default=300, help='1回の再実行のタイムアウト（秒）')
+    args = parser.parse_args()
+
+    out_dir = args.out.resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # 境界データはワーカーが同時に書き出さないよう、先にまとめて書き出しておく
+    for src_path, key_prop in _geo_sources():
+        publish(src_path, key_prop)
+    static_dir = APP_DIR / 'static'
+    if static_dir.exists():
+        shutil.copytree(static_dir, out_dir / 'static', dirs_exist_ok=True)
+    shutil.copy(APP_DIR / 'styles.css', out_dir / 'styles.css')
+    (out_dir / 'plotly.min.js').write_text(get_plotlyjs(), encoding='utf-8')
+
+    tasks = [(page, pref) for page in args.page or list(VIEWS) for pref in args.pref or ['全国'] + PREF_ORDER]
+    written, errors = [], []
+    t0 = time.perf_counter()
+    # AppTest はワーカーの __main__ を実行したページに置き換えるので、__main__.export_pref ではなく
+    # モジュール名で参照させる
+    from export_snapshots import export_pref as worker
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(worker, page, pref, out_dir, args.timeout): (page, pref)
+                   for page, pref in tasks}
+        for i, future in enumerate(as_completed(futures), start=1):
+            page, pref = futures[future]
+            try:
+                w, e = future.result()
+            except Exception as exc:
+                w, e = [], [f'{page}/{pref}: {type(exc).__name__}: {exc}']
+            if not w and not e:
+                e = [f'{page}/{pref}: no views']
+            written += w
+            errors += e
+            print(f'[{i}/{len(tasks)}] {page} {pref}: {len(w)} views' + (f', {len(e)} errors' if e else ''))
+
+    _write_index(out_dir, written)
+    print(f'{len(written)} views in {time.perf_counter() - t0:.0f}s -> {out_dir}')
+    for e in errors:
+        print(f'ERROR {e}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""同時セッション数を増やしながら再実行レイテンシを測る負荷試験ツール。
+
+ローカルで app/app.py を起動し（--url 指定時は起動済みのサーバーを使う）、
+Streamlit のWebSocketプロトコル（/_stcore/stream、BackMsg / ForwardMsg の protobuf）で
+N 個のブラウザセッションを模擬する。各セッションは4ページと各ページのフィルター・切り替えを
+ランダムに操作し、1操作ごとに再実行の完了（script_finished）までの時間を記録する。
+
+    python tools/loadgen.py --sessions 1,2,4,8,16 --duration 30
+    python tools/loadgen.py --url http://localhost:8501 --pid 12345
+
+N ごとにスループット（再実行/秒）・レイテンシのパーセンタイル・サーバーの最大RSSを表示する。
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# {ページ名（app.py の title）: [(ウィジェットのkey, 重み)]}
+PAGE_WIDGETS = {
+    'メガソーラー': [('solar_pref_filter', 4), ('solar_status_radio', 2), ('solar_map_level', 1),
+                 ('solar_nintei_sort', 1)],
+    '在留外国人': [('tab_pref_select', 4), ('pref_table_sort_seg', 1), ('country_metric_seg', 1),
+              ('status_metric_seg', 1), ('country_tab_filter', 2), ('country_pref_sort_seg', 1),
+              ('status_tab_filter', 2), ('status_pref_sort_seg', 1)],
+    '人口減少': [('jinko_pref_filter', 4), ('jinko_city_filter', 1), ('jinko_cmap_metric', 2),
+             ('jinko_map_level', 1), ('jinko_city_sort', 1), ('jinko_pref_sort', 1)],
+    '財政力指数': [('zaisei_pref_filter', 4), ('zaisei_map_level', 1), ('zaisei_city_sort', 1),
+              ('zaisei_pref_sort', 1)],
+}
+# 1操作のうちページを移動する確率
+PAGE_SWITCH_PROB = 0.2
+
+
+def _fields(proto):
+    return proto.DESCRIPTOR.fields_by_name
+
+
+class Session:
+    """1つのブラウザセッション。"""
+
+    def __init__(self, url, rng, timeout):
+        self.ws_url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+        self.rng = rng
+        self.timeout = timeout
+        self.conn = None
+        self.pages = {}         # ページ名 -> page_script_hash
+        self.page = None
+        self.widgets = {}       # ウィジェットのkey -> (種類, proto)
+        self.states = {}        # ウィジェットID -> WidgetState の値の設定関数
+
+    async def connect(self):
+        self.conn = await websocket_connect(self.ws_url, subprotocols=['streamlit'])
+        return await self.rerun()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+    def _harvest(self, msg):
+        kind = msg.WhichOneof('type')
+        if kind == 'navigation' or kind == 'new_session':
+            for page in getattr(msg, kind).app_pages:
+                self.pages[page.page_name] = page.page_script_hash
+        elif kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+            element = msg.delta.new_element
+            etype = element.WhichOneof('type')
+            if etype in ('selectbox', 'radio', 'button_group'):
+                proto = getattr(element, etype)
+                # keyed widget の ID は '...-{key}' で終わる
+                self.widgets[proto.id.rsplit('-', 1)[-1]] = (etype, proto)
+
+    async def rerun(self, page=None):
+        """再実行を要求し、完了までの秒数を返す。"""
+        back = BackMsg()
+        state = back.rerun_script
+        if page is not None:
+            self.page = page
+            state.page_script_hash = self.pages[page]
+            state.page_name = page
+            # ページ移動時はウィジェットの状態を引き継がない
+            self.states = {}
+        for widget_id, setter in self.states.items():
+            ws = state.widget_states.widgets.add()
+            ws.id = widget_id
+            setter(ws)
+        t0 = time.perf_counter()
+        await self.conn.write_message(back.SerializeToString(), binary=True)
+        deadline = t0 + self.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError('rerun timed out')
+            data = await asyncio.wait_for(self.conn.read_message(), remaining)
+            if data is None:
+                raise ConnectionError('websocket closed')
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            self._harvest(msg)
+            if msg.WhichOneof('type') == 'script_finished':
+                return time.perf_counter() - t0
+
+    def _choose(self, key):
+        """key のウィジェットの値をランダムに選び、WidgetState の設定関数を登録する。"""
+        etype, proto = self.widgets[key]
+        if etype == 'button_group':
+            labels = [o.content for o in proto.options]
+        else:
+            labels = list(proto.options)
+        if not labels:
+            return False
+        index = self.rng.randrange(len(labels))
+        if etype == 'button_group':
+            if 'raw_values' in _fields(proto):
+                setter = lambda ws: ws.string_array_value.data.append(labels[index])
+            else:
+                setter = lambda ws: ws.int_array_value.data.append(index)
+        elif 'raw_value' in _fields(proto):
+            setter = lambda ws: setattr(ws, 'string_value', labels[index])
+        else:
+            setter = lambda ws: setattr(ws, 'int_value', index)
+        self.states[proto.id] = setter
+        return True
+
+    async def step(self):
+        """ページ移動またはウィジェット操作を1回行い、再実行の秒数を返す。"""
+        candidates = [(k, w) for k, w in PAGE_WIDGETS.get(self.page, []) if k in self.widgets]
+        if self.page is None or not candidates or self.rng.random() < PAGE_SWITCH_PROB:
+            page = self.rng.choice([p for p in PAGE_WIDGETS if p in self.pages])
+            # ウィジェットは表示中のページのものだけを保持する
+            self.widgets = {}
+            return await self.rerun(page)
+        keys, weights = zip(*candidates)
+        key = self.rng.choices(keys, weights)[0]
+        self._choose(key)
+        return await self.rerun()
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def _sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        rss = _rss_bytes(pid) if pid else None
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _session_loop(url, seed, duration, timeout, latencies, errors):
+    session = Session(url, random.Random(seed), timeout)
+    try:
+        await session.connect()
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            latencies.append(await session.step())
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {e}')
+    finally:
+        session.close()
+
+
+async def run_level(url, n, duration, timeout, pid, seed):
+    """n セッションを同時に duration 秒動かした結果。"""
+    latencies, errors, rss = [], [], []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(pid, rss, stop))
+    t0 = time.perf_counter()
+    await asyncio.gather(*[
+        _session_loop(url, seed * 1000 + i, duration, timeout, latencies, errors) for i in range(n)
+    ])
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await sampler
+
+    ms = sorted(x * 1000 for x in latencies)
+
+    def pct(p):
+        return round(ms[min(len(ms) - 1, int(len(ms) * p))], 1) if ms else None
+
+    return {
+        'sessions': n,
+        'reruns': len(ms),
+        'throughput': round(len(ms) / elapsed, 2),
+        'p50_ms': pct(0.5),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'mean_ms': round(statistics.fmean(ms), 1) if ms else None,
+        'max_rss_mb': round(max(rss) / 1024 / 1024, 1) if rss else None,
+        'errors': len(errors),
+        'error_samples': errors[:3],
+    }
+
+
+def start_server(port):
+    """app/app.py をヘッドレスで起動し、ヘルスチェックが通るまで待つ。"""
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', str(ROOT / 'app' / 'app.py'),
+         '--server.headless', 'true', '--server.port', str(port),
+         '--browser.gatherUsageStats', 'false'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://localhost:{port}'
+    for _ in range(120):
+        try:
+            with urllib.request.urlopen(f'{url}/_stcore/health', timeout=1) as r:
+                if r.status == 200:
+                    return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError('server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,2,4,8,16', help='同時セッション数（カンマ区切り）')
+    parser.add_argument('--duration', type=float, default=30, help='各段階の実行秒数')
+    parser.add_argument('--timeout', type=float, default=120, help='1回の再実行のタイムアウト（秒）')
+    parser.add_argument('--url', help='起動済みサーバーのURL（省略時はローカルで起動）')
+    parser.add_argument('--pid', type=int, help='--url 指定時、RSSを計測するサーバーのPID')
+    parser.add_argument('--port', type=int, default=8599)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help='結果のJSONの出力先')
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        proc, url = start_server(args.port)
+        pid = proc.pid
+    try:
+        # 1セッションで全ページを一巡し、キャッシュを温めてから計測する
+        asyncio.run(run_level(url, 1, min(args.duration, 10), args.timeout, None, args.seed))
+        results = []
+        print(f'{"N":>4} {"reruns":>7} {"rerun/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"RSS(MB)":>8} {"err":>4}')
+        for n in [int(x) for x in args.sessions.split(',')]:
+            r = asyncio.run(run_level(url, n, args.duration, args.timeout, pid, args.seed))
+            results.append(r)
+            print(f'{n:>4} {r["reruns"]:>7} {r["throughput"]:>8} {r["p50_ms"]!s:>8} {r["p95_ms"]!s:>8} '
+                  f'{r["p99_ms"]!s:>8} {r["max_rss_mb"]!s:>8} {r["errors"]:>4}')
+            for e in r['error_samples']:
+                print(f'     {e}')
+        if args.output:
+            args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())